@@ -1,28 +1,120 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import asyncio
+import hmac
+import json
+from typing import Any, AsyncIterator, List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.dependencies import get_current_org, get_optional_org
 from app.services.ai_models import (
     OCRService,
     FaceVerificationService,
+    FaceDeduplicationService,
+    FaceReverificationService,
+    ImageQualityService,
     LivenessCheckService,
     DeepfakeDetectionService,
+    DocumentForgeryService,
     RiskScoringService,
+    VerificationService,
+    batching_stats,
+    face_cascade_stats,
+    ocr_language_stats,
+    ocr_roi_stats,
 )
+from app.services.result_cache import result_cache
+from app.services.admission import admission_stats
+from app.services.inference_executor import inference_executor
+from app.services.liveness import UnreadableVideo
+from app.services.model_registry import model_versions, registry_stats
+from app.services.ocr_languages import supported_languages
 
 router = APIRouter(tags=["ai"])
 
 
 @router.post("/api/v1/ai/ocr")
-async def ocr_document(file: UploadFile = File(...)):
+async def ocr_document(
+    file: UploadFile = File(...),
+    document_type: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+):
+    if language is not None and language not in supported_languages():
+        raise HTTPException(status_code=400, detail=f"Unsupported OCR language: {language}")
     try:
-        data = await OCRService.extract_document_info(file)
+        data = await OCRService.extract_document_info(file, document_type, language)
+        return data
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/v1/ai/quality")
+async def image_quality(file: UploadFile = File(...)):
+    try:
+        data = await ImageQualityService.check_image(file)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/api/v1/ai/face/verify")
-async def face_verify(selfie: UploadFile = File(...), document_face: UploadFile = File(...)):
+async def face_verify(
+    selfie: UploadFile = File(...),
+    document_face: UploadFile = File(...),
+    reference_id: Optional[str] = Form(None),
+    organization_id: Optional[str] = Depends(get_optional_org),
+):
+    # Stored pairs belong to the organization of the caller's (active) user;
+    # without a login nothing is stored, so no caller can replace another's
+    # pair. The customer flow verifies anonymously.
+    if reference_id and not organization_id:
+        raise HTTPException(status_code=401, detail="Storing a reference_id needs an organization token")
     try:
-        data = await FaceVerificationService.verify_face_match(selfie, document_face)
+        data = await FaceVerificationService.verify_face_match(
+            selfie, document_face, reference_id=reference_id, organization_id=organization_id or ""
+        )
+        return data
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="reference_id belongs to another organization")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/v1/ai/face/reverify/{reference_id}")
+async def face_reverify(
+    reference_id: str, threshold: Optional[float] = None, organization_id: str = Depends(get_current_org)
+):
+    data = await FaceReverificationService.reverify(reference_id, organization_id, threshold)
+    if data is None:
+        raise HTTPException(status_code=404, detail="No stored face embeddings for this reference")
+    return data
+
+
+@router.post("/api/v1/ai/face/rescore")
+async def face_rescore(payload: dict, organization_id: str = Depends(get_current_org)):
+    threshold = payload.get("threshold")
+    if threshold is not None and not isinstance(threshold, (int, float)):
+        raise HTTPException(status_code=400, detail="threshold must be a number")
+    model_version = payload.get("model_version")
+    if model_version is not None and not isinstance(model_version, str):
+        raise HTTPException(status_code=400, detail="model_version must be a string")
+    try:
+        return await FaceReverificationService.rescore(organization_id, threshold, model_version)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/v1/ai/face/dedup")
+async def face_dedup(
+    selfie: UploadFile = File(...),
+    subject_id: Optional[str] = Form(None),
+    enroll: bool = Form(False),
+    k: int = Form(5),
+    organization_id: str = Depends(get_current_org),
+):
+    try:
+        data = await FaceDeduplicationService.find_duplicates(
+            organization_id, await selfie.read(), subject_id=subject_id, enroll=enroll, k=k
+        )
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -33,6 +125,10 @@ async def liveness(video: UploadFile = File(...)):
     try:
         data = await LivenessCheckService.check_liveness(video)
         return data
+    except HTTPException:
+        raise
+    except UnreadableVideo as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -46,10 +142,160 @@ async def deepfake(image: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/v1/ai/forgery")
+async def document_forgery(file: UploadFile = File(...), template_id: Optional[str] = Form(None)):
+    try:
+        data = await DocumentForgeryService.check_document(file, template_id)
+        return data
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown document template: {template_id}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/api/v1/ai/risk")
 async def risk(payload: dict):
     try:
         data = await RiskScoringService.calculate_risk_score(payload)
         return data
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _ndjson_rows(stream: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _json_row(line)
+    if buffer.strip():
+        yield _json_row(buffer)
+
+
+def _json_row(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None  # reported as an unscorable row
+
+
+async def _list_rows(rows: List[Any]) -> AsyncIterator[Any]:
+    for row in rows:
+        yield row
+
+
+class _RequestStreamingResponse(StreamingResponse):
+    """A streaming response that may start while the request body is still arriving.
+
+    On servers older than ASGI 2.4, ``StreamingResponse`` listens for a
+    disconnect by reading ``receive`` alongside the body iterator, which
+    would take the request body's own messages. Here only the body iterator
+    reads them, and reading raises ``ClientDisconnect`` if the client goes.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@router.post("/api/v1/ai/risk/batch")
+async def risk_batch(request: Request):
+    """Score many feature rows; accepts a JSON array (or ``{"rows": [...]}``) or NDJSON, streams NDJSON back."""
+    content_type = request.headers.get("content-type", "")
+    response = StreamingResponse
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        # Lines are parsed and scored as they arrive; the first results go
+        # out before the rest of the body is read.
+        rows = _ndjson_rows(request.stream())
+        response = _RequestStreamingResponse
+    else:
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be JSON or NDJSON")
+        if isinstance(payload, dict):
+            payload = payload.get("rows")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of rows")
+        rows = _list_rows(payload)
+
+    async def results():
+        async for chunk in RiskScoringService.score_batch(rows, settings.RISK_BATCH_CHUNK_ROWS):
+            yield "".join(json.dumps(result) + "\n" for result in chunk)
+
+    return response(results(), media_type="application/x-ndjson")
+
+
+@router.post("/api/v1/ai/verify")
+async def verify(
+    selfie: UploadFile = File(...),
+    document: Optional[UploadFile] = File(None),
+    video: Optional[UploadFile] = File(None),
+    document_type: Optional[str] = Form(None),
+    ocr: bool = Form(False),
+    signals: Optional[str] = Form(None),
+):
+    try:
+        risk_signals = json.loads(signals) if signals else {}
+    except ValueError:
+        risk_signals = None
+    if not isinstance(risk_signals, dict):
+        raise HTTPException(status_code=400, detail="signals must be a JSON object")
+    try:
+        data = await VerificationService.verify(
+            selfie, document=document, video=video, document_type=document_type, run_ocr=ocr, signals=risk_signals
+        )
+        return data
+    except HTTPException:
+        raise
+    except UnreadableVideo as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/v1/ai/metrics")
+async def ai_metrics():
+    from app.workers.celery_app import queue_stats
+
+    return {
+        "batching": batching_stats(),
+        "cache": result_cache.stats(),
+        "admission": admission_stats(),
+        "ocr_roi": ocr_roi_stats,
+        "ocr_languages": ocr_language_stats,
+        "face_cascade": face_cascade_stats,
+        "models": model_versions.status(),
+        # Depth from the broker, wait and run times from the workers.
+        "queues": await asyncio.to_thread(queue_stats),
+    }
+
+
+@router.get("/api/v1/ai/models")
+async def models_status():
+    # Loaded versions and memory per inference process.
+    workers = await inference_executor.broadcast(registry_stats)
+    return {"models": model_versions.status(), "history": model_versions.history, "workers": workers}
+
+
+@router.post("/api/v1/ai/models/{kind}/activate")
+async def activate_model(kind: str, payload: dict, request: Request):
+    # Swapping a model affects every organization, so it takes the operator
+    # token rather than an organization login.
+    token = settings.AI_MODEL_ADMIN_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        raise HTTPException(status_code=403, detail="Model administration is not allowed")
+    version = payload.get("version")
+    if not isinstance(version, str) or not version:
+        raise HTTPException(status_code=400, detail="version must be a non-empty string")
+    try:
+        return await model_versions.activate(kind, version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model kind: {kind}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
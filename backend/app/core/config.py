@@ -10,6 +10,107 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_SECONDS: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_SECONDS", "3600"))
     STORAGE_PATH: str = os.getenv("STORAGE_PATH", "./storage")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+    CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
+    CELERY_WORKER_ROLE: str = os.getenv("CELERY_WORKER_ROLE", "")
+    CELERY_INFERENCE_CONCURRENCY: int = int(os.getenv("CELERY_INFERENCE_CONCURRENCY", "2"))
+    CELERY_INFERENCE_PREFETCH: int = int(os.getenv("CELERY_INFERENCE_PREFETCH", "1"))
+    CELERY_INFERENCE_MAX_TASKS_PER_CHILD: int = int(os.getenv("CELERY_INFERENCE_MAX_TASKS_PER_CHILD", "500"))
+    CELERY_INFERENCE_INIT_TIMEOUT_S: float = float(os.getenv("CELERY_INFERENCE_INIT_TIMEOUT_S", "300"))
+    CELERY_IO_POOL: str = os.getenv("CELERY_IO_POOL", "threads")
+    CELERY_IO_CONCURRENCY: int = int(os.getenv("CELERY_IO_CONCURRENCY", "16"))
+    CELERY_IO_PREFETCH: int = int(os.getenv("CELERY_IO_PREFETCH", "4"))
+    CELERY_IO_MAX_TASKS_PER_CHILD: int = int(os.getenv("CELERY_IO_MAX_TASKS_PER_CHILD", "0"))
+    CELERY_BATCH_CONCURRENCY: int = int(os.getenv("CELERY_BATCH_CONCURRENCY", "1"))
+    CELERY_BATCH_PREFETCH: int = int(os.getenv("CELERY_BATCH_PREFETCH", "1"))
+    CELERY_BATCH_MAX_TASKS_PER_CHILD: int = int(os.getenv("CELERY_BATCH_MAX_TASKS_PER_CHILD", "100"))
+    CELERY_QUEUE_STATS_WINDOW: int = int(os.getenv("CELERY_QUEUE_STATS_WINDOW", "512"))
+    TASK_BACKEND: str = os.getenv("TASK_BACKEND", "celery")
+    LOCAL_TASK_QUEUE_PATH: str = os.getenv("LOCAL_TASK_QUEUE_PATH", "./storage/tasks.db")
+    LOCAL_TASK_WORKERS: int = int(os.getenv("LOCAL_TASK_WORKERS", "4"))
+    LOCAL_TASK_POOL: str = os.getenv("LOCAL_TASK_POOL", "threads")
+    LOCAL_TASK_POLL_INTERVAL_S: float = float(os.getenv("LOCAL_TASK_POLL_INTERVAL_S", "0.5"))
+    LOCAL_TASK_MAX_ATTEMPTS: int = int(os.getenv("LOCAL_TASK_MAX_ATTEMPTS", "3"))
+    CELERY_SERIALIZER: str = os.getenv("CELERY_SERIALIZER", "msgpack-zstd")
+    CELERY_COMPRESS_MIN_BYTES: int = int(os.getenv("CELERY_COMPRESS_MIN_BYTES", "1024"))
+    CELERY_ZSTD_LEVEL: int = int(os.getenv("CELERY_ZSTD_LEVEL", "3"))
+    ARTIFACT_STORE_PATH: str = os.getenv("ARTIFACT_STORE_PATH", "./storage/artifacts")
+    ARTIFACT_RETENTION_HOURS: float = float(os.getenv("ARTIFACT_RETENTION_HOURS", "72"))
+
+    # AI inference
+    AI_BATCH_MAX_SIZE: int = int(os.getenv("AI_BATCH_MAX_SIZE", "8"))
+    AI_BATCH_MAX_WAIT_MS: float = float(os.getenv("AI_BATCH_MAX_WAIT_MS", "10"))
+    AI_ENABLED_MODELS: str = os.getenv("AI_ENABLED_MODELS", "ocr,face")
+    AI_INFERENCE_WORKERS: int = int(os.getenv("AI_INFERENCE_WORKERS", "2"))
+    AI_INFERENCE_START_METHOD: str = os.getenv("AI_INFERENCE_START_METHOD", "spawn")
+    AI_OCR_MODEL_VERSION: str = os.getenv("AI_OCR_MODEL_VERSION", "paddleocr-en-angle")
+    AI_FACE_MODEL_VERSION: str = os.getenv("AI_FACE_MODEL_VERSION", "insightface-buffalo_l")
+    AI_MODEL_MAX_VERSIONS: int = int(os.getenv("AI_MODEL_MAX_VERSIONS", "2"))
+    AI_MODEL_DRAIN_TIMEOUT_S: float = float(os.getenv("AI_MODEL_DRAIN_TIMEOUT_S", "120"))
+    AI_MODEL_ADMIN_TOKEN: str = os.getenv("AI_MODEL_ADMIN_TOKEN", "")
+    AI_MODEL_RSS_BUDGET_MB: float = float(os.getenv("AI_MODEL_RSS_BUDGET_MB", "3072"))
+    AI_MODEL_HOT_VERSIONS: int = int(os.getenv("AI_MODEL_HOT_VERSIONS", "2"))
+    AI_OCR_LANGUAGE_ROUTING: bool = os.getenv("AI_OCR_LANGUAGE_ROUTING", "true").lower() in ("1", "true", "yes")
+    AI_OCR_LANGUAGES: str = os.getenv("AI_OCR_LANGUAGES", "en,fr,german,es,it,pt,ru,uk,hi,ar,ch,japan,korean")
+    AI_OCR_PINNED_LANGUAGES: str = os.getenv("AI_OCR_PINNED_LANGUAGES", "en")
+    AI_OCR_LANGUAGE_PROBE_CONFIDENCE: float = float(os.getenv("AI_OCR_LANGUAGE_PROBE_CONFIDENCE", "0.6"))
+    AI_OCR_MAX_SIDE: int = int(os.getenv("AI_OCR_MAX_SIDE", "1600"))
+    AI_FACE_MAX_SIDE: int = int(os.getenv("AI_FACE_MAX_SIDE", "960"))
+    AI_FACE_DET_LIGHT_SIDE: int = int(os.getenv("AI_FACE_DET_LIGHT_SIDE", "320"))
+    AI_FACE_DET_MAX_SIDE: int = int(os.getenv("AI_FACE_DET_MAX_SIDE", "640"))
+    AI_FACE_CASCADE_MIN_SCORE: float = float(os.getenv("AI_FACE_CASCADE_MIN_SCORE", "0.6"))
+    AI_FACE_CASCADE_MIN_FACE_PX: int = int(os.getenv("AI_FACE_CASCADE_MIN_FACE_PX", "48"))
+    AI_DEEPFAKE_MAX_SIDE: int = int(os.getenv("AI_DEEPFAKE_MAX_SIDE", "512"))
+    AI_FORGERY_MAX_SIDE: int = int(os.getenv("AI_FORGERY_MAX_SIDE", "1024"))
+    AI_OCR_ROI_ENABLED: bool = os.getenv("AI_OCR_ROI_ENABLED", "true").lower() in ("1", "true", "yes")
+    AI_OCR_ROI_MIN_CONFIDENCE: float = float(os.getenv("AI_OCR_ROI_MIN_CONFIDENCE", "0.85"))
+    AI_OCR_ROI_MIN_LAYOUT_CONFIDENCE: float = float(os.getenv("AI_OCR_ROI_MIN_LAYOUT_CONFIDENCE", "0.6"))
+    AI_QUALITY_GATE_ENABLED: bool = os.getenv("AI_QUALITY_GATE_ENABLED", "true").lower() in ("1", "true", "yes")
+    AI_QUALITY_MAX_SIDE: int = int(os.getenv("AI_QUALITY_MAX_SIDE", "512"))
+    AI_QUALITY_MIN_SHARPNESS: float = float(os.getenv("AI_QUALITY_MIN_SHARPNESS", "60"))
+    AI_QUALITY_MIN_BRIGHTNESS: float = float(os.getenv("AI_QUALITY_MIN_BRIGHTNESS", "45"))
+    AI_QUALITY_MAX_BRIGHTNESS: float = float(os.getenv("AI_QUALITY_MAX_BRIGHTNESS", "225"))
+    AI_QUALITY_MAX_GLARE: float = float(os.getenv("AI_QUALITY_MAX_GLARE", "0.04"))
+    AI_QUALITY_MIN_COVERAGE: float = float(os.getenv("AI_QUALITY_MIN_COVERAGE", "0.3"))
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    ONNX_INTER_OP_THREADS: int = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))
+    ONNX_GRAPH_OPTIMIZATION: str = os.getenv("ONNX_GRAPH_OPTIMIZATION", "all")
+    ONNX_CPU_MEM_ARENA: bool = os.getenv("ONNX_CPU_MEM_ARENA", "true").lower() in ("1", "true", "yes")
+    ONNX_ALLOW_SPINNING: bool = os.getenv("ONNX_ALLOW_SPINNING", "false").lower() in ("1", "true", "yes")
+    ONNX_SESSION_POOL_SIZE: int = int(os.getenv("ONNX_SESSION_POOL_SIZE", "1"))
+    ONNX_PRECISION: str = os.getenv("ONNX_PRECISION", "fp32")
+    ONNX_INT8_MODELS: str = os.getenv("ONNX_INT8_MODELS", "recognition")
+    AI_PRELOAD_MODELS: bool = os.getenv("AI_PRELOAD_MODELS", "true").lower() in ("1", "true", "yes")
+    AI_ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("AI_ADMISSION_MAX_CONCURRENCY", "8"))
+    AI_ADMISSION_MAX_QUEUE: int = int(os.getenv("AI_ADMISSION_MAX_QUEUE", "32"))
+    AI_ADMISSION_QUEUE_TIMEOUT_S: float = float(os.getenv("AI_ADMISSION_QUEUE_TIMEOUT_S", "10"))
+    AI_ADMISSION_LIMITS: str = os.getenv("AI_ADMISSION_LIMITS", "ocr=4:16,liveness=2:8,verify=4:16")
+    AI_PLAN_WEIGHTS: str = os.getenv("AI_PLAN_WEIGHTS", "starter=1,business=2,enterprise=4")
+    AI_TENANT_MAX_QUEUE_SHARE: float = float(os.getenv("AI_TENANT_MAX_QUEUE_SHARE", "0.5"))
+    AI_TENANT_CACHE_TTL_S: float = float(os.getenv("AI_TENANT_CACHE_TTL_S", "300"))
+    AI_CACHE_MAX_ENTRIES: int = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2048"))
+    AI_CACHE_MAX_BYTES: int = int(os.getenv("AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    AI_CACHE_TTL_SECONDS: float = float(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+    AI_CACHE_REDIS_ENABLED: bool = os.getenv("AI_CACHE_REDIS_ENABLED", "false").lower() in ("1", "true", "yes")
+    FACE_INDEX_PATH: str = os.getenv("FACE_INDEX_PATH", "./storage/face_index")
+    FACE_INDEX_DTYPE: str = os.getenv("FACE_INDEX_DTYPE", "float16")
+    FACE_DEDUP_THRESHOLD: float = float(os.getenv("FACE_DEDUP_THRESHOLD", "0.5"))
+    FACE_MATCH_THRESHOLD: float = float(os.getenv("FACE_MATCH_THRESHOLD", "0.4"))
+    FACE_EMBEDDINGS_PATH: str = os.getenv("FACE_EMBEDDINGS_PATH", "./storage/face_embeddings")
+    FACE_EMBEDDINGS_DTYPE: str = os.getenv("FACE_EMBEDDINGS_DTYPE", "float16")
+    FORGERY_INDEX_PATH: str = os.getenv("FORGERY_INDEX_PATH", "./storage/forgery_index")
+    AI_FORGERY_ENABLED: bool = os.getenv("AI_FORGERY_ENABLED", "true").lower() in ("1", "true", "yes")
+    AI_FORGERY_BUDGET_MS: float = float(os.getenv("AI_FORGERY_BUDGET_MS", "150"))
+    AI_FORGERY_THRESHOLD: float = float(os.getenv("AI_FORGERY_THRESHOLD", "0.6"))
+    RISK_BATCH_CHUNK_ROWS: int = int(os.getenv("RISK_BATCH_CHUNK_ROWS", "4096"))
+    LIVENESS_MAX_UPLOAD_BYTES: int = int(os.getenv("LIVENESS_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+    LIVENESS_SAMPLE_FPS: float = float(os.getenv("LIVENESS_SAMPLE_FPS", "6"))
+    LIVENESS_FRAME_SIDE: int = int(os.getenv("LIVENESS_FRAME_SIDE", "160"))
+    LIVENESS_MIN_FRAMES: int = int(os.getenv("LIVENESS_MIN_FRAMES", "8"))
+    LIVENESS_MAX_FRAMES: int = int(os.getenv("LIVENESS_MAX_FRAMES", "90"))
+    LIVENESS_CPU_BUDGET_MS: float = float(os.getenv("LIVENESS_CPU_BUDGET_MS", "1500"))
+    LIVENESS_EARLY_STOP_CONFIDENCE: float = float(os.getenv("LIVENESS_EARLY_STOP_CONFIDENCE", "0.8"))
 
     model_config = {"env_file": ".env"}
 
@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -6,8 +7,12 @@ from . import models
 from .security import decode_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/v1/auth/login')
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/v1/auth/login', auto_error=False)
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return _active_user(token, db)
+
+def _active_user(token: str, db: Session):
     try:
         payload = decode_token(token)
         user_id = payload.get('sub')
@@ -23,3 +28,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 
 def get_current_org(user=Depends(get_current_user)):
     return user.organization_id
+
+def get_optional_org(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    """The caller's organization, checked like get_current_org; None when no token is sent."""
+    if not token:
+        return None
+    return _active_user(token, db).organization_id
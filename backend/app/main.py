@@ -1,18 +1,26 @@
 # Apply SQLAlchemy compatibility patch for Python 3.13+ before any imports
 from . import compat  # noqa: F401
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import auth as legacy_auth, invitations as legacy_invitations, submissions as legacy_submissions
 from .api.ai import router as ai_router
 from .api.otp import router as otp_router
 from .db import engine
 from .models import Base
+import asyncio
 import os
 from .config import UPLOADS_DIR
+from .core.config import settings
+from .services.inference_executor import inference_executor
+from .services.admission import AdmissionMiddleware
 
 app = FastAPI(title='Verity-AI Backend', docs_url='/api/docs')
 
+# Registered before CORS so that CORS wraps it (the last middleware added
+# runs outermost) and shed 503 responses still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS - MUST be added before other middleware
 app.add_middleware(
     CORSMiddleware,
@@ -34,6 +42,36 @@ def startup():
     # create DB tables if they don't exist (simple dev flow)
     Base.metadata.create_all(bind=engine)
     os.makedirs(UPLOADS_DIR, exist_ok=True)
+    inference_executor.start()
+    if settings.TASK_BACKEND == "local":
+        # Run what a previous run left queued without waiting for new work.
+        from .workers.dispatch import get_dispatcher
+
+        get_dispatcher().start()
+
+
+_background_tasks = set()
+
+
+@app.on_event('startup')
+async def warmup_models():
+    # Warm up in the background so /healthz answers while models load;
+    # /readyz stays 503 until every inference worker is warm.
+    if not settings.AI_PRELOAD_MODELS:
+        inference_executor.ready = True
+        return
+    task = asyncio.create_task(inference_executor.warmup())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@app.on_event('shutdown')
+def shutdown():
+    if settings.TASK_BACKEND == "local":
+        from .workers.dispatch import reset_dispatcher
+
+        reset_dispatcher()
+    inference_executor.shutdown()
 
 
 app.include_router(ai_router)
@@ -46,3 +84,11 @@ app.include_router(legacy_submissions.router)
 @app.get('/healthz')
 def health():
     return {'status': 'ok'}
+
+
+@app.get('/readyz')
+def ready(response: Response):
+    if not inference_executor.ready:
+        response.status_code = 503
+        return {'status': 'warming_up'}
+    return {'status': 'ready', 'models': inference_executor.warmup_report}
@@ -0,0 +1,256 @@
+"""
+Admission control for the AI endpoints.
+
+Each endpoint has a fixed number of concurrent slots and a bounded wait
+queue. A request that finds the queue full, or waits longer than the queue
+timeout, is shed immediately with 503 and a ``Retry-After`` estimated from
+the current backlog, before its upload body is read. Admitted responses
+carry the time spent queued, and per-endpoint queue depth and wait-time
+statistics are reported by ``admission_stats()``.
+
+Freed slots go to waiting requests in fair order across organizations (see
+``app.services.fair_scheduler``), and no single organization may hold more
+than its share of the wait queue.
+"""
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.services.fair_scheduler import BATCH, INTERACTIVE, PUBLIC_TENANT, FairQueue, tenant_directory
+
+# Request path -> admission controller name.
+ENDPOINTS = {
+    "/api/v1/ai/ocr": "ocr",
+    "/api/v1/ai/quality": "quality",
+    "/api/v1/ai/face/verify": "face_verify",
+    "/api/v1/ai/face/dedup": "face_dedup",
+    "/api/v1/ai/liveness": "liveness",
+    "/api/v1/ai/deepfake": "deepfake",
+    "/api/v1/ai/forgery": "forgery",
+    "/api/v1/ai/verify": "verify",
+    "/api/v1/ai/risk/batch": "risk_batch",
+}
+
+# Endpoints that only ever serve batch re-processing.
+BATCH_ENDPOINTS = {"risk_batch"}
+
+
+class Overloaded(Exception):
+    def __init__(self, controller: "AdmissionController", reason: str):
+        super().__init__(f"{controller.name} is over capacity ({reason})")
+        self.reason = reason
+        self.retry_after = controller.retry_after()
+        self.queue_depth = controller.queue_depth
+
+
+class AdmissionController:
+    """Bounded concurrency plus a bounded, tenant-fair wait queue for one endpoint."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout_s: float,
+        tenant_queue_share: float = 1.0,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout_s = queue_timeout_s
+        self.tenant_max_queue = max(1, int(self.max_queue * tenant_queue_share))
+        self.active = 0
+        self._waiters = FairQueue()
+        self._tenants: Dict[str, Dict[str, float]] = {}
+        self._waits_ms: deque = deque(maxlen=1024)
+        self._service_ms = 0.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog has likely drained."""
+        service_s = (self._service_ms or 1000.0) / 1000
+        return max(1, math.ceil((len(self._waiters) + 1) * service_s / self.max_concurrency))
+
+    def _tenant(self, tenant: str) -> Dict[str, float]:
+        stats = self._tenants.get(tenant)
+        if stats is None:
+            stats = self._tenants[tenant] = {"admitted": 0, "rejected": 0, "wait_ms": 0.0}
+        return stats
+
+    async def acquire(self, tenant: str = PUBLIC_TENANT, weight: float = 1.0, priority: str = INTERACTIVE) -> float:
+        """Wait for a slot and return the time spent queued in milliseconds."""
+        tenant_stats = self._tenant(tenant)
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            tenant_stats["admitted"] += 1
+            self._waits_ms.append(0.0)
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            tenant_stats["rejected"] += 1
+            raise Overloaded(self, "queue_full")
+        if self._waiters.depth(tenant) >= self.tenant_max_queue:
+            self.rejected += 1
+            tenant_stats["rejected"] += 1
+            raise Overloaded(self, "tenant_queue_full")
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.push(tenant, future, weight, priority)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self._waiters.discard(tenant, future, priority)
+            self.timeouts += 1
+            tenant_stats["rejected"] += 1
+            raise Overloaded(self, "queue_timeout")
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the client went away.
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self._waiters.discard(tenant, future, priority)
+            raise
+        waited = (time.perf_counter() - started) * 1000
+        self.admitted += 1
+        tenant_stats["admitted"] += 1
+        tenant_stats["wait_ms"] += waited
+        self._waits_ms.append(waited)
+        return waited
+
+    def release(self, service_ms: Optional[float] = None) -> None:
+        if service_ms is not None:
+            # Exponentially weighted, so Retry-After follows the current load.
+            self._service_ms = service_ms if not self._service_ms else 0.8 * self._service_ms + 0.2 * service_ms
+        while self._waiters:
+            future = self._waiters.pop()
+            if not future.done():
+                future.set_result(None)  # hand the slot straight to the next waiter
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        return {
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait_ms": waits[max(0, math.ceil(len(waits) * 0.95) - 1)] if waits else 0.0,
+            "avg_service_ms": self._service_ms,
+            "retry_after_s": self.retry_after(),
+            "queued_by_tenant": self._waiters.depths(),
+            "tenants": {
+                tenant: {
+                    "admitted": int(stats["admitted"]),
+                    "rejected": int(stats["rejected"]),
+                    "avg_wait_ms": stats["wait_ms"] / stats["admitted"] if stats["admitted"] else 0.0,
+                }
+                for tenant, stats in self._tenants.items()
+            },
+        }
+
+
+def _parse_limits(spec: str) -> Dict[str, tuple]:
+    """Parse ``name=concurrency:queue`` pairs, e.g. ``"ocr=4:16,liveness=2:8"``."""
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, _, values = item.partition("=")
+        concurrency, _, queue = values.partition(":")
+        limits[name.strip()] = (int(concurrency), int(queue or settings.AI_ADMISSION_MAX_QUEUE))
+    return limits
+
+
+def _build_controllers() -> Dict[str, AdmissionController]:
+    overrides = _parse_limits(settings.AI_ADMISSION_LIMITS)
+    controllers = {}
+    for name in ENDPOINTS.values():
+        concurrency, queue = overrides.get(
+            name, (settings.AI_ADMISSION_MAX_CONCURRENCY, settings.AI_ADMISSION_MAX_QUEUE)
+        )
+        controllers[name] = AdmissionController(
+            name, concurrency, queue, settings.AI_ADMISSION_QUEUE_TIMEOUT_S, settings.AI_TENANT_MAX_QUEUE_SHARE
+        )
+    return controllers
+
+
+admission_controllers = _build_controllers()
+
+
+def admission_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: controller.stats() for name, controller in admission_controllers.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the per-endpoint controllers.
+
+    It runs before the request body is read, so shed requests cost almost
+    nothing.
+    """
+
+    def __init__(self, app, controllers: Optional[Dict[str, AdmissionController]] = None):
+        self.app = app
+        self.controllers = controllers if controllers is not None else admission_controllers
+
+    async def __call__(self, scope, receive, send):
+        name = ENDPOINTS.get(scope.get("path", "")) if scope["type"] == "http" else None
+        controller = self.controllers.get(name) if name else None
+        if controller is None or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        tenant, weight = await tenant_directory.resolve(headers)
+        # Callers may demote themselves to batch; batch endpoints stay batch.
+        priority = BATCH if name in BATCH_ENDPOINTS or headers.get("x-priority") == BATCH else INTERACTIVE
+        try:
+            waited = await controller.acquire(tenant, weight, priority)
+        except Overloaded as e:
+            await self._shed(send, e)
+            return
+        started = time.perf_counter()
+
+        async def send_with_wait(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-queue-wait-ms", f"{waited:.0f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_wait)
+        finally:
+            controller.release((time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    async def _shed(send, error: Overloaded) -> None:
+        body = json.dumps(
+            {"detail": str(error), "reason": error.reason, "retry_after": error.retry_after, "queue_depth": error.queue_depth}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(error.retry_after).encode()),
+                    (b"x-queue-depth", str(error.queue_depth).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
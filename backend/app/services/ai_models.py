@@ -1,135 +1,899 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Callable, Optional, AsyncIterator
 from fastapi import UploadFile
-import io
-import base64
+from app.core.config import settings
+from app.services.inference_executor import inference_executor
+from app.services.result_cache import result_cache
+from app.services.preprocessing import PreparedImage, decode_for, prepare_image
+from app.services.document_fields import extract_fields
+from app.services.document_forgery import check_forgery
+from app.services.forgery_index import get_forgery_index
+from app.services.document_roi import TEMPLATES, classify_document, edge_box, grayscale, plan_regions, regions_sufficient
+from app.services.liveness import analyse_video, spool_upload
+from app.services.model_registry import default_versions, model_registry, model_versions
+from app.services.ocr_languages import (
+    detect_language,
+    field_score,
+    latin_printed,
+    pinned_languages,
+    supported_languages,
+    version_language,
+    with_language,
+)
+from app.services.onnx_runtime import get_session_pool, precision_for
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import math
+import os
+import time
+import threading
+import weakref
 
-_paddle_ocr = None
-_insight_model = None
+def _version_spec(version: str, family: str) -> str:
+    prefix, _, spec = version.partition("-")
+    if prefix != family or not spec:
+        raise ValueError(f"{version!r} is not a {family} model version")
+    return spec
 
 
-def _load_paddle_ocr():
-    global _paddle_ocr
-    if _paddle_ocr is None:
+def _load_paddle_ocr(version: str):
+    """Build PaddleOCR for ``paddleocr-<lang>[-angle]``; ``False`` if it is not installed."""
+    spec = _version_spec(version, "paddleocr")
+    angle = spec.endswith("-angle")
+    lang = spec[: -len("-angle")] if angle else spec
+    try:
+        from paddleocr import PaddleOCR
+    except Exception:
+        return False
+    return PaddleOCR(use_angle_cls=angle, lang=lang)
+
+
+def _load_insightface(version: str):
+    """Build InsightFace for ``insightface-<model pack>``; ``False`` if it is not installed."""
+    pack = _version_spec(version, "insightface")
+    try:
+        import insightface
+    except Exception:
+        return False
+    # Only detection and recognition are used; loading the landmark and
+    # gender/age heads would run them on every face for nothing.
+    model = insightface.app.FaceAnalysis(
+        name=pack, allowed_modules=["detection", "recognition"], providers=["CPUExecutionProvider"]
+    )  # requires onnxruntime
+    # FaceAnalysis opens its sessions with library defaults; replace them
+    # with pooled sessions using our thread, arena and precision settings.
+    for task_model in model.models.values():
+        task_model.session = get_session_pool(task_model.model_file, task_model.taskname)
+    max_side = settings.AI_FACE_DET_MAX_SIDE
+    model.prepare(ctx_id=0, det_size=(max_side, max_side))
+    return model
+
+
+def _warmup_ocr(ocr) -> None:
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    canvas = Image.new("RGB", (640, 200), "white")
+    ImageDraw.Draw(canvas).text((40, 80), "WARMUP P<UTO 123456789", fill="black")
+    ocr.ocr(np.array(canvas), cls=True)
+
+
+def _warmup_face(model) -> None:
+    import numpy as np
+
+    image = np.full((640, 640, 3), 127, dtype=np.uint8)
+    model.get(image)
+    detector = getattr(model, "det_model", None)
+    if detector is not None and _dynamic_input(detector):
+        detector.detect(image, input_size=detector_size(image.shape, settings.AI_FACE_DET_LIGHT_SIDE), max_num=1)
+    recognizer = getattr(model, "models", {}).get("recognition")
+    if recognizer is not None:
+        size = recognizer.input_size[0]
+        recognizer.get_feat([np.zeros((size, size, 3), dtype=np.uint8)])
+
+
+# OCR versions come per language; pinned languages stay resident under
+# memory pressure. There is a single face model, always kept.
+model_registry.register("ocr", _load_paddle_ocr, _warmup_ocr, variant=version_language, pinned=pinned_languages)
+model_registry.register("face", _load_insightface, _warmup_face, pinned=lambda: ("",))
+
+
+def preload_models(models) -> Dict[str, Dict[str, Any]]:
+    """Load the configured version of the given models concurrently and warm each up."""
+    versions = default_versions()
+
+    def prepare(name: str):
         try:
-            from paddleocr import PaddleOCR
-        except Exception:
-            _paddle_ocr = False
-            return _paddle_ocr
-        _paddle_ocr = PaddleOCR(use_angle_cls=True, lang="en")
-    return _paddle_ocr
+            report = model_registry.load(name, versions[name])
+        except Exception as e:
+            report = {"available": False, "load_ms": 0.0, "warmup_ms": 0.0, "version": versions[name], "error": str(e)}
+        return name, report
+
+    names = [m for m in models if m in model_registry.kinds()]
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        return dict(pool.map(prepare, names))
+
+
+class _LoopQueue:
+    """A :class:`MicroBatcher`'s pending items on one event loop."""
+
+    def __init__(self) -> None:
+        self.pending: List[Tuple[Any, asyncio.Future, Optional[str]]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: set = set()
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched model calls.
 
+    Items submitted within ``max_wait_ms`` of the first pending item (or until
+    ``max_batch_size`` items are queued) are handed to ``batch_fn`` together
+    on the inference executor, and each awaiting coroutine receives its own
+    result. Items submitted with a model version are only batched with items
+    of the same version, and the batch runs pinned to it.
 
-def _load_insightface():
-    global _insight_model
-    if _insight_model is None:
+    One batcher may serve several event loops (the API's, and one per local
+    task thread). Items are only batched with items of the same loop, which
+    then runs the batch and resolves their futures.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        # Pending items and timer, per event loop.
+        self._queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopQueue]" = weakref.WeakKeyDictionary()
+        self._queues_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+
+    def _queue(self, loop: asyncio.AbstractEventLoop) -> "_LoopQueue":
+        with self._queues_lock:
+            queue = self._queues.get(loop)
+            if queue is None:
+                queue = self._queues[loop] = _LoopQueue()
+            return queue
+
+    async def submit(self, item: Any, version: Optional[str] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        queue = self._queue(loop)
+        future = loop.create_future()
+        queue.pending.append((item, future, version))
+        if len(queue.pending) >= self.max_batch_size:
+            self._dispatch(queue, full_only=True)
+        if queue.pending and queue.timer is None:
+            queue.timer = loop.call_later(self.max_wait_ms / 1000.0, self._on_timer, queue)
+        return await future
+
+    def _on_timer(self, queue: "_LoopQueue") -> None:
+        queue.timer = None
+        self._dispatch(queue, full_only=False)
+
+    def _dispatch(self, queue: "_LoopQueue", full_only: bool) -> None:
+        while queue.pending and (len(queue.pending) >= self.max_batch_size or not full_only):
+            batch = queue.pending[: self.max_batch_size]
+            queue.pending = queue.pending[self.max_batch_size :]
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            # Versions only differ for the few items queued across a model swap.
+            for version in dict.fromkeys(version for _, _, version in batch):
+                group = [(item, fut) for item, fut, v in batch if v == version]
+                task = asyncio.ensure_future(self._run(group, version))
+                queue.tasks.add(task)
+                task.add_done_callback(queue.tasks.discard)
+        if not queue.pending and queue.timer is not None:
+            queue.timer.cancel()
+            queue.timer = None
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]], version: Optional[str] = None) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        versions = {self.name: version} if version else None
         try:
-            import insightface
-        except Exception:
-            _insight_model = False
-            return _insight_model
-        _insight_model = insightface.app.FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"])  # requires onnxruntime
-        _insight_model.prepare(ctx_id=0)
-    return _insight_model
+            results = await inference_executor.run(self.batch_fn, [item for item, _ in batch], versions)
+        except Exception as e:
+            self.failed_batches += 1
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
 
+    def stats(self) -> Dict[str, Any]:
+        avg = self.items / self.batches if self.batches else 0.0
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "failed_batches": self.failed_batches,
+            "pending": sum(len(queue.pending) for queue in list(self._queues.values())),
+            "avg_batch_size": avg,
+            "fill_rate": avg / self.max_batch_size,
+        }
 
-def _image_from_upload(file: UploadFile):
-    data = file.file.read()
-    try:
-        from PIL import Image
-    except Exception:
+
+def _crop_text_box(img, box):
+    import cv2
+    import numpy as np
+
+    pts = np.asarray(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+    height = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+    dst = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(pts, dst)
+    crop = cv2.warpPerspective(img, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if height and crop.shape[0] / max(crop.shape[1], 1) >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def _ocr_batch(images: List[Any]) -> List[Any]:
+    """Run PaddleOCR over a batch of images.
+
+    Text detection is per image, but the recognition (and angle classifier)
+    pass runs once over the line crops of every image in the batch. Falls back
+    to per-image ``ocr.ocr`` when the pipeline internals are not exposed, and
+    yields ``None`` per image when PaddleOCR is unavailable. Runs on the
+    model version the batch is pinned to.
+    """
+    with model_registry.use("ocr") as ocr:
+        if ocr is False:
+            return [None] * len(images)
+        detector = getattr(ocr, "text_detector", None)
+        recognizer = getattr(ocr, "text_recognizer", None)
+        if detector is None or recognizer is None:
+            return [ocr.ocr(img, cls=True) for img in images]
+        classifier = getattr(ocr, "text_classifier", None)
+        drop_score = getattr(ocr, "drop_score", 0.5)
+        crops, owners, boxes = [], [], []
+        for i, img in enumerate(images):
+            dt_boxes, _ = detector(img)
+            if dt_boxes is None:
+                continue
+            for box in sorted(dt_boxes, key=lambda b: (b[0][1], b[0][0])):
+                crops.append(_crop_text_box(img, box))
+                owners.append(i)
+                boxes.append(box.tolist())
+        results: List[List[Any]] = [[] for _ in images]
+        if crops:
+            if classifier is not None:
+                crops, _, _ = classifier(crops)
+            rec_res, _ = recognizer(crops)
+            for owner, box, (text, conf) in zip(owners, boxes, rec_res):
+                if conf >= drop_score:
+                    results[owner].append([box, (text, conf)])
+        return [[lines] for lines in results]
+
+
+def detector_size(shape: Tuple[int, ...], max_side: int) -> Tuple[int, int]:
+    """Detector input ``(width, height)``: the image's own size, capped at ``max_side``, in multiples of 32."""
+    height, width = shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    return max(32, math.ceil(width * scale / 32) * 32), max(32, math.ceil(height * scale / 32) * 32)
+
+
+def _dynamic_input(detector) -> bool:
+    """Whether the detection model accepts inputs of any size."""
+    shape = getattr(detector, "input_shape", None)
+    return shape is None or not all(isinstance(dim, int) for dim in shape[2:])
+
+
+# Which detection pass found the face: the low-resolution pass alone, the
+# full-resolution pass after the light one was unsure, or neither.
+face_cascade_stats = {"light": 0, "full": 0, "missed": 0}
+
+
+def _detect_primary(detector, img) -> Optional[Tuple[Any, Any]]:
+    """Find the primary face as ``(bbox_and_score, keypoints)``.
+
+    A cheap low-resolution pass runs first. Its answer is kept when the face
+    is confidently detected and large enough at that resolution to place
+    the landmarks well; otherwise the detector runs again at the largest
+    size the input supports.
+    """
+    if not _dynamic_input(detector):
+        bboxes, kpss = detector.detect(img, max_num=1, metric="default")
+    else:
+        light = detector_size(img.shape, settings.AI_FACE_DET_LIGHT_SIDE)
+        bboxes, kpss = detector.detect(img, input_size=light, max_num=1, metric="default")
+        if bboxes.shape[0] and kpss is not None:
+            x1, y1, x2, y2, score = bboxes[0][:5]
+            scale = min(light[0] / img.shape[1], light[1] / img.shape[0])
+            if score >= settings.AI_FACE_CASCADE_MIN_SCORE and min(x2 - x1, y2 - y1) * scale >= settings.AI_FACE_CASCADE_MIN_FACE_PX:
+                face_cascade_stats["light"] += 1
+                return bboxes[0], kpss[0]
+        full = detector_size(img.shape, settings.AI_FACE_DET_MAX_SIDE)
+        if full != light:
+            bboxes, kpss = detector.detect(img, input_size=full, max_num=1, metric="default")
+    if bboxes.shape[0] == 0 or kpss is None:
+        face_cascade_stats["missed"] += 1
         return None
-    image = Image.open(io.BytesIO(data)).convert("RGB")
+    face_cascade_stats["full"] += 1
+    return bboxes[0], kpss[0]
+
+
+def _face_batch(images: List[Any]) -> List[Optional[Dict[str, Any]]]:
+    """Embed the primary face of each image.
+
+    Detection runs per image through the two-pass cascade; the aligned crops
+    of the whole batch go through the recognition model in a single forward
+    pass, all on the model version the batch is pinned to.
+    """
+    import numpy as np
+
+    with model_registry.use("face") as model:
+        if model is False:
+            return [None] * len(images)
+        detector = getattr(model, "det_model", None)
+        recognizer = getattr(model, "models", {}).get("recognition")
+        if detector is None or recognizer is None:
+            primary = []
+            for img in images:
+                faces = model.get(img)
+                primary.append(
+                    {"bbox": faces[0].bbox.tolist(), "det_score": float(faces[0].det_score), "embedding": faces[0].normed_embedding}
+                    if faces
+                    else None
+                )
+            return primary
+        from insightface.utils import face_align
+
+        crops, owners, dets = [], [], []
+        for i, img in enumerate(images):
+            primary = _detect_primary(detector, img)
+            if primary is None:
+                continue
+            det, kps = primary
+            crops.append(face_align.norm_crop(img, landmark=kps, image_size=recognizer.input_size[0]))
+            owners.append(i)
+            dets.append(det)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        if crops:
+            feats = np.asarray(recognizer.get_feat(crops), dtype=np.float32)
+            feats /= np.maximum(np.linalg.norm(feats, axis=1, keepdims=True), 1e-12)
+            for owner, det, emb in zip(owners, dets, feats):
+                results[owner] = {"bbox": det[:4].tolist(), "det_score": float(det[4]), "embedding": emb}
+        return results
+
+
+ocr_batcher = MicroBatcher("ocr", _ocr_batch, settings.AI_BATCH_MAX_SIZE, settings.AI_BATCH_MAX_WAIT_MS)
+face_batcher = MicroBatcher("face", _face_batch, settings.AI_BATCH_MAX_SIZE, settings.AI_BATCH_MAX_WAIT_MS)
+
+
+def batching_stats() -> Dict[str, Any]:
+    return {b.name: b.stats() for b in (ocr_batcher, face_batcher)}
+
+
+async def _embed_face(
+    data: bytes, prepared: Optional[PreparedImage] = None, version: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Embed the primary face of an encoded image with face model ``version``.
+
+    Without a version the active one is held for the call. Callers comparing
+    several faces pass the version they hold, so every face of a comparison
+    comes from the same model.
+    """
+    if version is None:
+        with model_versions.hold("face") as version:
+            return await _embed_face(data, prepared, version)
+    detection = f"{settings.AI_FACE_DET_LIGHT_SIDE}-{settings.AI_FACE_DET_MAX_SIDE}"
+    precision = "-int8" if precision_for("recognition") == "int8" else ""
+    key = result_cache.key("face", f"{version}{precision}@{settings.AI_FACE_MAX_SIDE}/det{detection}", data)
+    face = await result_cache.get(key)
+    if face is not None:
+        return face
+    if prepared is None:
+        img = await asyncio.to_thread(decode_for, data, "face")
+    else:
+        img = await asyncio.to_thread(prepared.for_model, "face")
+    if img is None:
+        return None
+    face = await face_batcher.submit(img, version)
+    if face is not None:
+        face = {**face, "model_version": version}
+        await result_cache.set(key, face)
+    return face
+
+
+def _ocr_lines(result) -> Dict[str, List[Any]]:
+    texts = []
+    confs = []
+    for line in result:
+        for _, (text, conf) in line:
+            texts.append(text)
+            confs.append(float(conf))
+    return {"lines": texts, "confidences": confs}
+
+
+def _document_info(ocr_lines: Dict[str, List[Any]], document_type: Optional[str]) -> Dict[str, Any]:
+    texts = ocr_lines["lines"]
+    confs = ocr_lines["confidences"]
+    confidence = sum(confs) / len(confs) if confs else 0.0
+    fields = extract_fields(texts, document_type)
+    return {
+        "full_name": fields["full_name"],
+        "date_of_birth": fields["date_of_birth"],
+        "document_number": fields["document_number"],
+        "expiry_date": fields["expiry_date"],
+        "confidence": confidence,
+        "raw_text": " ".join(texts),
+        "document_type": fields["document_type"],
+        "nationality": fields["nationality"],
+        "sex": fields["sex"],
+        "mrz": fields["mrz"],
+    }
+
+
+def _empty_document(document_type: Optional[str]) -> Dict[str, Any]:
+    return {
+        "full_name": None,
+        "date_of_birth": None,
+        "document_number": None,
+        "expiry_date": None,
+        "confidence": 0.0,
+        "raw_text": None,
+        "document_type": document_type,
+        "nationality": None,
+        "sex": None,
+        "mrz": None,
+    }
+
+
+# Reason code -> (severity, message shown to the customer) for the quality gate.
+QUALITY_REASONS = {
+    "blurry": ("reject", "The photo is blurry. Hold the camera steady and let it focus."),
+    "too_dark": ("reject", "The photo is too dark. Move somewhere brighter."),
+    "overexposed": ("reject", "The photo is overexposed. Avoid pointing the camera at a light."),
+    "glare": ("reject", "Glare is covering part of the document. Tilt it away from the light."),
+    "document_too_small": ("reject", "The document is too far away. Move closer so it fills the frame."),
+    "document_cropped": ("warn", "Part of the document may be cut off. Keep all four edges in the frame."),
+}
+GLARE_LEVEL = 245  # every channel at or above this counts as a specular highlight
+EDGE_BORDER = 0.02  # edge content this close to the frame border touches it
+
+
+def assess_image_quality(image) -> Dict[str, Any]:
+    """Check an RGB capture for blur, exposure, glare and document coverage.
+
+    Meant for the small ``quality`` view of an upload, where it takes a few
+    milliseconds. Problems are returned as reason codes with a customer
+    facing message; any ``reject`` reason fails the capture.
+    """
+    import numpy as np
+
+    started = time.perf_counter()
+    pixels = np.asarray(image)
+    gray = grayscale(pixels)
+    if pixels.ndim == 3:
+        r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+        glare = float(((r >= GLARE_LEVEL) & (g >= GLARE_LEVEL) & (b >= GLARE_LEVEL)).mean())
+    else:
+        glare = float((pixels >= GLARE_LEVEL).mean())
+    height, width = gray.shape
+
+    # Blur: variance of the 4-neighbour Laplacian.
+    lap = 4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1] - gray[1:-1, :-2] - gray[1:-1, 2:]
+    sharpness = float(lap.var())
+
+    # Exposure: mean level plus the share of crushed and blown pixels.
+    hist = np.bincount(gray.astype(np.uint8).ravel(), minlength=256)
+    brightness = float(gray.mean())
+    dark = float(hist[:16].sum()) / gray.size
+    bright = float(hist[240:].sum()) / gray.size
+
+    # Coverage: the box around strong edges (document outline and text) as
+    # a share of the frame.
+    box = edge_box(gray)
+    coverage, touching = 0.0, 0
+    if box is not None:
+        top, bottom, left, right = box
+        coverage = float((right - left) * (bottom - top)) / (width * height)
+        margin_x, margin_y = width * EDGE_BORDER, height * EDGE_BORDER
+        touching = (
+            int(left <= margin_x) + int(right >= width - 1 - margin_x) + int(top <= margin_y) + int(bottom >= height - 1 - margin_y)
+        )
+
+    codes = []
+    if sharpness < settings.AI_QUALITY_MIN_SHARPNESS:
+        codes.append("blurry")
+    if brightness < settings.AI_QUALITY_MIN_BRIGHTNESS:
+        codes.append("too_dark")
+    elif brightness > settings.AI_QUALITY_MAX_BRIGHTNESS:
+        codes.append("overexposed")
+    elif glare > settings.AI_QUALITY_MAX_GLARE:
+        codes.append("glare")
+    if coverage < settings.AI_QUALITY_MIN_COVERAGE:
+        codes.append("document_too_small")
+    elif touching >= 3:
+        codes.append("document_cropped")
+    reasons = [{"code": code, "severity": QUALITY_REASONS[code][0], "message": QUALITY_REASONS[code][1]} for code in codes]
+    return {
+        "passed": all(reason["severity"] != "reject" for reason in reasons),
+        "reasons": reasons,
+        "metrics": {
+            "sharpness": round(sharpness, 2),
+            "brightness": round(brightness, 2),
+            "dark_ratio": round(dark, 4),
+            "bright_ratio": round(bright, 4),
+            "glare_ratio": round(glare, 4),
+            "coverage": round(coverage, 4),
+        },
+        "elapsed_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+async def _check_quality(prepared: Optional[PreparedImage]) -> Optional[Dict[str, Any]]:
+    if not settings.AI_QUALITY_GATE_ENABLED or prepared is None:
+        return None
+    view = await asyncio.to_thread(prepared.for_model, "quality")
+    return await asyncio.to_thread(assess_image_quality, view)
+
+
+# How documents were read: region-of-interest OCR, ROI OCR that fell back to
+# the full page, or the full page straight away.
+ocr_roi_stats = {"roi": 0, "fallback": 0, "full_page": 0}
+
+
+async def _roi_ocr(
+    prepared: PreparedImage, img, document_type: Optional[str], version: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """OCR only the template regions of a classified document.
+
+    Returns ``None`` when the layout is uncertain or the regions do not hold
+    the fields their template promises, so the caller reads the full page.
+    """
+    import numpy as np
+
+    view = await asyncio.to_thread(prepared.for_model, "quality")
+    layout = await asyncio.to_thread(classify_document, view, document_type)
+    if layout is None or layout["confidence"] < settings.AI_OCR_ROI_MIN_LAYOUT_CONFIDENCE:
+        return None
+    regions = plan_regions(layout, img.shape, img.shape[0] / view.shape[0])
+    if not regions:
+        return None
+    crops = [np.ascontiguousarray(img[top:bottom, left:right]) for _, (top, bottom, left, right) in regions]
+    results = await asyncio.gather(*(ocr_batcher.submit(crop, version) for crop in crops))
+    if any(result is None for result in results):
+        return None
+    ocr_lines: Dict[str, Any] = {"lines": [], "confidences": []}
+    for result in results:
+        lines = _ocr_lines(result)
+        ocr_lines["lines"].extend(lines["lines"])
+        ocr_lines["confidences"].extend(lines["confidences"])
+    confs = ocr_lines["confidences"]
+    if not confs or sum(confs) / len(confs) < settings.AI_OCR_ROI_MIN_CONFIDENCE:
+        return None
+    template = layout["template"]
+    fields = extract_fields(ocr_lines["lines"], document_type or TEMPLATES[template]["document_type"])
+    if not regions_sufficient(template, fields):
+        return None
+    ocr_lines["template"] = template
+    return ocr_lines
+
+
+# Final language of each OCR'd document, and how it was chosen: read
+# straight in the requested language, kept in the default language, re-read
+# in a detected language, or re-read after probing the pinned languages.
+ocr_language_stats: Dict[str, Any] = {"requested": 0, "default": 0, "detected": 0, "probed": 0, "languages": {}}
+
+
+async def _read_document(
+    data: bytes,
+    document_type: Optional[str],
+    prepared: Optional[PreparedImage] = None,
+    language: Optional[str] = None,
+) -> Dict[str, Any]:
+    """OCR a document with the active OCR model, tagging the result with the version used.
+
+    ``language`` (a PaddleOCR language code) skips language detection.
+    """
+    with model_versions.hold("ocr") as version:
+        document = await _read_with_model(version, data, document_type, prepared, language)
+    return {"model_version": version, **document}
+
+
+async def _read_with_model(
+    version: str,
+    data: bytes,
+    document_type: Optional[str],
+    prepared: Optional[PreparedImage],
+    language: Optional[str],
+) -> Dict[str, Any]:
+    # Cache the recognised lines rather than the parsed fields, so the
+    # cheap field extraction always reflects the requested document type.
+    # Region OCR reads what the type hint's template asks for, so the hint
+    # becomes part of the key, as does the language hint.
+    tag = f"{version}@{settings.AI_OCR_MAX_SIDE}"
+    if settings.AI_OCR_ROI_ENABLED:
+        tag += f"/roi:{document_type or 'auto'}"
+    if language or settings.AI_OCR_LANGUAGE_ROUTING:
+        tag += f"/lang:{language or 'auto'}"
+    key = result_cache.key("ocr-lines", tag, data)
+    ocr_lines = await result_cache.get(key)
+    quality = None
+    if ocr_lines is None:
+        if prepared is None:
+            prepared = await asyncio.to_thread(prepare_image, data, ("ocr",))
+        # Hopeless captures are turned away before the OCR model sees them.
+        quality = await _check_quality(prepared)
+        if quality is not None and not quality["passed"]:
+            return {**_empty_document(document_type), "quality": quality}
+        img = await asyncio.to_thread(prepared.for_model, "ocr") if prepared is not None else None
+        if img is None:
+            return {**_empty_document(document_type), "quality": quality}
+        ocr_lines = await _ocr_pages(prepared, img, document_type, with_language(version, language) if language else version)
+        if ocr_lines is None:
+            return {**_empty_document(document_type), "quality": quality}
+        if language:
+            ocr_language_stats["requested"] += 1
+        elif settings.AI_OCR_LANGUAGE_ROUTING:
+            ocr_lines = await _route_language(prepared, img, document_type, ocr_lines)
+        languages = ocr_language_stats["languages"]
+        languages[ocr_lines["language"]] = languages.get(ocr_lines["language"], 0) + 1
+        await result_cache.set(key, ocr_lines)
+    return {
+        **_document_info(ocr_lines, document_type),
+        "ocr_template": ocr_lines.get("template"),
+        "ocr_language": ocr_lines.get("language"),
+        "model_version": ocr_lines.get("model_version"),
+        "quality": quality,
+    }
+
+
+async def _ocr_pages(
+    prepared: PreparedImage, img, document_type: Optional[str], version: str
+) -> Optional[Dict[str, Any]]:
+    """Read a document with one OCR model version: template regions first, else the full page."""
+    ocr_lines = None
+    if settings.AI_OCR_ROI_ENABLED:
+        ocr_lines = await _roi_ocr(prepared, img, document_type, version)
+        ocr_roi_stats["roi" if ocr_lines is not None else "fallback"] += 1
+    else:
+        ocr_roi_stats["full_page"] += 1
+    if ocr_lines is None:
+        result = await ocr_batcher.submit(img, version)
+        if result is None:
+            return None
+        ocr_lines = {**_ocr_lines(result), "template": None}
+    ocr_lines.update(model_version=version, language=version_language(version))
+    return ocr_lines
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+async def _route_language(
+    prepared: PreparedImage, img, document_type: Optional[str], first: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Re-read a document in its own language when the first pass shows another one.
+
+    A language found on the document (MRZ country, header words) gets one
+    re-read, kept only if it reads more fields, or as many with higher
+    confidence. A document printed in Latin script whose MRZ already
+    validated is left alone. With no signal and a first pass the model could
+    barely read, the pinned languages are probed and the best reading wins.
+    """
+    version = first["model_version"]
+    default = first["language"]
+    fields = extract_fields(first["lines"], document_type)
+    detected = detect_language(first["lines"], fields)
+    probing = False
+    if detected and detected != default:
+        if latin_printed(detected, fields) and (fields.get("mrz") or {}).get("valid"):
+            candidates = []
+        else:
+            candidates = [detected]
+    elif detected is None and _mean(first["confidences"]) < settings.AI_OCR_LANGUAGE_PROBE_CONFIDENCE:
+        probing = True
+        candidates = [lang for lang in pinned_languages() if lang != default and lang in supported_languages()]
+    else:
+        candidates = []
+    best, best_score = first, (field_score(fields), _mean(first["confidences"]))
+    for language in candidates:
+        reading = await _ocr_pages(prepared, img, document_type, with_language(version, language))
+        if reading is None:
+            continue
+        score = (field_score(extract_fields(reading["lines"], document_type)), _mean(reading["confidences"]))
+        if score > best_score:
+            best, best_score = reading, score
+    ocr_language_stats["default" if best is first else "probed" if probing else "detected"] += 1
+    return best
+
+
+class OCRService:
+    @staticmethod
+    async def extract_document_info(
+        file: UploadFile, document_type: Optional[str] = None, language: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return await _read_document(await file.read(), document_type, language=language)
+
+
+class ImageQualityService:
+    @staticmethod
+    async def check_image(file: UploadFile) -> Dict[str, Any]:
+        """Run only the quality gate, for live feedback while capturing."""
+        img = await asyncio.to_thread(decode_for, await file.read(), "quality")
+        if img is None:
+            return {"passed": True, "reasons": [], "metrics": None, "elapsed_ms": 0.0}
+        return await asyncio.to_thread(assess_image_quality, img)
+
+
+class FaceVerificationService:
+    @staticmethod
+    async def verify_face_match(
+        selfie: UploadFile,
+        document_face: UploadFile,
+        reference_id: Optional[str] = None,
+        organization_id: str = "",
+    ) -> Dict[str, Any]:
+        return await FaceVerificationService.match_images(
+            await selfie.read(), await document_face.read(), reference_id, organization_id
+        )
+
+    @staticmethod
+    async def match_images(
+        selfie_data: bytes, document_data: bytes, reference_id: Optional[str] = None, organization_id: str = ""
+    ) -> Dict[str, Any]:
+        """Match two encoded images, storing their embeddings under ``reference_id`` when given.
+
+        Only an organization's own references are stored or replaced
+        (``PermissionError`` otherwise).
+        """
+        with model_versions.hold("face") as version:
+            face1, face2 = await asyncio.gather(
+                _embed_face(selfie_data, version=version), _embed_face(document_data, version=version)
+            )
+        if reference_id and organization_id:
+            await _store_faces(reference_id, organization_id, face1, face2, version)
+        return {**_face_match(face1, face2), "model_version": version}
+
+
+def _face_match(
+    face1: Optional[Dict[str, Any]], face2: Optional[Dict[str, Any]], threshold: Optional[float] = None
+) -> Dict[str, Any]:
+    if face1 is None or face2 is None:
+        return {"match": False, "confidence": 0.0}
+    emb1 = face1["embedding"]
+    emb2 = face2["embedding"]
     try:
         import numpy as np
+        sim = float(np.dot(emb1, emb2))
     except Exception:
-        return None
-    return np.array(image)
+        sim = 0.0
+    match = sim >= (settings.FACE_MATCH_THRESHOLD if threshold is None else threshold)
+    return {"match": match, "confidence": sim}
 
 
-class OCRService:
+async def _store_faces(
+    reference_id: str,
+    organization_id: str,
+    selfie: Optional[Dict[str, Any]],
+    document: Optional[Dict[str, Any]],
+    version: str,
+) -> None:
+    """Keep the pair's embeddings so later checks need no model.
+
+    The pair replaces any stored under ``reference_id``, including where no
+    face was found: a stale slot would be matched against the new one.
+    """
+    from app.services.face_embeddings import get_face_embedding_store
+
+    store = await asyncio.to_thread(get_face_embedding_store)
+    await asyncio.to_thread(
+        store.put,
+        reference_id,
+        organization_id,
+        selfie["embedding"] if selfie is not None else None,
+        document["embedding"] if document is not None else None,
+        version,
+    )
+
+
+class FaceReverificationService:
+    """Face match decisions recomputed from stored embeddings alone."""
+
     @staticmethod
-    async def extract_document_info(file: UploadFile) -> Dict[str, Any]:
-        ocr = _load_paddle_ocr()
-        img = _image_from_upload(file)
-        if ocr is False or img is None:
-            return {
-                "full_name": None,
-                "date_of_birth": None,
-                "document_number": None,
-                "expiry_date": None,
-                "confidence": 0.0,
-                "raw_text": None,
-            }
-        result = ocr.ocr(img, cls=True)
-        texts = []
-        confs = []
-        for line in result:
-            for _, (text, conf) in line:
-                texts.append(text)
-                confs.append(conf)
-        try:
-            import numpy as np
-            confidence = float(np.mean(confs)) if confs else 0.0
-        except Exception:
-            confidence = 0.0
-        full_text = " ".join(texts)
-        doc_num = None
-        dob = None
-        exp = None
-        name = None
-        for t in texts:
-            if not doc_num and any(k in t.upper() for k in ["ID", "NO", "NUMBER", "DOC"]):
-                parts = [p for p in t.split() if any(c.isdigit() for c in p)]
-                if parts:
-                    doc_num = parts[-1]
-            if not dob and any(k in t.lower() for k in ["dob", "birth", "date"]):
-                parts = [p for p in t.replace("-", "/").split() if any(c.isdigit() for c in p)]
-                if parts:
-                    dob = parts[-1]
-            if not exp and "exp" in t.lower():
-                parts = [p for p in t.replace("-", "/").split() if any(c.isdigit() for c in p)]
-                if parts:
-                    exp = parts[-1]
-        words = [w for w in full_text.split() if w.isalpha() and w[0].isupper()]
-        if words:
-            name = " ".join(words[:2])
+    async def reverify(reference_id: str, organization_id: str, threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Re-run the match for one stored pair; ``None`` if the organization has no such pair."""
+        from app.services.face_embeddings import get_face_embedding_store
+
+        store = await asyncio.to_thread(get_face_embedding_store)
+        entry = await asyncio.to_thread(store.get, reference_id)
+        if entry is None or entry["organization_id"] != organization_id:
+            return None
+        faces = [{"embedding": entry[slot]} if entry[slot] is not None else None for slot in ("selfie", "document")]
         return {
-            "full_name": name,
-            "date_of_birth": dob,
-            "document_number": doc_num,
-            "expiry_date": exp,
-            "confidence": confidence,
-            "raw_text": full_text,
+            "reference_id": reference_id,
+            **_face_match(faces[0], faces[1], threshold),
+            "threshold": settings.FACE_MATCH_THRESHOLD if threshold is None else threshold,
+            "selfie_stored": faces[0] is not None,
+            "document_stored": faces[1] is not None,
+            "model_version": entry["model_version"],
         }
 
+    @staticmethod
+    async def rescore(
+        organization_id: str, threshold: Optional[float] = None, model_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Apply a match threshold to every stored pair of an organization.
 
-class FaceVerificationService:
+        Only pairs embedded by ``model_version`` (the active face model when
+        omitted) are scored; a threshold means nothing across versions.
+        """
+        from app.services.face_embeddings import get_face_embedding_store
+        import numpy as np
+
+        started = time.perf_counter()
+        threshold = settings.FACE_MATCH_THRESHOLD if threshold is None else threshold
+        model_version = model_version or model_versions.active["face"]
+        store = await asyncio.to_thread(get_face_embedding_store)
+        keys, scores = await asyncio.to_thread(store.similarities, organization_id, model_version)
+        complete = ~np.isnan(scores)
+        matched = complete & (scores >= threshold)
+        return {
+            "threshold": threshold,
+            "model_version": model_version,
+            "count": len(keys),
+            "matched": int(matched.sum()),
+            "not_matched": int((complete & ~matched).sum()),
+            "incomplete": int((~complete).sum()),
+            "not_matched_ids": [key for key, hit, full in zip(keys, matched, complete) if full and not hit],
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+
+class FaceDeduplicationService:
     @staticmethod
-    async def verify_face_match(selfie: UploadFile, document_face: UploadFile) -> Dict[str, Any]:
-        model = _load_insightface()
-        img1 = _image_from_upload(selfie)
-        img2 = _image_from_upload(document_face)
-        if model is False or img1 is None or img2 is None:
-            return {"match": False, "confidence": 0.0}
-        faces1 = model.get(img1)
-        faces2 = model.get(img2)
-        if not faces1 or not faces2:
-            return {"match": False, "confidence": 0.0}
-        emb1 = faces1[0].normed_embedding
-        emb2 = faces2[0].normed_embedding
-        try:
-            import numpy as np
-            sim = float(np.dot(emb1, emb2))
-        except Exception:
-            sim = 0.0
-        match = sim >= 0.4
-        return {"match": match, "confidence": sim}
+    async def find_duplicates(
+        organization_id: str,
+        image_data: bytes,
+        subject_id: Optional[str] = None,
+        enroll: bool = False,
+        k: int = 5,
+    ) -> Dict[str, Any]:
+        """Search the organization's face index for the same face under other subjects."""
+        face = await _embed_face(image_data)
+        if face is None:
+            return {"face_detected": False, "duplicates": [], "enrolled": False, "model_version": None}
+        from app.services.face_index import get_face_index
+
+        index = await asyncio.to_thread(get_face_index, organization_id, face["model_version"])
+        matches = await asyncio.to_thread(index.search, face["embedding"], k, subject_id)
+        duplicates = [
+            {"subject_id": match_id, "similarity": score}
+            for match_id, score in matches
+            if score >= settings.FACE_DEDUP_THRESHOLD
+        ]
+        enrolled = False
+        if enroll and subject_id:
+            await asyncio.to_thread(index.add, subject_id, face["embedding"])
+            enrolled = True
+        return {"face_detected": True, "duplicates": duplicates, "enrolled": enrolled, "model_version": face["model_version"]}
 
 
 class LivenessCheckService:
     @staticmethod
     async def check_liveness(video: UploadFile) -> Dict[str, Any]:
-        return {"is_live": True, "confidence": 0.5, "liveness_score": 0.5}
+        # Only the spooled file's path crosses into the worker; frames are
+        # decoded and discarded there one at a time.
+        path = await spool_upload(video, settings.LIVENESS_MAX_UPLOAD_BYTES)
+        try:
+            return await inference_executor.call(analyse_video, path)
+        finally:
+            os.unlink(path)
 
 
 class DeepfakeDetectionService:
@@ -137,19 +901,244 @@ class DeepfakeDetectionService:
     async def detect_deepfake(image: UploadFile) -> Dict[str, Any]:
         return {"is_deepfake": False, "confidence": 0.5}
 
+    @staticmethod
+    def score_face(crop) -> Dict[str, Any]:
+        """Score an already detected and cropped face."""
+        # No deepfake model is integrated yet; the answer matches detect_deepfake.
+        return {"is_deepfake": False, "confidence": 0.5}
+
+
+def _forgery_skipped(reason: str) -> Dict[str, Any]:
+    return {"checked": False, "template": None, "score": None, "is_forged": None, "reasons": [reason]}
+
+
+async def _check_document_forgery(
+    data: bytes, prepared: Optional[PreparedImage] = None, template_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Compare a document capture with the genuine template index.
+
+    Raises ``KeyError`` for a ``template_id`` the index does not hold.
+    """
+    if not settings.AI_FORGERY_ENABLED:
+        return _forgery_skipped("forgery_check_disabled")
+    index = await asyncio.to_thread(get_forgery_index)
+    if index is None:
+        return _forgery_skipped("no_template_index")
+    if template_id is not None and index.find(template_id) is None:
+        raise KeyError(template_id)
+    key = result_cache.key("forgery", f"{index.version}@{settings.AI_FORGERY_MAX_SIDE}/{template_id or 'auto'}", data)
+    cached = await result_cache.get(key)
+    if cached is not None:
+        return cached
+    if prepared is None:
+        img = await asyncio.to_thread(decode_for, data, "forgery")
+    else:
+        img = await asyncio.to_thread(prepared.for_model, "forgery")
+    if img is None:
+        return _forgery_skipped("unreadable_image")
+    result = await asyncio.to_thread(
+        check_forgery, img, index, template_id, settings.AI_FORGERY_BUDGET_MS, settings.AI_FORGERY_THRESHOLD
+    )
+    await result_cache.set(key, result)
+    return result
+
+
+class DocumentForgeryService:
+    @staticmethod
+    async def check_document(file: UploadFile, template_id: Optional[str] = None) -> Dict[str, Any]:
+        return await _check_document_forgery(await file.read(), template_id=template_id)
+
+
+# (feature, weight) pairs of the linear risk score; falsy features count as 0.
+RISK_WEIGHTS = (
+    ("documentAuthenticity", 0.25),
+    ("faceMatchScore", 0.25),
+    ("gpsMatch", 0.2),
+    ("phoneVerification", 0.15),
+)
+RISK_BASE_SCORE = 15
+
+
+def _risk_level(score: float) -> str:
+    return "green" if score >= 85 else "amber" if score >= 60 else "red"
+
+
+def score_risk_batch(rows: List[Any]) -> List[Dict[str, Any]]:
+    """Score many feature rows in one vectorized pass.
+
+    Rows that cannot be scored get an ``error`` entry instead of failing the
+    batch; an ``id`` key on a row is echoed back.
+    """
+    import numpy as np
+
+    names = [name for name, _ in RISK_WEIGHTS]
+    errors: List[Optional[str]] = [None] * len(rows)
+    try:
+        # Fast path: NumPy parses the whole table (numbers, numeric strings,
+        # booleans) in one call.
+        features = np.array([[row.get(name) or 0.0 for name in names] for row in rows], dtype=np.float64)
+        features = features.reshape(len(rows), len(names))
+    except (AttributeError, TypeError, ValueError):
+        features = np.zeros((len(rows), len(names)))
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors[i] = "row must be a JSON object"
+                continue
+            try:
+                features[i] = [float(row[name]) if row.get(name) else 0.0 for name in names]
+            except (TypeError, ValueError) as e:
+                errors[i] = str(e)
+    scores = features @ np.array([weight for _, weight in RISK_WEIGHTS]) + RISK_BASE_SCORE
+    # NaN and infinite values (which JSON parsing accepts) have no score.
+    finite = np.isfinite(scores)
+    for i in np.flatnonzero(~finite).tolist():
+        errors[i] = errors[i] or "feature values must be finite numbers"
+    scores = np.where(finite, scores, 0.0)
+    levels = np.where(scores >= 85, "green", np.where(scores >= 60, "amber", "red"))
+    results = []
+    for row, error, score, level in zip(rows, errors, scores.astype(np.int64).tolist(), levels.tolist()):
+        row_id = row.get("id") if isinstance(row, dict) else None
+        if error is not None:
+            results.append({"id": row_id, "error": error})
+        else:
+            results.append({"id": row_id, "score": score, "level": level})
+    return results
+
 
 class RiskScoringService:
     @staticmethod
     async def calculate_risk_score(submission_data: Dict[str, Any]) -> Dict[str, Any]:
         score = 0
-        if submission_data.get("documentAuthenticity"):
-            score += float(submission_data["documentAuthenticity"]) * 0.25
-        if submission_data.get("faceMatchScore"):
-            score += float(submission_data["faceMatchScore"]) * 0.25
-        if submission_data.get("gpsMatch"):
-            score += float(submission_data["gpsMatch"]) * 0.2
-        if submission_data.get("phoneVerification"):
-            score += float(submission_data["phoneVerification"]) * 0.15
-        score += 15
-        level = "green" if score >= 85 else "amber" if score >= 60 else "red"
-        return {"score": int(score), "level": level}
+        for name, weight in RISK_WEIGHTS:
+            if submission_data.get(name):
+                score += float(submission_data[name]) * weight
+        score += RISK_BASE_SCORE
+        return {"score": int(score), "level": _risk_level(score)}
+
+    @staticmethod
+    async def score_batch(rows: AsyncIterator[Any], chunk_rows: int = 4096) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Score a stream of feature rows ``chunk_rows`` at a time, yielding each chunk's results in order."""
+        chunk: List[Any] = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield await asyncio.to_thread(score_risk_batch, chunk)
+                chunk = []
+        if chunk:
+            yield await asyncio.to_thread(score_risk_batch, chunk)
+
+
+def _face_crop(image, bbox: List[float], margin: float = 0.2):
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = bbox
+    mx, my = (x2 - x1) * margin, (y2 - y1) * margin
+    return image[max(0, int(y1 - my)) : min(height, int(y2 + my)), max(0, int(x1 - mx)) : min(width, int(x2 + mx))]
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = (time.perf_counter() - started) * 1000
+
+
+class VerificationService:
+    @staticmethod
+    async def verify(
+        selfie: UploadFile,
+        document: Optional[UploadFile] = None,
+        video: Optional[UploadFile] = None,
+        document_type: Optional[str] = None,
+        run_ocr: bool = False,
+        signals: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Run every verification stage over one set of uploads.
+
+        Each image is decoded once at the largest resolution its stages need
+        and faces are detected once per image; the selfie's face crop is
+        reused for the deepfake check, and a document is also checked
+        against the genuine template index. Independent stages run
+        concurrently and each reports its wall time under ``timings_ms``.
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        selfie_data = await selfie.read()
+        document_data = await document.read() if document is not None else None
+        video_path = await spool_upload(video, settings.LIVENESS_MAX_UPLOAD_BYTES) if video is not None else None
+        liveness = None
+        try:
+            liveness = (
+                asyncio.ensure_future(_timed(timings, "liveness", inference_executor.call(analyse_video, video_path)))
+                if video_path
+                else None
+            )
+
+            async def decode():
+                document_models = ("ocr", "face") if run_ocr else ("face",)
+                if settings.AI_FORGERY_ENABLED and await asyncio.to_thread(get_forgery_index) is not None:
+                    document_models += ("forgery",)
+                return await asyncio.gather(
+                    asyncio.to_thread(prepare_image, selfie_data, ("face", "deepfake")),
+                    asyncio.to_thread(prepare_image, document_data, document_models) if document_data else _none(),
+                )
+
+            selfie_image, document_image = await _timed(timings, "decode", decode())
+
+            async def selfie_stage():
+                face = await _embed_face(selfie_data, selfie_image, face_version)
+                if face is None or selfie_image is None:
+                    return face, None
+                view = await asyncio.to_thread(selfie_image.for_model, "face")
+                crop = _face_crop(view, face["bbox"])
+                deepfake = await _timed(timings, "deepfake", asyncio.to_thread(DeepfakeDetectionService.score_face, crop))
+                return face, deepfake
+
+            async def face_stage():
+                (selfie_face, deepfake), document_face = await asyncio.gather(
+                    selfie_stage(),
+                    _embed_face(document_data, document_image, face_version) if document_data else _none(),
+                )
+                return selfie_face, document_face, deepfake
+
+            # Both faces of the match must come from the same model version.
+            with model_versions.hold("face") as face_version:
+                stages = [_timed(timings, "face", face_stage())]
+                if run_ocr and document_data:
+                    stages.append(_timed(timings, "ocr", _read_document(document_data, document_type, document_image)))
+                if document_data:
+                    stages.append(_timed(timings, "forgery", _check_document_forgery(document_data, document_image)))
+                results = await asyncio.gather(*stages)
+            selfie_face, document_face, deepfake = results[0]
+            ocr = results[1] if run_ocr and document_data else None
+            forgery = results[-1] if document_data else None
+            liveness_result = await liveness if liveness is not None else None
+        finally:
+            if liveness is not None and not liveness.done():
+                liveness.cancel()
+            if video_path:
+                os.unlink(video_path)
+
+        face_match = _face_match(selfie_face, document_face) if document_data else None
+        risk_input = dict(signals or {})
+        if face_match is not None:
+            risk_input["faceMatchScore"] = round(face_match["confidence"] * 100, 2)
+        if forgery is not None and forgery["checked"] and "documentAuthenticity" not in risk_input:
+            risk_input["documentAuthenticity"] = round(forgery["score"] * 100, 2)
+        risk = await _timed(timings, "risk", RiskScoringService.calculate_risk_score(risk_input))
+        timings["total"] = (time.perf_counter() - started) * 1000
+        return {
+            "face_detected": selfie_face is not None,
+            "face_match": face_match,
+            "deepfake": deepfake,
+            "liveness": liveness_result,
+            "ocr": ocr,
+            "forgery": forgery,
+            "risk": risk,
+            "model_versions": {"face": face_version, "ocr": ocr["model_version"] if ocr else None},
+            "timings_ms": timings,
+        }
+
+
+async def _none():
+    return None
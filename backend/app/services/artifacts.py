@@ -0,0 +1,111 @@
+"""
+Content-addressed artifact store for background task payloads.
+
+Verification tasks do not carry images through the broker. The submitting
+process writes each artifact once, under its SHA-256, and the task passes a
+reference ``{"key", "sha256", "size"}``; the worker reads the bytes from the
+store itself and checks them against the digest, so a truncated or replaced
+file fails the stage instead of scoring the wrong image. The store is a
+directory shared by the API and the workers (``ARTIFACT_STORE_PATH``), and
+identical uploads share one file. Files untouched for
+``ARTIFACT_RETENTION_HOURS`` are removed by the maintenance queue.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+from app.core.config import settings
+
+_KEY = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{64})$")
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class ArtifactStore:
+    """Write-once files named by the SHA-256 of their content."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, ref: Dict[str, Any]) -> str:
+        # Keys come from task messages, so only ever resolve to our own layout.
+        match = _KEY.match(ref.get("key") or "")
+        if match is None or match.group(2) != ref.get("sha256") or not match.group(2).startswith(match.group(1)):
+            raise ValueError(f"Invalid artifact reference: {ref.get('key')!r}")
+        return os.path.join(self.root, *ref["key"].split("/"))
+
+    def put(self, data: bytes) -> Dict[str, Any]:
+        """Store ``data`` (once) and return its reference."""
+        digest = hashlib.sha256(data).hexdigest()
+        ref = {"key": f"{digest[:2]}/{digest}", "sha256": digest, "size": len(data)}
+        path = self._path(ref)
+        try:
+            # Already stored: a new pipeline uses it, so keep it from being pruned.
+            os.utime(path)
+            return ref
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write and rename, so a reader never sees half a file.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return ref
+
+    def get(self, ref: Dict[str, Any]) -> bytes:
+        """Read a referenced artifact; ``ValueError`` if it does not match its digest."""
+        with open(self._path(ref), "rb") as fh:
+            data = fh.read()
+        if hashlib.sha256(data).hexdigest() != ref["sha256"]:
+            raise ValueError(f"Artifact {ref['key']} does not match its digest")
+        return data
+
+    def path(self, ref: Dict[str, Any]) -> str:
+        """Verified local path of a referenced artifact, for readers that stream files."""
+        path = self._path(ref)
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(READ_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != ref["sha256"]:
+            raise ValueError(f"Artifact {ref['key']} does not match its digest")
+        return path
+
+    def prune(self, max_age_s: float) -> int:
+        """Remove artifacts (and abandoned partial writes) older than ``max_age_s``; return how many."""
+        cutoff = time.time() - max_age_s
+        removed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the store under ``ARTIFACT_STORE_PATH``."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.root != settings.ARTIFACT_STORE_PATH:
+            _store = ArtifactStore(settings.ARTIFACT_STORE_PATH)
+        return _store
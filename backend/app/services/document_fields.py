@@ -0,0 +1,383 @@
+"""
+Structured field extraction from OCR text lines.
+
+Identity fields are read in a single pass over the recognised lines using
+precompiled label and value patterns for each supported document type. A
+machine readable zone (ICAO 9303 TD1, TD2 or TD3), when present, is parsed
+with check-digit validation and takes precedence over the visual zone.
+"""
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MRZ_WEIGHTS = (7, 3, 1)
+
+# (lines, line length) per ICAO 9303 format
+MRZ_FORMATS = {"TD1": (3, 30), "TD2": (2, 36), "TD3": (2, 44)}
+
+_MRZ_CANDIDATE_RE = re.compile(r"^(?=.*<)[A-Z0-9<]{10,48}$")
+_MRZ_CHAR_FIXES = str.maketrans({"«": "<", "‹": "<", "{": "<", "(": "<", "[": "<", " ": ""})
+_TO_DIGIT = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "G": "6", "B": "8"})
+_AMBIGUOUS = frozenset("OQDILZSGB")
+_MRZ_VALUES = {**{str(d): d for d in range(10)}, **{chr(65 + i): 10 + i for i in range(26)}}
+# Cheap pre-filter: only lines holding a filler (or a look-alike) can be MRZ.
+_FILLERS = ("<", "«", "‹")
+
+_MONTHS = {m: i for i, m in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], start=1)}
+_DATE_RE = re.compile(
+    r"(?P<iso>(?P<iy>\d{4})[-/.](?P<im>\d{1,2})[-/.](?P<id>\d{1,2}))"
+    r"|(?P<num>(?P<na>\d{1,2})[-/.](?P<nb>\d{1,2})[-/.](?P<ny>\d{4}|\d{2}))"
+    r"|(?P<txt>(?P<td>\d{1,2})\s*(?P<tm>JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[A-Z]*(?:/[A-Z]+)?[\s,.]*(?P<ty>\d{4}|\d{2}))"
+    r"|(?P<year>\b(?:19|20)\d{2}\b)"
+)
+
+_LABELS = {
+    "document_number": r"(?:PASSPORT|DOCUMENT|DOC|ID|CARD|DL|LICEN[CS]E|LIC|AADHAAR|AADHAR)\.?\s*(?:NO|NUMBER|NUM|#)\.?",
+    "date_of_birth": r"DATE\s*OF\s*BIRTH|BIRTH\s*DATE|D\.?O\.?B\.?|YEAR\s*OF\s*BIRTH",
+    "expiry_date": r"DATE\s*OF\s*EXPIR(?:Y|ATION)|EXPIR(?:Y|ES|ATION)(?:\s*DATE)?|EXP\.?|VALID\s*(?:UNTIL|TILL|THRU|UPTO)",
+    "surname": r"SURNAME|LAST\s*NAME|FAMILY\s*NAME",
+    "given_names": r"GIVEN\s*NAMES?|FIRST\s*NAMES?|FORENAMES?",
+    "full_name": r"(?<![A-Z])NAME",
+    "nationality": r"NATIONALITY",
+    "sex": r"SEX|GENDER",
+}
+_LABEL_RE = re.compile(
+    "|".join(f"(?P<{field}>\\b(?:{pattern}))" for field, pattern in _LABELS.items())
+    + r"\s*[:\-/]?\s*"
+)
+
+_DOC_NUMBER_RE = {
+    "passport": re.compile(r"\b(?=[A-Z0-9]*\d)[A-Z0-9]{6,9}\b"),
+    "aadhar": re.compile(r"\b\d{4}\s?\d{4}\s?\d{4}\b"),
+    "license": re.compile(r"\b(?=[A-Z0-9\- ]*\d)[A-Z]{0,3}[A-Z0-9\-]{2,}(?: ?[0-9]{3,})*\b"),
+    "national_id": re.compile(r"\b(?=[A-Z0-9]*\d)[A-Z0-9]{5,18}\b"),
+}
+_DOC_NUMBER_DEFAULT = re.compile(r"\b(?=[A-Z0-9\-]*\d)[A-Z0-9][A-Z0-9\-]{4,19}\b")
+_NAME_RE = re.compile(r"^[A-Z][A-Z'\-]*(?:\s+[A-Z][A-Z'\-]*){0,4}$")
+_SEX_RE = re.compile(r"\b(MALE|FEMALE|M|F|X)\b")
+_NATIONALITY_RE = re.compile(r"\b([A-Z]{3}|[A-Z]{4,})\b")
+
+_DOC_TYPE_KEYWORDS = (
+    ("passport", re.compile(r"PASSPORT|PASSEPORT|PASAPORTE")),
+    ("aadhar", re.compile(r"AADHAAR|AADHAR|UIDAI|UNIQUE IDENTIFICATION|GOVERNMENT OF INDIA")),
+    ("license", re.compile(r"DRIVING\s*LICEN[CS]E|DRIVER'?S?\s*LICEN[CS]E|\bDL\s*NO")),
+    ("utility", re.compile(r"\bBILL\b|ACCOUNT\s*(?:NO|NUMBER)|AMOUNT\s*DUE")),
+    ("national_id", re.compile(r"IDENTITY\s*CARD|NATIONAL\s*ID|\bID\s*CARD")),
+)
+
+# Words that start the header of many documents and are never the holder's name.
+_HEADER_WORDS = {
+    "REPUBLIC", "GOVERNMENT", "PASSPORT", "DRIVING", "LICENCE", "LICENSE", "UNITED", "STATES",
+    "KINGDOM", "INDIA", "IDENTITY", "CARD", "NATIONAL", "DEPARTMENT", "STATE", "UNIQUE", "AUTHORITY",
+}
+
+
+def mrz_check_digit(value: str) -> int:
+    """ICAO 9303 check digit (weights 7, 3, 1) of an MRZ field."""
+    values = _MRZ_VALUES
+    total = 0
+    for i, ch in enumerate(value):
+        total += values.get(ch, 0) * MRZ_WEIGHTS[i % 3]
+    return total % 10
+
+
+def _check(value: str, digit: str) -> bool:
+    return digit.isdigit() and mrz_check_digit(value) == int(digit)
+
+
+def _repair(value: str, digit: str) -> Tuple[str, bool]:
+    """Undo OCR letter/digit confusions in an alphanumeric field.
+
+    Tries every combination of swapping look-alike letters for digits (at
+    most four ambiguous positions) and keeps the first that validates.
+    """
+    digit = _digits(digit)
+    if _check(value, digit):
+        return value, True
+    ambiguous = [i for i, ch in enumerate(value) if ch in _AMBIGUOUS]
+    if not ambiguous or len(ambiguous) > 4:
+        return value, False
+    for mask in range(1, 1 << len(ambiguous)):
+        chars = list(value)
+        for bit, i in enumerate(ambiguous):
+            if mask >> bit & 1:
+                chars[i] = chars[i].translate(_TO_DIGIT)
+        candidate = "".join(chars)
+        if _check(candidate, digit):
+            return candidate, True
+    return value, False
+
+
+def _mrz_date(value: str, expiry: bool) -> Optional[str]:
+    if not value.isdigit() or len(value) != 6:
+        return None
+    yy, mm, dd = int(value[:2]), int(value[2:4]), int(value[4:])
+    year = 2000 + yy
+    if not expiry and year > date.today().year:
+        year -= 100
+    try:
+        return date(year, mm, dd).isoformat()
+    except ValueError:
+        return None
+
+
+def _mrz_names(field: str) -> Tuple[str, str]:
+    surname, _, given = field.partition("<<")
+    return surname.replace("<", " ").strip(), given.replace("<", " ").strip()
+
+
+def _digits(value: str) -> str:
+    return value.translate(_TO_DIGIT)
+
+
+def _normalize_mrz_line(line: str) -> str:
+    return line.upper().translate(_MRZ_CHAR_FIXES)
+
+
+def _fit(line: str, length: int) -> str:
+    return line[:length] if len(line) >= length else line + "<" * (length - len(line))
+
+
+def _parse_td1(l1: str, l2: str, l3: str) -> Dict[str, Any]:
+    number, number_check = l1[5:14], l1[14]
+    optional1 = l1[15:30]
+    if number_check == "<":
+        # Long document numbers continue into the optional data field,
+        # ending with their check digit.
+        tail = optional1.split("<", 1)[0]
+        number, number_check = number + tail[:-1], tail[-1:] or "<"
+    number, number_valid = _repair(number, number_check)
+    l1 = l1[:5] + number + l1[5 + len(number):]
+    dob, dob_check = _digits(l2[0:6]), _digits(l2[6])
+    expiry, expiry_check = _digits(l2[8:14]), _digits(l2[14])
+    composite = _digits(l2[29])
+    surname, given = _mrz_names(l3)
+    checks = {
+        "document_number": number_valid,
+        "date_of_birth": _check(dob, dob_check),
+        "expiry_date": _check(expiry, expiry_check),
+        "composite": _check(l1[5:30] + l2[0:7] + l2[8:15] + l2[18:29], composite),
+    }
+    return {
+        "format": "TD1",
+        "document_code": l1[0:2].replace("<", ""),
+        "issuing_state": l1[2:5].replace("<", ""),
+        "document_number": number.replace("<", ""),
+        "date_of_birth": _mrz_date(dob, expiry=False),
+        "sex": l2[7].replace("<", "") or None,
+        "expiry_date": _mrz_date(expiry, expiry=True),
+        "nationality": l2[15:18].replace("<", ""),
+        "surname": surname,
+        "given_names": given,
+        "checks": checks,
+    }
+
+
+def _parse_td2_td3(fmt: str, l1: str, l2: str) -> Dict[str, Any]:
+    length = MRZ_FORMATS[fmt][1]
+    number, number_valid = _repair(l2[0:9], l2[9])
+    l2 = number + _digits(l2[9]) + l2[10:]
+    dob, dob_check = _digits(l2[13:19]), _digits(l2[19])
+    expiry, expiry_check = _digits(l2[21:27]), _digits(l2[27])
+    composite = _digits(l2[length - 1])
+    surname, given = _mrz_names(l1[5:length])
+    checks = {
+        "document_number": number_valid,
+        "date_of_birth": _check(dob, dob_check),
+        "expiry_date": _check(expiry, expiry_check),
+        "composite": _check(l2[0:10] + dob + dob_check + expiry + expiry_check + l2[28 : length - 1], composite),
+    }
+    if fmt == "TD3":
+        # An empty personal number may carry a filler instead of a check digit.
+        empty = set(l2[28:42]) == {"<"}
+        checks["personal_number"] = (empty and l2[42] in "<0") or _check(l2[28:42], l2[42])
+    return {
+        "format": fmt,
+        "document_code": l1[0:2].replace("<", ""),
+        "issuing_state": l1[2:5].replace("<", ""),
+        "document_number": number.replace("<", ""),
+        "date_of_birth": _mrz_date(dob, expiry=False),
+        "sex": l2[20].replace("<", "") or None,
+        "expiry_date": _mrz_date(expiry, expiry=True),
+        "nationality": l2[10:13].replace("<", ""),
+        "surname": surname,
+        "given_names": given,
+        "checks": checks,
+    }
+
+
+def parse_mrz(lines: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """Parse a machine readable zone from its OCR'd lines.
+
+    Lines are normalised (case, spaces, look-alike filler characters) and
+    padded with fillers or trimmed to the best-validating ICAO format. Returns ``None`` if the
+    lines do not form an MRZ; otherwise the parsed fields plus per-field
+    check-digit results and an overall ``valid`` flag.
+    """
+    rows = [_normalize_mrz_line(line) for line in lines if line and line.strip()]
+    rows = [row for row in rows if _MRZ_CANDIDATE_RE.match(row)]
+    if len(rows) < 2:
+        return None
+    best = None
+    for fmt, (count, length) in MRZ_FORMATS.items():
+        if len(rows) < count:
+            continue
+        window = rows[-count:]
+        # OCR often drops trailing fillers, so rows may be short, but the
+        # longest one must be close to the format's line length.
+        if any(len(row) > length + 3 for row in window) or max(map(len, window)) < length - 3:
+            continue
+        fitted = [_fit(row, length) for row in window]
+        parsed = _parse_td1(*fitted) if fmt == "TD1" else _parse_td2_td3(fmt, *fitted)
+        score = sum(parsed["checks"].values())
+        if best is None or score > best[0]:
+            best = (score, parsed)
+    if best is None:
+        return None
+    parsed = best[1]
+    parsed["valid"] = all(parsed["checks"].values())
+    return parsed
+
+
+def _year(value: str, past: bool) -> int:
+    if len(value) == 4:
+        return int(value)
+    year = 2000 + int(value)
+    return year - 100 if past and year > date.today().year else year
+
+
+def _parse_date(text: str, past: bool = False) -> Optional[str]:
+    match = _DATE_RE.search(text)
+    if not match:
+        return None
+    try:
+        if match.group("iso"):
+            return date(int(match.group("iy")), int(match.group("im")), int(match.group("id"))).isoformat()
+        if match.group("num"):
+            a, b, year = int(match.group("na")), int(match.group("nb")), _year(match.group("ny"), past)
+            # Day-first unless that is impossible (US-style month-first).
+            day, month = (a, b) if b <= 12 else (b, a)
+            return date(year, month, day).isoformat()
+        if match.group("txt"):
+            year = _year(match.group("ty"), past)
+            return date(year, _MONTHS[match.group("tm")], int(match.group("td"))).isoformat()
+        return match.group("year")
+    except ValueError:
+        return None
+
+
+def _value_for(field: str, text: str, document_type: Optional[str]) -> Optional[str]:
+    text = text.strip(" :.-#")
+    if not text:
+        return None
+    if field in ("date_of_birth", "expiry_date"):
+        return _parse_date(text, past=field == "date_of_birth")
+    if field == "document_number":
+        match = _DOC_NUMBER_RE.get(document_type or "", _DOC_NUMBER_DEFAULT).search(text)
+        return match.group(0).replace(" ", "") if match else None
+    if field in ("surname", "given_names", "full_name"):
+        return text if _NAME_RE.match(text) else None
+    if field == "sex":
+        match = _SEX_RE.search(text)
+        return match.group(1)[0] if match else None
+    if field == "nationality":
+        match = _NATIONALITY_RE.search(text)
+        return match.group(1) if match else None
+    return None
+
+
+def detect_document_type(text: str) -> Optional[str]:
+    upper = text.upper()
+    for document_type, pattern in _DOC_TYPE_KEYWORDS:
+        if pattern.search(upper):
+            return document_type
+    return None
+
+
+def _title(name: str) -> str:
+    return " ".join(part.capitalize() for part in name.split())
+
+
+def extract_fields(lines: List[str], document_type: Optional[str] = None) -> Dict[str, Any]:
+    """Extract identity fields from OCR lines (in reading order) in one pass."""
+    found: Dict[str, str] = {}
+    mrz_rows: List[str] = []
+    pending: Optional[str] = None
+    previous_name_line: Optional[str] = None
+    upper_lines = [line.strip().upper() for line in lines]
+    document_type = document_type or detect_document_type(" ".join(upper_lines))
+
+    for upper in upper_lines:
+        if not upper:
+            continue
+        if any(filler in upper for filler in _FILLERS):
+            compact = _normalize_mrz_line(upper)
+            if _MRZ_CANDIDATE_RE.match(compact):
+                mrz_rows.append(compact)
+                pending = None
+                continue
+        labels = list(_LABEL_RE.finditer(upper))
+        if pending and not labels:
+            value = _value_for(pending, upper, document_type)
+            if value:
+                found.setdefault(pending, value)
+                pending = None
+                continue
+        pending = None
+        for i, match in enumerate(labels):
+            field = match.lastgroup
+            end = labels[i + 1].start() if i + 1 < len(labels) else len(upper)
+            value = _value_for(field, upper[match.end():end], document_type)
+            if value:
+                found.setdefault(field, value)
+            else:
+                pending = field
+            if field == "date_of_birth" and "full_name" not in found and previous_name_line:
+                # Cards without a name label (e.g. Aadhaar) print the name
+                # right above the date of birth.
+                found["full_name"] = previous_name_line
+        if not labels:
+            if document_type == "aadhar" and "document_number" not in found:
+                match = _DOC_NUMBER_RE["aadhar"].search(upper)
+                if match:
+                    found["document_number"] = match.group(0).replace(" ", "")
+                    continue
+            words = upper.split()
+            if _NAME_RE.match(upper) and not _HEADER_WORDS.intersection(words):
+                previous_name_line = upper
+                continue
+        previous_name_line = None
+
+    mrz = parse_mrz(mrz_rows) if len(mrz_rows) >= 2 else None
+    full_name = found.get("full_name")
+    if not full_name and (found.get("given_names") or found.get("surname")):
+        full_name = " ".join(filter(None, [found.get("given_names"), found.get("surname")]))
+    fields: Dict[str, Any] = {
+        "document_type": document_type,
+        "full_name": _title(full_name) if full_name else None,
+        "date_of_birth": found.get("date_of_birth"),
+        "document_number": found.get("document_number"),
+        "expiry_date": found.get("expiry_date"),
+        "nationality": found.get("nationality"),
+        "sex": found.get("sex"),
+        "mrz": None,
+    }
+    if mrz:
+        checks = mrz["checks"]
+        if mrz["surname"] or mrz["given_names"]:
+            fields["full_name"] = _title(f"{mrz['given_names']} {mrz['surname']}")
+        for field in ("document_number", "date_of_birth", "expiry_date"):
+            if mrz[field] and (checks[field] or not fields[field]):
+                fields[field] = mrz[field]
+        fields["nationality"] = mrz["nationality"] or fields["nationality"]
+        fields["sex"] = mrz["sex"] or fields["sex"]
+        if not fields["document_type"]:
+            fields["document_type"] = "passport" if mrz["document_code"].startswith("P") else "national_id"
+        fields["mrz"] = {
+            "format": mrz["format"],
+            "valid": mrz["valid"],
+            "checks": checks,
+            "issuing_state": mrz["issuing_state"],
+        }
+    return fields
@@ -0,0 +1,372 @@
+"""
+Document forgery checks against genuine templates.
+
+A capture is cropped to the document, scaled to a canonical width and
+reduced to Harris corners with 256-bit BRIEF-style descriptors, all in NumPy.
+Its descriptors are matched against the template index
+(:mod:`app.services.forgery_index`) to pick the template, or against the
+requested one, and a RANSAC affine fit keeps the geometrically consistent
+matches.
+
+Templates are built from several genuine samples and keep only the keypoints
+that every sample shares, i.e. the printed background and labels rather than
+the photo or personal data. A tampered region loses those matches: template
+grid cells where the capture matches far less than it does overall are
+reported as layout deviations. Text cells are then compared on font metrics
+(stroke width and text line height) after warping the capture into the template
+frame, which flags re-typeset fields. The font step is skipped when the
+earlier stages have used up the latency budget.
+"""
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.document_roi import edge_box, grayscale
+from app.services.forgery_index import TemplateIndex, hamming
+
+CANONICAL_WIDTH = 640
+PATCH_RADIUS = 15
+NMS_CELL = 12  # one corner at most per cell of this many pixels
+MAX_KEYPOINTS = 600
+LAYOUT_GRID = (6, 8)
+LAYOUT_MIN_KEYPOINTS = 4
+LAYOUT_DEVIATION_SHARE = 0.3  # cell coverage below this share of the overall coverage
+MIN_TEMPLATE_MATCHES = 12
+RANSAC_ITERATIONS = 256
+INLIER_PX = 4.0
+FONT_TOLERANCE = 0.35  # relative stroke width / line height change allowed
+FONT_MIN_INK = (0.02, 0.5)  # ink share of a cell that holds measurable text
+EXPECTED_COVERAGE = 0.5  # share of template keypoints a good capture matches
+
+_rng = np.random.default_rng(0x5EED)
+# Pixel pairs ``(dx1, dy1, dx2, dy2)`` compared by each descriptor bit.
+_PAIRS = np.clip(np.round(_rng.normal(0, PATCH_RADIUS / 2.5, (256, 4))), -PATCH_RADIUS, PATCH_RADIUS).astype(np.int64)
+
+
+def _box(img: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over a ``(2r+1)^2`` window via an integral image, edge padded."""
+    padded = np.pad(img, radius + 1, mode="edge").astype(np.float64)
+    integral = padded.cumsum(0).cumsum(1)
+    k = 2 * radius + 1
+    total = integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]
+    return (total / (k * k))[: img.shape[0], : img.shape[1]].astype(np.float32)
+
+
+def canonical_view(pixels) -> np.ndarray:
+    """Grayscale document crop scaled to ``CANONICAL_WIDTH``."""
+    from PIL import Image
+
+    gray = grayscale(pixels)
+    # The document box only needs a coarse view.
+    step = max(1, max(gray.shape) // 512)
+    box = edge_box(gray[::step, ::step])
+    if box is not None:
+        top, bottom, left, right = (v * step for v in box)
+        if (bottom - top) * (right - left) >= 0.2 * gray.size:
+            gray = gray[top:bottom, left:right]
+    height = max(2 * PATCH_RADIUS + 2, round(gray.shape[0] * CANONICAL_WIDTH / gray.shape[1]))
+    image = Image.fromarray(np.clip(gray, 0, 255).astype(np.uint8)).resize((CANONICAL_WIDTH, height), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32)
+
+
+def detect_keypoints(gray: np.ndarray, limit: int = MAX_KEYPOINTS) -> np.ndarray:
+    """Harris corners as ``(x, y)`` rows, strongest first, at most one per NMS cell."""
+    smooth = _box(gray, 1)
+    gy, gx = np.gradient(smooth)
+    sxx, syy, sxy = _box(gx * gx, 2), _box(gy * gy, 2), _box(gx * gy, 2)
+    response = sxx * syy - sxy * sxy - 0.04 * (sxx + syy) ** 2
+    margin = PATCH_RADIUS + 2
+    response[:margin], response[-margin:], response[:, :margin], response[:, -margin:] = 0, 0, 0, 0
+    height, width = response.shape
+    rows, cols = height // NMS_CELL, width // NMS_CELL
+    cells = response[: rows * NMS_CELL, : cols * NMS_CELL].reshape(rows, NMS_CELL, cols, NMS_CELL)
+    cells = cells.transpose(0, 2, 1, 3).reshape(rows, cols, -1)
+    best = cells.argmax(axis=2)
+    strength = np.take_along_axis(cells, best[..., None], axis=2)[..., 0]
+    threshold = max(1e-6, 0.01 * float(strength.max())) if strength.size else 1.0
+    cy, cx = np.nonzero(strength > threshold)
+    order = np.argsort(-strength[cy, cx])[:limit]
+    cy, cx, offset = cy[order], cx[order], best[cy[order], cx[order]]
+    ys = cy * NMS_CELL + offset // NMS_CELL
+    xs = cx * NMS_CELL + offset % NMS_CELL
+    return np.stack([xs, ys], axis=1).astype(np.float32)
+
+
+def describe(gray: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """256-bit binary descriptors of smoothed intensity comparisons, packed to 32 bytes."""
+    smooth = _box(gray, 2)
+    xs, ys = points[:, 0].astype(np.int64)[:, None], points[:, 1].astype(np.int64)[:, None]
+    first = smooth[ys + _PAIRS[:, 1], xs + _PAIRS[:, 0]]
+    second = smooth[ys + _PAIRS[:, 3], xs + _PAIRS[:, 2]]
+    return np.packbits(first < second, axis=1)
+
+
+def estimate_affine(src: np.ndarray, dst: np.ndarray, seed: int = 0) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """RANSAC affine ``dst ~ [src, 1] @ M`` with ``M`` 3 x 2; return ``(M, inlier mask)``."""
+    count = len(src)
+    if count < 3:
+        return None, np.zeros(count, bool)
+    rng = np.random.default_rng(seed)
+    samples = np.stack([rng.choice(count, 3, replace=False) for _ in range(RANSAC_ITERATIONS)])
+    design = np.concatenate([src, np.ones((count, 1), np.float32)], axis=1)
+    a, b = design[samples], dst[samples]
+    usable = np.abs(np.linalg.det(a)) > 1e-3
+    if not usable.any():
+        return None, np.zeros(count, bool)
+    models = np.linalg.solve(a[usable], b[usable])  # hypotheses x 3 x 2
+    residuals = np.linalg.norm(design[None] @ models - dst[None], axis=2)
+    inliers = residuals < INLIER_PX
+    best = inliers[inliers.sum(axis=1).argmax()]
+    if best.sum() < 3:
+        return None, best
+    model, *_ = np.linalg.lstsq(design[best], dst[best], rcond=None)
+    inliers = np.linalg.norm(design @ model - dst, axis=1) < INLIER_PX
+    return model.astype(np.float32), inliers
+
+
+def warp_into(gray: np.ndarray, model: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """Resample ``gray`` into a ``shape`` frame, given the affine from ``gray`` to that frame."""
+    forward = np.vstack([model.T, [0, 0, 1]])
+    inverse = np.linalg.inv(forward)
+    ys, xs = np.mgrid[0 : shape[0], 0 : shape[1]].astype(np.float32)
+    sx = inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]
+    sy = inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]
+    x0 = np.clip(np.floor(sx).astype(np.int64), 0, gray.shape[1] - 2)
+    y0 = np.clip(np.floor(sy).astype(np.int64), 0, gray.shape[0] - 2)
+    fx, fy = np.clip(sx - x0, 0, 1), np.clip(sy - y0, 0, 1)
+    top = gray[y0, x0] * (1 - fx) + gray[y0, x0 + 1] * fx
+    bottom = gray[y0 + 1, x0] * (1 - fx) + gray[y0 + 1, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def font_metrics(gray: np.ndarray, grid: Sequence[int] = LAYOUT_GRID) -> np.ndarray:
+    """Per grid cell ``(stroke width, line height)`` of its text, NaN where there is none.
+
+    Stroke width is twice the ink area over the ink boundary length, which
+    holds for strokes of any length and needs no skeleton. Line height is
+    the median height of the inked row bands.
+    """
+    rows, cols = grid
+    height, width = gray.shape
+    low, high = np.percentile(gray[::2, ::2], (1, 95))
+    metrics = np.full((rows, cols, 2), np.nan, np.float32)
+    if high - low < 40:
+        return metrics
+    ink = gray < (low + high) / 2
+    for r in range(rows):
+        for c in range(cols):
+            cell = ink[r * height // rows : (r + 1) * height // rows, c * width // cols : (c + 1) * width // cols]
+            area = int(cell.sum())
+            if not FONT_MIN_INK[0] <= area / cell.size <= FONT_MIN_INK[1]:
+                continue
+            boundary = int((cell[:, 1:] != cell[:, :-1]).sum() + (cell[1:] != cell[:-1]).sum())
+            inked = np.concatenate(([False], cell.mean(axis=1) > 0.02, [False]))
+            starts = np.flatnonzero(~inked[:-1] & inked[1:])
+            ends = np.flatnonzero(inked[:-1] & ~inked[1:])
+            bands = (ends - starts)[ends - starts >= 3]
+            if boundary < 40 or not len(bands):
+                continue
+            metrics[r, c] = (2 * area / boundary, np.median(bands))
+    return metrics
+
+
+def _cells(points: np.ndarray, shape: Tuple[int, int], grid: Sequence[int] = LAYOUT_GRID) -> np.ndarray:
+    """Grid cell number of each ``(x, y)`` point."""
+    rows, cols = grid
+    r = np.clip((points[:, 1] * rows / shape[0]).astype(np.int64), 0, rows - 1)
+    c = np.clip((points[:, 0] * cols / shape[1]).astype(np.int64), 0, cols - 1)
+    return r * cols + c
+
+
+def _features(pixels) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    gray = canonical_view(pixels)
+    points = detect_keypoints(gray)
+    return gray, points, describe(gray, points)
+
+
+def _match_pair(query: np.ndarray, train: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mutual best brute-force matches between two descriptor sets."""
+    dist = hamming(query[:, None, :], train[None, :, :])
+    forward, backward = dist.argmin(axis=1), dist.argmin(axis=0)
+    mutual = backward[forward] == np.arange(len(query))
+    return np.flatnonzero(mutual), forward[mutual]
+
+
+def build_template(template_id: str, samples: List[Any], document_type: Optional[str] = None):
+    """Build one template from genuine samples; return ``(meta, points, descriptors)``.
+
+    Keypoints of the first sample are kept when every other sample matches
+    them consistently, and font metrics are kept for cells that agree across
+    samples.
+    """
+    gray, points, descriptors = _features(samples[0])
+    stable = np.ones(len(points), bool)
+    fonts = [font_metrics(gray)]
+    for sample in samples[1:]:
+        other, other_points, other_descriptors = _features(sample)
+        ours, theirs = _match_pair(descriptors, other_descriptors)
+        model, inliers = estimate_affine(other_points[theirs], points[ours])
+        matched = np.zeros(len(points), bool)
+        matched[ours[inliers]] = True
+        stable &= matched
+        if model is not None:
+            fonts.append(font_metrics(warp_into(other, model, gray.shape)))
+    stack = np.stack(fonts)
+    measured = ~np.isnan(stack).any(axis=(0, -1))
+    stack = np.where(measured[None, ..., None], stack, 1.0)
+    font = np.median(stack, axis=0)
+    spread = (stack.max(axis=0) - stack.min(axis=0)) / font
+    consistent = measured & (spread <= FONT_TOLERANCE / 2).all(axis=-1)
+    points, descriptors = points[stable], descriptors[stable]
+    counts = np.bincount(_cells(points, gray.shape), minlength=LAYOUT_GRID[0] * LAYOUT_GRID[1])
+    meta = {
+        "id": template_id,
+        "document_type": document_type,
+        "shape": list(gray.shape),
+        "grid": list(LAYOUT_GRID),
+        "samples": len(samples),
+        "cell_keypoints": counts.tolist(),
+        "font": [[float(v) for v in font[r, c]] if consistent[r, c] else None for r, c in np.ndindex(*LAYOUT_GRID)],
+    }
+    return meta, points, descriptors
+
+
+def build_index(path: str, templates: Dict[str, Tuple[Optional[str], List[Any]]]) -> TemplateIndex:
+    """Write an index of ``{template_id: (document_type, genuine samples)}`` to ``path``."""
+    metas, all_points, all_descriptors, owners = [], [], [], []
+    row = 0
+    for number, (template_id, (document_type, samples)) in enumerate(templates.items()):
+        meta, points, descriptors = build_template(template_id, samples, document_type)
+        meta["rows"] = [row, row + len(points)]
+        row += len(points)
+        metas.append(meta)
+        all_points.append(points)
+        all_descriptors.append(descriptors)
+        owners.append(np.full(len(points), number, np.int32))
+    TemplateIndex.write(
+        path,
+        metas,
+        np.concatenate(all_descriptors) if all_descriptors else np.zeros((0, 32), np.uint8),
+        np.concatenate(all_points) if all_points else np.zeros((0, 2), np.float32),
+        np.concatenate(owners) if owners else np.zeros(0, np.int32),
+    )
+    return TemplateIndex(path)
+
+
+def check_forgery(
+    pixels, index: TemplateIndex, template_id: Optional[str] = None, budget_ms: float = 150.0, threshold: float = 0.6
+) -> Dict[str, Any]:
+    """Compare a document capture with its genuine template.
+
+    Returns the template, match statistics, layout and font deviations, an
+    authenticity ``score`` in ``[0, 1]`` and per-stage timings.
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    def lap(stage: str) -> None:
+        timings[stage] = (time.perf_counter() - started) * 1000 - sum(timings.values())
+
+    gray, points, descriptors = _features(pixels)
+    lap("features")
+    result: Dict[str, Any] = {
+        "template": None,
+        "checked": False,
+        "score": None,
+        "is_forged": None,
+        "reasons": [],
+        "keypoints": int(len(points)),
+        "layout_deviations": [],
+        "font_deviations": [],
+    }
+
+    if template_id is not None:
+        template = index.find(template_id)
+        if template is None:
+            raise KeyError(template_id)
+        confidence = 1.0
+    else:
+        q_idx, rows, _ = index.match(descriptors)
+        votes = np.bincount(np.asarray(index.owners[rows]), minlength=len(index.templates)) if len(rows) else np.zeros(1)
+        template = int(votes.argmax()) if votes.any() else None
+        confidence = float(votes.max() / votes.sum()) if votes.any() else 0.0
+    q_idx, rows, _ = index.match(descriptors, template) if template is not None else (np.zeros(0, int),) * 3
+    lap("match")
+    if template is None or len(rows) < MIN_TEMPLATE_MATCHES:
+        result["reasons"].append("unknown_template")
+        result.update(elapsed_ms=(time.perf_counter() - started) * 1000, timings_ms=timings)
+        return result
+
+    meta = index.templates[template]
+    shape = tuple(meta["shape"])
+    model, inliers = estimate_affine(points[q_idx], np.asarray(index.points[rows]))
+    lap("geometry")
+    result.update(template=meta["id"], template_confidence=round(confidence, 3), document_type=meta["document_type"])
+    if model is None or inliers.sum() < MIN_TEMPLATE_MATCHES:
+        result["reasons"].append("unknown_template")
+        result.update(elapsed_ms=(time.perf_counter() - started) * 1000, timings_ms=timings)
+        return result
+
+    # Layout: share of each cell's template keypoints the capture matched.
+    expected = np.asarray(meta["cell_keypoints"])
+    found = np.unique(rows[inliers])
+    matched = np.bincount(_cells(np.asarray(index.points[found]), shape), minlength=expected.size)
+    coverage = float(len(found) / max(1, expected.sum()))
+    rows_n, cols_n = meta["grid"]
+    for cell in np.flatnonzero(expected >= LAYOUT_MIN_KEYPOINTS):
+        share = matched[cell] / expected[cell]
+        if share < LAYOUT_DEVIATION_SHARE * min(coverage, 1.0):
+            r, c = divmod(int(cell), cols_n)
+            result["layout_deviations"].append(
+                {
+                    "cell": [r, c],
+                    "box": [r / rows_n, (r + 1) / rows_n, c / cols_n, (c + 1) / cols_n],
+                    "expected": int(expected[cell]),
+                    "matched": int(matched[cell]),
+                }
+            )
+    lap("layout")
+
+    # Font: stroke width and line height per text cell, in the template frame.
+    if (time.perf_counter() - started) * 1000 > budget_ms:
+        result["reasons"].append("font_check_skipped")
+    else:
+        metrics = font_metrics(warp_into(gray, model, shape), meta["grid"])
+        for cell, reference in enumerate(meta["font"]):
+            if reference is None:
+                continue
+            r, c = divmod(cell, cols_n)
+            observed = metrics[r, c]
+            if np.isnan(observed).any():
+                continue
+            ratio = observed / np.asarray(reference, np.float32)
+            if (np.abs(np.log(ratio)) > np.log1p(FONT_TOLERANCE)).any():
+                result["font_deviations"].append(
+                    {
+                        "cell": [r, c],
+                        "box": [r / rows_n, (r + 1) / rows_n, c / cols_n, (c + 1) / cols_n],
+                        "stroke_ratio": round(float(ratio[0]), 2),
+                        "height_ratio": round(float(ratio[1]), 2),
+                    }
+                )
+        lap("font")
+
+    layout, fonts = len(result["layout_deviations"]), len(result["font_deviations"])
+    score = min(1.0, coverage / EXPECTED_COVERAGE) * max(0.0, 1 - 0.25 * layout) * max(0.0, 1 - 0.3 * fonts)
+    if coverage < EXPECTED_COVERAGE / 2:
+        result["reasons"].append("weak_template_match")
+    if layout:
+        result["reasons"].append("layout_deviation")
+    if fonts:
+        result["reasons"].append("font_deviation")
+    result.update(
+        checked=True,
+        score=round(score, 3),
+        is_forged=score < threshold,
+        matches=int(inliers.sum()),
+        coverage=round(coverage, 3),
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        timings_ms=timings,
+    )
+    return result
@@ -0,0 +1,172 @@
+"""
+Document layout classification and region-of-interest OCR planning.
+
+A capture is classified from its small quality view with a few NumPy
+projections: the edge bounding box gives the document's aspect ratio and
+the text lines across the bottom of the document reveal a machine readable
+zone (two full-width lines for a TD3 passport, three for a TD1 card). Each
+layout has a template of regions holding the fields we read, so OCR only
+needs to run over those crops. When the layout is uncertain, or the regions
+do not yield the fields the template promises, the caller falls back to
+full-page OCR.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EDGE_MIN_STRENGTH = 24.0
+
+# Regions as (top, bottom, left, right) fractions of the document box.
+TEMPLATES: Dict[str, Dict[str, Any]] = {
+    # ICAO TD3 data page (125 x 88 mm): the MRZ carries every field we read.
+    "passport": {"document_type": "passport", "regions": {"mrz": (0.68, 1.0, 0.0, 1.0)}, "requires": "mrz"},
+    # ID-1 card back with a TD1 MRZ.
+    "id_card_mrz": {"document_type": "national_id", "regions": {"mrz": (0.55, 1.0, 0.0, 1.0)}, "requires": "mrz"},
+    # ID-1 card front (licences, national ID and Aadhaar cards): the portrait
+    # sits on the left, the header across the top.
+    "id_card": {"document_type": None, "regions": {"fields": (0.15, 1.0, 0.26, 1.0)}, "requires": "fields"},
+}
+PASSPORT_ASPECT = (1.3, 1.56)  # 125 / 88 = 1.42
+ID1_ASPECT = (1.45, 1.75)  # 85.6 / 54 = 1.59
+
+MRZ_SEARCH_BAND = 0.4  # bottom share of the document searched for MRZ lines
+MRZ_MIN_SPAN = 0.8  # share of the document width an MRZ line covers
+MRZ_PAD = 0.5  # padding around the detected MRZ lines, in line heights
+_SPAN_BINS = 32
+
+
+def grayscale(pixels) -> np.ndarray:
+    pixels = np.asarray(pixels)
+    if pixels.ndim == 3:
+        return pixels[..., :3].astype(np.float32) @ np.float32([0.299, 0.587, 0.114])
+    return pixels.astype(np.float32)
+
+
+def edge_box(gray: np.ndarray, trim: float = 0.01) -> Optional[Tuple[int, int, int, int]]:
+    """Return ``(top, bottom, left, right)`` around the strong edges of ``gray``.
+
+    The outermost ``trim`` share of edge pixels on each side is ignored so
+    stray background texture does not stretch the box. ``None`` when the
+    image has almost no edges.
+    """
+    magnitude = np.abs(np.diff(gray, axis=1))[:-1, :] + np.abs(np.diff(gray, axis=0))[:, :-1]
+    edges = magnitude > max(EDGE_MIN_STRENGTH, 3 * float(magnitude.mean()))
+    columns, rows = np.cumsum(edges.sum(axis=0)), np.cumsum(edges.sum(axis=1))
+    if columns[-1] < edges.size * 0.002:
+        return None
+    bounds = (trim * columns[-1], (1 - trim) * columns[-1])
+    left, right = np.searchsorted(columns, bounds)
+    top, bottom = np.searchsorted(rows, bounds)
+    return int(top), int(bottom) + 1, int(left), int(right) + 1
+
+
+def _text_lines(band: np.ndarray) -> List[Tuple[int, int, float]]:
+    """Find text lines in ``band`` as ``(top, bottom, width_span)`` rows."""
+    transitions = np.abs(np.diff(band, axis=1)) > EDGE_MIN_STRENGTH
+    density = transitions.mean(axis=1)
+    if density.max() <= 0:
+        return []
+    inked = np.concatenate(([False], density > max(0.02, 0.3 * float(density.max())), [False]))
+    starts = np.flatnonzero(~inked[:-1] & inked[1:])
+    ends = np.flatnonzero(inked[:-1] & ~inked[1:])
+    lines = []
+    width = transitions.shape[1]
+    for start, end in zip(starts, ends):
+        if end - start < 2:
+            continue
+        columns = transitions[start:end].any(axis=0)
+        bins = columns[: width // _SPAN_BINS * _SPAN_BINS].reshape(_SPAN_BINS, -1).any(axis=1)
+        lines.append((int(start), int(end), float(bins.mean())))
+    return lines
+
+
+def classify_document(pixels, document_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Guess the layout of a document capture.
+
+    ``pixels`` is a small (quality sized) view of the capture. Returns the
+    template name, a confidence, the document box in ``pixels`` coordinates
+    and the detected MRZ band, or ``None`` when there is no document.
+    ``document_type`` is the caller's hint and overrides the visual guess
+    where the two can disagree.
+    """
+    gray = grayscale(pixels)
+    box = edge_box(gray)
+    if box is None:
+        return None
+    top, bottom, left, right = box
+    if bottom - top < 16 or right - left < 2 * _SPAN_BINS:
+        return None
+    aspect = (right - left) / (bottom - top)
+
+    band_top = top + int((bottom - top) * (1 - MRZ_SEARCH_BAND))
+    lines = _text_lines(gray[band_top:bottom, left:right])
+    # MRZ lines are the full-width lines at the very bottom of the document.
+    mrz: List[Tuple[int, int, float]] = []
+    for line in reversed(lines):
+        if line[2] < MRZ_MIN_SPAN:
+            break
+        mrz.insert(0, line)
+    mrz_band = None
+    if len(mrz) in (2, 3):
+        height = max(end - start for start, end, _ in mrz)
+        mrz_band = (
+            max(top, band_top + mrz[0][0] - int(height * MRZ_PAD)),
+            min(bottom, band_top + mrz[-1][1] + int(height * MRZ_PAD)),
+        )
+
+    if document_type == "passport":
+        template, confidence = "passport", 1.0
+    elif document_type:
+        template, confidence = ("id_card_mrz" if len(mrz) == 3 else "id_card"), 1.0
+    elif len(mrz) == 2:
+        template, confidence = "passport", 0.9 if PASSPORT_ASPECT[0] <= aspect <= PASSPORT_ASPECT[1] else 0.7
+    elif len(mrz) == 3:
+        template, confidence = "id_card_mrz", 0.9 if ID1_ASPECT[0] <= aspect <= ID1_ASPECT[1] else 0.7
+    elif ID1_ASPECT[0] <= aspect <= ID1_ASPECT[1]:
+        template, confidence = "id_card", 0.6
+    else:
+        template, confidence = None, 0.0
+    return {
+        "template": template,
+        "confidence": confidence,
+        "aspect": round(aspect, 3),
+        "mrz_lines": len(mrz),
+        "box": box,
+        "mrz_band": mrz_band,
+    }
+
+
+def plan_regions(layout: Dict[str, Any], shape: Tuple[int, ...], scale: float) -> List[Tuple[str, Tuple[int, int, int, int]]]:
+    """Return ``(region, (top, bottom, left, right))`` crops for an image.
+
+    ``shape`` is the shape of the image to crop and ``scale`` maps the
+    layout's (quality view) coordinates onto it. A detected MRZ band is
+    used in place of the template's MRZ region.
+    """
+    height, width = shape[:2]
+    top, bottom, left, right = layout["box"]
+    box_height, box_width = bottom - top, right - left
+    regions = []
+    for name, (r_top, r_bottom, r_left, r_right) in TEMPLATES[layout["template"]]["regions"].items():
+        if name == "mrz" and layout["mrz_band"] is not None:
+            y0, y1 = layout["mrz_band"]
+        else:
+            y0, y1 = top + box_height * r_top, top + box_height * r_bottom
+        x0, x1 = left + box_width * r_left, left + box_width * r_right
+        crop = (
+            max(0, int(y0 * scale)),
+            min(height, int(round(y1 * scale))),
+            max(0, int(x0 * scale)),
+            min(width, int(round(x1 * scale))),
+        )
+        if crop[1] > crop[0] and crop[3] > crop[2]:
+            regions.append((name, crop))
+    return sorted(regions, key=lambda region: region[1][0])
+
+
+def regions_sufficient(template: str, fields: Dict[str, Any]) -> bool:
+    """Whether fields read from the template's regions can stand on their own."""
+    if TEMPLATES[template]["requires"] == "mrz":
+        mrz = fields.get("mrz")
+        return bool(mrz) and all(mrz["checks"].get(f) for f in ("document_number", "date_of_birth", "expiry_date"))
+    return bool(fields.get("document_number")) and bool(fields.get("date_of_birth") or fields.get("full_name"))
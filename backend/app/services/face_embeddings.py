@@ -0,0 +1,203 @@
+"""
+Persisted selfie/document face embeddings for re-verification.
+
+Every verified pair is kept as one row of a memory-mapped float16 matrix
+(``faces.emb``, shape ``rows x 2 x dim``) with its reference ID (a
+submission or KYC session ID), owning organization and face model version
+appended to ``faces.keys``. Re-checking a pair, trying a new match threshold
+or auditing every decision is then a row-wise dot product over the mapped
+rows, without decoding an image or loading a model. An empty slot (no face
+found) is stored as zeros.
+
+A new match under a stored reference replaces the whole pair, so both slots
+always come from one submission and one model version. A pair embedded by
+another model version goes to a new row; the key's last row is its current
+one.
+"""
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+import numpy as np
+
+SLOTS = ("selfie", "document")
+SCORE_CHUNK_ROWS = 65536
+
+
+class FaceEmbeddingStore:
+    """Reference ID -> (selfie, document) embedding pair and its model version.
+
+    API workers, Celery children and the local executor all write the same
+    files. New rows are appended under an exclusive ``flock`` on
+    ``<prefix>.lock``, at the row count of the key file; every process reads
+    the keys others appended before it writes or reads.
+    """
+
+    def __init__(self, path_prefix: str, dim: int = 512, dtype: str = "float16", initial_capacity: int = 1024):
+        self.vec_path = f"{path_prefix}.emb"
+        self.keys_path = f"{path_prefix}.keys"
+        self.lock_path = f"{path_prefix}.lock"
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._orgs: List[str] = []
+        self._versions: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._keys_offset = 0
+        self._capacity = 0
+        self._matrix: Optional[np.memmap] = None
+        with self._lock:
+            self._refresh()
+
+    @property
+    def _row_bytes(self) -> int:
+        return len(SLOTS) * self.dim * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return key in self._rows
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        with open(self.lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        # Keys are appended only after their row is flushed, so every key read
+        # here has its row. Only whole lines count: a writer may be mid-line.
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as fh:
+                fh.seek(self._keys_offset)
+                data = fh.read()
+            end = data.rfind(b"\n") + 1
+            if end:
+                for line in data[:end].decode("utf-8").splitlines():
+                    if line.strip():
+                        fields = line.split("\t", 2)
+                        # Lines written before versions were kept have none.
+                        org, version, key = fields if len(fields) == 3 else (fields[0], "", fields[1])
+                        self._rows[key] = len(self._keys)
+                        self._orgs.append(org)
+                        self._versions.append(version)
+                        self._keys.append(key)
+                self._keys_offset += end
+        stored = os.path.getsize(self.vec_path) // self._row_bytes if os.path.exists(self.vec_path) else 0
+        if stored > self._capacity:
+            self._matrix = np.memmap(self.vec_path, dtype=self.dtype, mode="r+", shape=(stored, len(SLOTS), self.dim))
+            self._capacity = stored
+
+    def _grow(self, capacity: int) -> None:
+        # Only under the file lock: the file never shrinks below what another
+        # process has mapped.
+        with open(self.vec_path, "ab") as fh:
+            if fh.tell() < capacity * self._row_bytes:
+                fh.truncate(capacity * self._row_bytes)
+        self._refresh()
+
+    def _normed(self, embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"expected a {self.dim}-d embedding, got {vector.shape[0]}")
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def put(self, key: str, organization_id: str, selfie=None, document=None, model_version: str = "") -> None:
+        """Store the pair under ``key``, replacing any stored one; an omitted slot is stored empty.
+
+        Raises ``PermissionError`` if another organization owns ``key``.
+        """
+        if not organization_id:
+            raise ValueError("Stored embeddings need an owning organization")
+        if "\t" in model_version or "\n" in model_version:
+            raise ValueError(f"Invalid model version {model_version!r}")
+        vectors = {slot: self._normed(v) for slot, v in zip(SLOTS, (selfie, document)) if v is not None}
+        with self._lock, self._exclusive():
+            self._refresh()
+            row = self._rows.get(key)
+            if row is not None and self._orgs[row] != organization_id:
+                raise PermissionError(f"{key} belongs to another organization")
+            new = row is None or self._versions[row] != model_version
+            if new:
+                row = len(self._keys)
+                if row >= self._capacity:
+                    self._grow(max(self.initial_capacity, self._capacity * 2))
+            self._matrix[row] = 0
+            for slot, vector in vectors.items():
+                self._matrix[row, SLOTS.index(slot)] = vector
+            self._matrix.flush()
+            if new:
+                with open(self.keys_path, "a", encoding="utf-8") as fh:
+                    fh.write(f"{organization_id}\t{model_version}\t{key}\n")
+                self._refresh()
+
+    def get(self, key: str) -> Optional[Dict[str, Optional[np.ndarray]]]:
+        """Return ``{"organization_id", "model_version", "selfie", "document"}`` for ``key``, or ``None``."""
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            pair = np.asarray(self._matrix[row], dtype=np.float32)
+            organization_id, version = self._orgs[row], self._versions[row]
+        entry: Dict[str, Any] = {"organization_id": organization_id, "model_version": version}
+        for i, slot in enumerate(SLOTS):
+            entry[slot] = pair[i] if pair[i].any() else None
+        return entry
+
+    def similarities(
+        self, organization_id: Optional[str] = None, model_version: Optional[str] = None
+    ) -> Tuple[List[str], np.ndarray]:
+        """Cosine similarity of every current pair, ``nan`` where a slot is empty.
+
+        Restricted to one organization's pairs and to pairs embedded by one
+        model version when those are given.
+        """
+        with self._lock:
+            self._refresh()
+            count = min(len(self._keys), self._capacity)
+            keys, orgs, versions = self._keys[:count], self._orgs[:count], self._versions[:count]
+            current = np.fromiter((self._rows[key] == row for row, key in enumerate(keys)), dtype=bool, count=count)
+            matrix = self._matrix
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_ROWS):
+            block = np.asarray(matrix[start : min(start + SCORE_CHUNK_ROWS, count)], dtype=np.float32)
+            selfie, document = block[:, 0], block[:, 1]
+            dots = np.einsum("ij,ij->i", selfie, document)
+            empty = ~selfie.any(axis=1) | ~document.any(axis=1)
+            scores[start : start + len(block)] = np.where(empty, np.nan, dots)
+        mask = current
+        if organization_id is not None:
+            mask = mask & (np.asarray(orgs, dtype=object) == organization_id)
+        if model_version is not None:
+            mask = mask & (np.asarray(versions, dtype=object) == model_version)
+        return [key for key, keep in zip(keys, mask) if keep], scores[mask]
+
+
+_store: Optional[FaceEmbeddingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_face_embedding_store() -> FaceEmbeddingStore:
+    """Return the (lazily opened) embedding store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            os.makedirs(settings.FACE_EMBEDDINGS_PATH, exist_ok=True)
+            _store = FaceEmbeddingStore(
+                os.path.join(settings.FACE_EMBEDDINGS_PATH, "faces"), dtype=settings.FACE_EMBEDDINGS_DTYPE
+            )
+        return _store
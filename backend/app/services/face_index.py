@@ -0,0 +1,151 @@
+"""
+Per-organization 1:N face index for duplicate identity detection.
+
+Each organization's normed face embeddings live in one contiguous matrix
+stored in a memory-mapped file (``<org>.vec``), with the matching subject IDs
+appended to ``<org>.ids``. Searches are a chunked matrix-vector product over
+the mapped rows, so restarts reopen the files instead of rebuilding. Each
+face model version has its own directory of indexes: embeddings of
+different models are not comparable.
+"""
+import fcntl
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+import numpy as np
+
+SEARCH_CHUNK_ROWS = 16384
+
+
+class FaceIndex:
+    """Append-only embedding matrix with top-k cosine search.
+
+    Every API worker and Celery child may append to the same files. Appends
+    hold an exclusive ``flock`` on ``<prefix>.lock`` and take their row from
+    the ID file, the committed row count; before appending or searching, a
+    process reads the IDs others appended since it last looked.
+    """
+
+    def __init__(self, path_prefix: str, dim: int = 512, dtype: str = "float16", initial_capacity: int = 1024):
+        self.vec_path = f"{path_prefix}.vec"
+        self.ids_path = f"{path_prefix}.ids"
+        self.lock_path = f"{path_prefix}.lock"
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._ids_offset = 0
+        self._capacity = 0
+        self._matrix: Optional[np.memmap] = None
+        with self._lock:
+            self._refresh()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        with open(self.lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        # IDs are appended only after their row is flushed, so every ID read
+        # here has its row. Only whole lines count: a writer may be mid-line.
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "rb") as fh:
+                fh.seek(self._ids_offset)
+                data = fh.read()
+            end = data.rfind(b"\n") + 1
+            if end:
+                self._ids.extend(line.decode("utf-8") for line in data[:end].splitlines() if line.strip())
+                self._ids_offset += end
+        row_bytes = self.dim * self.dtype.itemsize
+        stored = os.path.getsize(self.vec_path) // row_bytes if os.path.exists(self.vec_path) else 0
+        if stored > self._capacity:
+            self._matrix = np.memmap(self.vec_path, dtype=self.dtype, mode="r+", shape=(stored, self.dim))
+            self._capacity = stored
+
+    def _grow(self, capacity: int) -> None:
+        # Only under the file lock: the file never shrinks below what another
+        # process has mapped.
+        with open(self.vec_path, "ab") as fh:
+            if fh.tell() < capacity * self.dim * self.dtype.itemsize:
+                fh.truncate(capacity * self.dim * self.dtype.itemsize)
+        self._refresh()
+
+    def add(self, subject_id: str, embedding: np.ndarray) -> None:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"expected a {self.dim}-d embedding, got {vector.shape[0]}")
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock, self._exclusive():
+            self._refresh()
+            row = len(self._ids)
+            if row >= self._capacity:
+                self._grow(max(self.initial_capacity, self._capacity * 2))
+            self._matrix[row] = vector
+            self._matrix.flush()
+            with open(self.ids_path, "a", encoding="utf-8") as fh:
+                fh.write(subject_id + "\n")
+            self._refresh()
+
+    def search(self, embedding: np.ndarray, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (subject_id, cosine similarity) pairs, best first."""
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            self._refresh()
+            count = min(len(self._ids), self._capacity)
+            ids = self._ids
+            matrix = self._matrix
+        if count == 0 or k <= 0:
+            return []
+        want = k + (1 if exclude is not None else 0)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            block = np.asarray(matrix[start : min(start + SEARCH_CHUNK_ROWS, count)], dtype=np.float32)
+            scores = block @ query
+            if scores.shape[0] > want:
+                top = np.argpartition(scores, -want)[-want:]
+            else:
+                top = np.arange(scores.shape[0])
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if best_scores.shape[0] > want:
+                keep = np.argpartition(best_scores, -want)[-want:]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        results = [(ids[best_rows[i]], float(best_scores[i])) for i in order]
+        if exclude is not None:
+            results = [r for r in results if r[0] != exclude]
+        return results[:k]
+
+
+_indexes: Dict[Tuple[str, str], FaceIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_face_index(organization_id: str, model_version: str) -> FaceIndex:
+    """Return the (lazily opened) index of an organization's faces embedded by ``model_version``."""
+    with _indexes_lock:
+        index = _indexes.get((organization_id, model_version))
+        if index is None:
+            safe_version = re.sub(r"[^A-Za-z0-9_.-]", "_", model_version).lstrip(".") or "_"
+            directory = os.path.join(settings.FACE_INDEX_PATH, safe_version)
+            os.makedirs(directory, exist_ok=True)
+            safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", organization_id)
+            index = FaceIndex(os.path.join(directory, safe_id), dtype=settings.FACE_INDEX_DTYPE)
+            _indexes[(organization_id, model_version)] = index
+        return index
@@ -0,0 +1,202 @@
+"""
+On-disk index of keypoint descriptors from genuine document templates.
+
+The index is built offline from genuine samples (see
+``document_forgery.build_index``) and is a handful of flat files opened
+with ``np.memmap``, so every worker shares the page cache instead of
+holding its own copy. Each build is written to its own directory and the
+``CURRENT`` file, replaced atomically, names the live one: a rebuild never
+touches files a running worker has mapped. A build directory holds:
+
+- ``descriptors.u8``: rows x 32, the 256-bit binary descriptors
+- ``points.f4``: rows x 2, keypoint ``(x, y)`` in the template frame
+- ``owners.i4``: the template number of each row
+- ``lsh_keys.u4`` / ``lsh_rows.i4``: tables x rows, sorted hash keys and their rows
+- ``templates.json``: template metadata, hash bit positions and row count
+
+Approximate nearest neighbours come from bit-sampling LSH: each table hashes
+a descriptor to a fixed subset of its bits, candidates are the rows sharing
+a bucket with the query in any table (a binary search over the sorted keys),
+and only those candidates are compared by Hamming distance.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+import numpy as np
+
+DESCRIPTOR_BYTES = 32
+LSH_TABLES = 6
+LSH_BITS = 14
+MAX_BUCKET = 32  # candidates taken from one bucket; repetitive texture makes huge ones
+MAX_HAMMING = 64
+RATIO = 0.85  # best / second best distance for an unambiguous match
+CURRENT = "CURRENT"
+KEEP_BUILDS = 2  # the live build and the one before, which readers may still have open
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-wise Hamming distance between two equally shaped packed descriptor arrays."""
+    return POPCOUNT[np.bitwise_xor(a, b)].sum(axis=-1, dtype=np.int32)
+
+
+def _hash(descriptors: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """LSH keys, shape ``(tables, rows)``, from the sampled descriptor bits."""
+    bits = np.unpackbits(descriptors, axis=1)
+    weights = (1 << np.arange(positions.shape[1], dtype=np.uint32)).astype(np.uint32)
+    return np.stack([bits[:, table].astype(np.uint32) @ weights for table in positions])
+
+
+class TemplateIndex:
+    """Read-only view of the current build of an index directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, CURRENT), "r", encoding="utf-8") as fh:
+            self.build = fh.read().strip()
+        build_path = os.path.join(path, self.build)
+        with open(os.path.join(build_path, "templates.json"), "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        self.templates: List[Dict[str, Any]] = meta["templates"]
+        # Part of cache keys, so results never outlive a rebuilt index.
+        self.version = str(meta.get("built_at", 0))
+        self.positions = np.asarray(meta["lsh_positions"], dtype=np.int64)
+        rows = meta["rows"]
+        self.rows = rows
+        tables = len(self.positions)
+
+        def mapped(name: str, dtype, shape):
+            if not rows:
+                return np.zeros(shape, dtype=dtype)
+            return np.memmap(os.path.join(build_path, name), dtype=dtype, mode="r", shape=shape)
+
+        self.descriptors = mapped("descriptors.u8", np.uint8, (rows, DESCRIPTOR_BYTES))
+        self.points = mapped("points.f4", np.float32, (rows, 2))
+        self.owners = mapped("owners.i4", np.int32, (rows,))
+        self._keys = mapped("lsh_keys.u4", np.uint32, (tables, rows))
+        self._rows = mapped("lsh_rows.i4", np.int32, (tables, rows))
+
+    @staticmethod
+    def write(
+        path: str,
+        templates: List[Dict[str, Any]],
+        descriptors: np.ndarray,
+        points: np.ndarray,
+        owners: np.ndarray,
+        seed: int = 7,
+    ) -> None:
+        """Write a new build of an index and make it current; ``templates[i]`` owns the rows where ``owners == i``."""
+        os.makedirs(path, exist_ok=True)
+        build = f"build-{time.time_ns()}-{os.getpid()}"
+        directory = os.path.join(path, build)
+        os.makedirs(directory)
+        rng = np.random.default_rng(seed)
+        positions = np.stack([rng.choice(DESCRIPTOR_BYTES * 8, LSH_BITS, replace=False) for _ in range(LSH_TABLES)])
+        descriptors = np.ascontiguousarray(descriptors, dtype=np.uint8)
+        keys = _hash(descriptors, positions) if len(descriptors) else np.zeros((LSH_TABLES, 0), np.uint32)
+        order = np.argsort(keys, axis=1, kind="stable").astype(np.int32)
+        np.take_along_axis(keys, order, axis=1).astype(np.uint32).tofile(os.path.join(directory, "lsh_keys.u4"))
+        order.tofile(os.path.join(directory, "lsh_rows.i4"))
+        descriptors.tofile(os.path.join(directory, "descriptors.u8"))
+        np.asarray(points, dtype=np.float32).tofile(os.path.join(directory, "points.f4"))
+        np.asarray(owners, dtype=np.int32).tofile(os.path.join(directory, "owners.i4"))
+        with open(os.path.join(directory, "templates.json"), "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "templates": templates,
+                    "lsh_positions": positions.tolist(),
+                    "rows": int(len(descriptors)),
+                    "built_at": time.time(),
+                },
+                fh,
+            )
+        # Switch readers over only once the whole build is on disk.
+        tmp = os.path.join(path, f"{CURRENT}.{build}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(build)
+        os.replace(tmp, os.path.join(path, CURRENT))
+        # Older builds go; a worker still mapping one keeps its (unlinked) files.
+        builds = sorted((name for name in os.listdir(path) if name.startswith("build-")), key=lambda n: int(n.split("-")[1]))
+        for name in builds[:-KEEP_BUILDS]:
+            if name != build:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    def find(self, template_id: str) -> Optional[int]:
+        return next((i for i, t in enumerate(self.templates) if t["id"] == template_id), None)
+
+    def template_rows(self, template: int) -> Tuple[int, int]:
+        return self.templates[template]["rows"][0], self.templates[template]["rows"][1]
+
+    def _candidates(self, query: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """``(query_index, row)`` pairs sharing at least one LSH bucket."""
+        keys = _hash(query, self.positions)
+        q_parts, row_parts = [], []
+        for table in range(len(self.positions)):
+            sorted_keys = self._keys[table]
+            lo = np.searchsorted(sorted_keys, keys[table], side="left")
+            hi = np.minimum(np.searchsorted(sorted_keys, keys[table], side="right"), lo + MAX_BUCKET)
+            counts = hi - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            starts = np.repeat(lo, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            q_parts.append(np.repeat(np.arange(len(query)), counts))
+            row_parts.append(np.asarray(self._rows[table][starts + offsets]))
+        if not q_parts:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        pairs = np.unique(np.concatenate(q_parts).astype(np.int64) * self.rows + np.concatenate(row_parts))
+        return pairs // self.rows, pairs % self.rows
+
+    def match(self, query: np.ndarray, template: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Best unambiguous match per query descriptor as ``(query_index, row, distance)``.
+
+        Restricted to one template's rows when ``template`` is given.
+        """
+        empty = np.zeros(0, np.int64)
+        if not self.rows or not len(query):
+            return empty, empty, empty
+        q_idx, rows = self._candidates(query)
+        if template is not None:
+            first, last = self.template_rows(template)
+            keep = (rows >= first) & (rows < last)
+            q_idx, rows = q_idx[keep], rows[keep]
+        if not len(q_idx):
+            return empty, empty, empty
+        dist = hamming(query[q_idx], np.asarray(self.descriptors[rows]))
+        order = np.lexsort((dist, q_idx))
+        q_idx, rows, dist = q_idx[order], rows[order], dist[order]
+        first = np.flatnonzero(np.concatenate(([True], q_idx[1:] != q_idx[:-1])))
+        has_second = np.append(first[1:], len(q_idx)) - first > 1
+        second = np.where(has_second, dist[np.minimum(first + 1, len(dist) - 1)], MAX_HAMMING * 2)
+        best = dist[first]
+        keep = (best <= MAX_HAMMING) & (best < RATIO * second)
+        return q_idx[first][keep], rows[first][keep], best[keep]
+
+
+_index: Optional[TemplateIndex] = None
+_index_stamp: Optional[Tuple[str, int, int]] = None
+_index_lock = threading.Lock()
+
+
+def get_forgery_index() -> Optional[TemplateIndex]:
+    """Return the template index, reopened when it has been rebuilt; ``None`` if there is none."""
+    global _index, _index_stamp
+    path = settings.FORGERY_INDEX_PATH
+    with _index_lock:
+        try:
+            pointer = os.stat(os.path.join(path, CURRENT))
+        except OSError:
+            _index = _index_stamp = None
+            return None
+        # A rebuild replaces the pointer file, so its inode changes.
+        stamp = (path, pointer.st_ino, pointer.st_mtime_ns)
+        if _index is None or stamp != _index_stamp:
+            _index, _index_stamp = TemplateIndex(path), stamp
+        return _index
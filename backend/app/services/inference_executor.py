@@ -0,0 +1,245 @@
+"""
+Process pool for CPU-bound model inference.
+
+Worker processes load the configured models once at start-up. Image arrays
+are handed over through shared memory segments rather than pickled copies;
+only the segment name, shape and dtype cross the process boundary.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.model_registry import call_pinned, pinned
+
+logger = logging.getLogger(__name__)
+
+SharedArray = Tuple[str, Tuple[int, ...], str]
+
+_warmup_report: Dict[str, Dict[str, Any]] = {}
+
+BROADCAST_ROUNDS = 5
+BROADCAST_LINGER_S = 0.05
+# How often a warmup waiting on the workers checks the pool is still alive.
+WARMUP_POLL_S = 1.0
+
+
+def _preload(models: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+    from app.services import ai_models
+
+    return ai_models.preload_models(models)
+
+
+def _worker_init(models: Tuple[str, ...], warmed: Optional[Any] = None, processes: int = 1) -> None:
+    global _warmup_report
+    from app.services.onnx_runtime import set_inference_processes
+
+    set_inference_processes(processes)
+    _warmup_report = _preload(models)
+    if warmed is not None:
+        warmed.put(_worker_report())
+
+
+def _worker_report() -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    return f"pid-{os.getpid()}", _warmup_report
+
+
+def _pid_call(fn: Callable[..., Any], *args: Any) -> Tuple[str, Any]:
+    result = fn(*args)
+    # Linger so the other calls of a broadcast round land on other workers.
+    time.sleep(BROADCAST_LINGER_S)
+    return f"pid-{os.getpid()}", result
+
+
+def _run_shared(
+    fn: Callable[[List[Any]], List[Any]], arrays: List[SharedArray], versions: Optional[Dict[str, str]] = None
+) -> List[Any]:
+    import numpy as np
+
+    handles = []
+    images = []
+    try:
+        for name, shape, dtype in arrays:
+            shm = shared_memory.SharedMemory(name=name)
+            handles.append(shm)
+            images.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+        with pinned(versions):
+            return fn(images)
+    finally:
+        images.clear()
+        for shm in handles:
+            shm.close()
+
+
+def _share(array: Any) -> Tuple[shared_memory.SharedMemory, SharedArray]:
+    import numpy as np
+
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    del view
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+class InferenceExecutor:
+    """Runs batch inference functions in a pool of model-holding processes.
+
+    Until :meth:`start` is called (or when configured with zero workers) the
+    functions run in a thread instead, so the event loop is never blocked.
+    """
+
+    def __init__(self, workers: int, models: Tuple[str, ...], start_method: str):
+        self.workers = workers
+        self.models = models
+        self.start_method = start_method
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Initializers report here once their worker is warm.
+        self._warmed: Optional[Any] = None
+        self.ready = False
+        self.warmup_report: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    async def warmup(self) -> None:
+        """Load and warm the models wherever inference will run, then mark ready."""
+        started = time.perf_counter()
+        try:
+            if self._pool is None:
+                reports = {"main": await asyncio.to_thread(_preload, self.models)}
+            else:
+                # Submitting one call per worker makes the pool spawn every
+                # process. The first warm worker may answer all of them, so
+                # readiness waits for every initializer to report instead.
+                loop = asyncio.get_running_loop()
+                await asyncio.gather(*(loop.run_in_executor(self._pool, _worker_report) for _ in range(self.workers)))
+                reports = await asyncio.to_thread(self._collect_warmed)
+        except Exception:
+            logger.exception("Model warmup failed")
+            return
+        for worker, report in reports.items():
+            for model, timing in report.items():
+                logger.info(
+                    "Model %s ready in %s: available=%s load=%.0fms warmup=%.0fms",
+                    model,
+                    worker,
+                    timing["available"],
+                    timing["load_ms"],
+                    timing["warmup_ms"],
+                )
+        logger.info("Model warmup finished in %.0fms", (time.perf_counter() - started) * 1000)
+        self.warmup_report = reports
+        self.ready = True
+
+    def _collect_warmed(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Wait until ``workers`` distinct processes have finished their initializer."""
+        pool, warmed = self._pool, self._warmed
+        reports: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        while len(reports) < self.workers:
+            try:
+                worker, report = warmed.get(timeout=WARMUP_POLL_S)
+            except queue.Empty:
+                if self._pool is not pool or pool._broken:
+                    raise BrokenProcessPool("An inference worker died during warmup")
+                continue
+            reports[worker] = report
+        return reports
+
+    def start(self) -> None:
+        if self.workers <= 0 or self._pool is not None:
+            return
+        context = multiprocessing.get_context(self.start_method)
+        self._warmed = context.Queue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_worker_init,
+            initargs=(self.models, self._warmed, self.workers),
+        )
+
+    def _replace_broken(self, broken: ProcessPoolExecutor) -> None:
+        # A worker died (e.g. OOM-killed); replace the pool for later calls.
+        # Calls failing together share one replacement.
+        with self._pool_lock:
+            if self._pool is not broken:
+                return
+            self._pool = None
+            self.start()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def run(
+        self, fn: Callable[[List[Any]], List[Any]], images: List[Any], versions: Optional[Dict[str, str]] = None
+    ) -> List[Any]:
+        """Run ``fn(images)`` in a worker process and return its result.
+
+        ``versions`` pins the model version of each kind ``fn`` uses.
+        """
+        if self._pool is None:
+            return await asyncio.to_thread(call_pinned, fn, versions, images)
+        pool = self._pool
+        segments = [_share(image) for image in images]
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, _run_shared, fn, [desc for _, desc in segments], versions)
+        except BrokenProcessPool:
+            self._replace_broken(pool)
+            raise
+        finally:
+            for shm, _ in segments:
+                shm.close()
+                shm.unlink()
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` in a worker process; arguments must be small and picklable."""
+        if self._pool is None:
+            return await asyncio.to_thread(fn, *args)
+        pool = self._pool
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            self._replace_broken(pool)
+            raise
+
+    async def broadcast(self, fn: Callable[..., Any], *args: Any) -> Dict[str, Any]:
+        """Run ``fn(*args)`` once in every worker process; return results by worker.
+
+        The pool cannot address a worker directly, so rounds of one call per
+        worker are submitted until every worker has answered. ``fn`` must be
+        idempotent: a worker may run it more than once. A worker that is
+        missed (or replaced later) catches up lazily on its next call.
+        """
+        if self._pool is None:
+            return {"main": await asyncio.to_thread(fn, *args)}
+        loop = asyncio.get_running_loop()
+        results: Dict[str, Any] = {}
+        for _ in range(BROADCAST_ROUNDS):
+            answers = await asyncio.gather(
+                *(loop.run_in_executor(self._pool, _pid_call, fn, *args) for _ in range(self.workers))
+            )
+            results.update(answers)
+            if len(results) >= self.workers:
+                break
+        return results
+
+
+inference_executor = InferenceExecutor(
+    workers=settings.AI_INFERENCE_WORKERS,
+    models=tuple(m.strip() for m in settings.AI_ENABLED_MODELS.split(",") if m.strip()),
+    start_method=settings.AI_INFERENCE_START_METHOD,
+)
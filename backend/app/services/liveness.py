@@ -0,0 +1,276 @@
+"""
+Streaming liveness analysis for selfie videos.
+
+Uploads are spooled to disk in fixed-size chunks and decoded one frame at a
+time; frames between samples are grabbed but never converted. Every sampled
+frame is reduced to a small grayscale image and folded into running motion,
+blink and texture statistics, so memory stays constant however long the
+video is. Sampling gets denser while something is happening (motion or a
+possible blink) and sparser while the scene is still, and analysis stops as
+soon as the decision is confident or the per-request CPU budget is spent.
+"""
+import asyncio
+import math
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from fastapi import UploadFile, HTTPException, status
+from app.core.config import settings
+
+import numpy as np
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Regions as (top, bottom, left, right) fractions of a selfie frame.
+FACE_REGION = (0.15, 0.85, 0.25, 0.75)
+EYE_BAND = (0.25, 0.45, 0.25, 0.75)
+
+MOTION_NOISE = 1.0  # mean absolute grey-level change of a still scene
+BLINK_DIP = 0.15  # relative drop in eye-band edge energy while the eyes close
+BLINK_HISTORY = 15
+SHARPNESS_REFERENCE = 0.35
+MOIRE_PEAK_RATIO = 60.0
+
+# Hand-tuned logistic weights over the aggregated features.
+WEIGHTS = {"motion": 2.0, "parallax": 2.0, "blink": 3.0, "sharpness": 1.0, "moire": -4.0}
+BIAS = -3.5
+
+
+def _region(frame: np.ndarray, box) -> np.ndarray:
+    height, width = frame.shape
+    top, bottom, left, right = box
+    return frame[int(height * top) : int(height * bottom), int(width * left) : int(width * right)]
+
+
+def _downscale(frame: np.ndarray, side: int) -> np.ndarray:
+    """Block-average a grayscale frame until its longer side is at most ``side``."""
+    factor = math.ceil(max(frame.shape) / side)
+    if factor <= 1:
+        return frame.astype(np.float32)
+    height, width = (frame.shape[0] // factor) * factor, (frame.shape[1] // factor) * factor
+    blocks = frame[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+def _sigmoid(x: float) -> float:
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+class UnreadableVideo(ValueError):
+    """The upload is not a video the engine can decode frames from."""
+
+
+class VideoFileSource:
+    """Decodes a video file with OpenCV, one grayscale frame per :meth:`read`.
+
+    Decoding is pinned to the calling thread so the CPU budget, measured with
+    ``time.thread_time``, accounts for it.
+    """
+
+    def __init__(self, path: str, frame_side: int):
+        import cv2
+
+        self._cv2 = cv2
+        if hasattr(cv2, "CAP_PROP_N_THREADS"):
+            self._capture = cv2.VideoCapture(path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, 1])
+        else:
+            self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise UnreadableVideo("Unsupported or corrupt video")
+        fps = self._capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.frame_side = frame_side
+        self.decoded = 0
+
+    def read(self, skip: int = 0) -> Optional[np.ndarray]:
+        """Skip ``skip`` frames, then return the next one (``None`` at the end)."""
+        cv2 = self._cv2
+        for _ in range(skip):
+            if not self._capture.grab():
+                return None
+            self.decoded += 1
+        ok, frame = self._capture.read()
+        if not ok:
+            return None
+        self.decoded += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        scale = self.frame_side / max(height, width)
+        if scale < 1:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def close(self) -> None:
+        self._capture.release()
+
+
+class LivenessEngine:
+    """Folds sampled frames into liveness features and decides when to stop.
+
+    ``source`` is anything with an ``fps`` attribute and a ``read(skip)``
+    method returning grayscale frames, such as :class:`VideoFileSource`.
+    """
+
+    def __init__(
+        self,
+        frame_side: int = 160,
+        sample_fps: float = 6.0,
+        min_frames: int = 8,
+        max_frames: int = 90,
+        cpu_budget_ms: float = 1500.0,
+        early_stop_confidence: float = 0.8,
+    ):
+        self.frame_side = frame_side
+        self.sample_fps = sample_fps
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.cpu_budget_ms = cpu_budget_ms
+        self.early_stop_confidence = early_stop_confidence
+
+    def run(self, source) -> Dict[str, Any]:
+        started = time.thread_time()
+        base_stride = max(1, round(source.fps / self.sample_fps))
+        stride = base_stride
+        skip = 0
+        previous: Optional[np.ndarray] = None
+        eye_energy: deque = deque(maxlen=BLINK_HISTORY)
+        in_blink = False
+        sampled = pairs = moving = blinks = moire = 0
+        parallax_sum = sharpness_sum = 0.0
+        score, stopped = 0.0, "end_of_video"
+
+        while True:
+            raw = source.read(skip)
+            if raw is None:
+                break
+            frame = _downscale(raw, self.frame_side)
+            sampled += 1
+
+            # Texture: Laplacian energy relative to contrast (recaptured
+            # prints and screens are soft) plus isolated spectral peaks
+            # (screen moire).
+            lap = 4 * frame[1:-1, 1:-1] - frame[:-2, 1:-1] - frame[2:, 1:-1] - frame[1:-1, :-2] - frame[1:-1, 2:]
+            sharpness_sum += min(float(np.abs(lap).mean()) / (float(frame.std()) + 1e-6) / SHARPNESS_REFERENCE, 1.0)
+            spectrum = np.abs(np.fft.rfft2(frame - frame.mean()))
+            spectrum[:4, :4] = 0
+            spectrum[-4:, :4] = 0
+            moire += float(spectrum.max()) > MOIRE_PEAK_RATIO * (float(spectrum.mean()) + 1e-6)
+
+            # Blink: edge energy across the eye band dips and recovers.
+            band = _region(frame, EYE_BAND)
+            energy = float(np.abs(np.diff(band, axis=0)).mean())
+            if len(eye_energy) >= 3:
+                baseline = float(np.median(eye_energy))
+                if energy < baseline * (1 - BLINK_DIP):
+                    in_blink = True
+                elif in_blink and energy >= baseline * (1 - BLINK_DIP / 2):
+                    in_blink = False
+                    blinks += 1
+            if not in_blink:
+                eye_energy.append(energy)
+
+            # Motion: a live face moves against its background, whereas a
+            # photo or screen is either still or moves rigidly as a whole.
+            motion = 0.0
+            if previous is not None and previous.shape == frame.shape:
+                diff = np.abs(frame - previous)
+                face = _region(diff, FACE_REGION)
+                total, face_sum = float(diff.sum()), float(face.sum())
+                motion = face_sum / face.size
+                background = (total - face_sum) / max(diff.size - face.size, 1)
+                pairs += 1
+                if motion > MOTION_NOISE:
+                    moving += 1
+                    parallax_sum += min(max((motion / (background + 1e-6) - 1) / 1.5, 0.0), 1.0)
+            previous = frame
+
+            features = {
+                "motion": moving / pairs if pairs else 0.0,
+                "parallax": parallax_sum / moving if moving else 0.0,
+                "blink": min(blinks, 2) / 2,
+                "sharpness": sharpness_sum / sampled,
+                "moire": moire / sampled,
+            }
+            score = _sigmoid(BIAS + sum(WEIGHTS[name] * value for name, value in features.items()))
+            cpu_ms = (time.thread_time() - started) * 1000
+            if sampled >= self.min_frames and abs(2 * score - 1) >= self.early_stop_confidence:
+                stopped = "confident"
+                break
+            if cpu_ms >= self.cpu_budget_ms:
+                stopped = "cpu_budget"
+                break
+            if sampled >= self.max_frames:
+                stopped = "max_frames"
+                break
+
+            # Sample densely while something happens, sparsely while still.
+            if in_blink or motion > 4 * MOTION_NOISE:
+                stride = max(1, base_stride // 2)
+            elif pairs and motion < MOTION_NOISE:
+                stride = min(stride * 2, base_stride * 4)
+            else:
+                stride = base_stride
+            skip = stride - 1
+
+        if sampled == 0:
+            raise UnreadableVideo("Video contains no decodable frames")
+        return {
+            "is_live": score >= 0.5,
+            "confidence": abs(2 * score - 1),
+            "liveness_score": score,
+            "frames_sampled": sampled,
+            "blinks": blinks,
+            "features": features,
+            "stopped": stopped,
+            "cpu_ms": (time.thread_time() - started) * 1000,
+        }
+
+
+def analyse_video(path: str) -> Dict[str, Any]:
+    """Run the liveness engine over a video file (worker-process entry point)."""
+    try:
+        source = VideoFileSource(path, settings.LIVENESS_FRAME_SIDE)
+    except ImportError:
+        return {"is_live": False, "confidence": 0.0, "liveness_score": 0.0, "stopped": "unavailable"}
+    engine = LivenessEngine(
+        frame_side=settings.LIVENESS_FRAME_SIDE,
+        sample_fps=settings.LIVENESS_SAMPLE_FPS,
+        min_frames=settings.LIVENESS_MIN_FRAMES,
+        max_frames=settings.LIVENESS_MAX_FRAMES,
+        cpu_budget_ms=settings.LIVENESS_CPU_BUDGET_MS,
+        early_stop_confidence=settings.LIVENESS_EARLY_STOP_CONFIDENCE,
+    )
+    try:
+        result = engine.run(source)
+        result["frames_decoded"] = source.decoded
+        return result
+    finally:
+        source.close()
+
+
+async def spool_upload(upload: UploadFile, max_bytes: int) -> str:
+    """Copy an upload to a temporary file chunk by chunk and return its path."""
+    suffix = os.path.splitext(upload.filename or "")[1]
+    fh = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    written = 0
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Video is too large",
+                )
+            await asyncio.to_thread(fh.write, chunk)
+        fh.close()
+        return fh.name
+    except BaseException:
+        fh.close()
+        os.unlink(fh.name)
+        raise
@@ -0,0 +1,418 @@
+"""
+Versioned AI models with hot swapping.
+
+Every process that runs inference (each inference worker, or the API process
+when there is no pool) keeps its loaded models in a :class:`ModelRegistry`,
+keyed by kind ("ocr", "face") and version. A version string names everything
+needed to build the model, e.g. ``paddleocr-en-angle`` or
+``insightface-buffalo_l``, so several versions of one kind can sit side by
+side.
+
+The API process decides which version serves new requests through
+:class:`ModelVersions`. Activating a version loads and warms it in every
+worker first, while the current version keeps serving; the switch itself is a
+single assignment. Requests hold the version they started with, and each
+batch is pinned to that version on its way to the workers, so a request never
+sees two models. Once nothing holds the old version any more it is unloaded
+everywhere.
+"""
+import asyncio
+import contextvars
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Builder = Callable[[str], Any]
+Warmup = Callable[[Any], None]
+
+HEAT_HALF_LIFE_S = 600.0
+
+# Versions pinned by the batch currently running in this thread, by kind.
+_pinned: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("pinned_model_versions", default={})
+
+
+@contextmanager
+def pinned(versions: Optional[Dict[str, str]]) -> Iterator[None]:
+    """Make ``ModelRegistry.use`` resolve these versions inside the block."""
+    if not versions:
+        yield
+        return
+    token = _pinned.set({**_pinned.get(), **versions})
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def call_pinned(fn: Callable[..., Any], versions: Optional[Dict[str, str]], *args: Any) -> Any:
+    with pinned(versions):
+        return fn(*args)
+
+
+def default_versions() -> Dict[str, str]:
+    return {"ocr": settings.AI_OCR_MODEL_VERSION, "face": settings.AI_FACE_MODEL_VERSION}
+
+
+def process_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MiB, ``None`` where it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as fh:
+            resident_pages = int(fh.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _Loaded:
+    def __init__(self, variant: str):
+        self.lock = threading.Lock()
+        self.variant = variant
+        self.model: Any = None
+        self.ready = False
+        self.inflight = 0
+        self.retired = False
+        self.last_used = 0.0
+        self.heat = 0.0
+        self.footprint_mb = 0.0
+        self.report: Dict[str, Any] = {"available": False, "load_ms": 0.0, "warmup_ms": 0.0}
+
+    def heat_at(self, now: float) -> float:
+        return self.heat * 0.5 ** ((now - self.last_used) / HEAT_HALF_LIFE_S)
+
+
+class ModelRegistry:
+    """The models loaded in this process, by ``(kind, version)``.
+
+    A model that failed to import is stored as ``False``, as the batch
+    functions expect. Versions of a kind may come in variants (the OCR
+    language); at most ``max_versions`` versions of one variant stay loaded
+    and idle older ones are dropped when a new one loads.
+
+    With an ``rss_budget_mb``, idle models are also evicted, least recently
+    used first, until the model about to load fits in the budget. Pinned
+    variants and the ``hot_versions`` most used versions of each kind are
+    never evicted for memory; when nothing else is left the model loads
+    over budget rather than failing the request.
+    """
+
+    def __init__(self, max_versions: int = 2, rss_budget_mb: float = 0.0, hot_versions: int = 0):
+        self.max_versions = max(1, max_versions)
+        self.rss_budget_mb = rss_budget_mb
+        self.hot_versions = max(0, hot_versions)
+        self.rss = process_rss_mb
+        self._builders: Dict[str, Tuple[Builder, Warmup]] = {}
+        self._variants: Dict[str, Callable[[str], str]] = {}
+        self._pinned: Dict[str, Callable[[], Iterable[str]]] = {}
+        self._models: Dict[Tuple[str, str], _Loaded] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def register(
+        self,
+        kind: str,
+        builder: Builder,
+        warmup: Warmup,
+        variant: Optional[Callable[[str], str]] = None,
+        pinned: Optional[Callable[[], Iterable[str]]] = None,
+    ) -> None:
+        """Add a model kind; ``variant`` maps a version to its variant, ``pinned`` lists variants to keep."""
+        self._builders[kind] = (builder, warmup)
+        self._variants[kind] = variant or (lambda version: "")
+        self._pinned[kind] = pinned or (lambda: ())
+
+    def kinds(self) -> List[str]:
+        return list(self._builders)
+
+    def _entry(self, kind: str, version: str) -> _Loaded:
+        if kind not in self._builders:
+            raise KeyError(f"unknown model kind {kind!r}")
+        with self._lock:
+            entry = self._models.get((kind, version))
+            if entry is None:
+                entry = self._models[(kind, version)] = _Loaded(self._variants[kind](version))
+            return entry
+
+    def load(self, kind: str, version: str) -> Dict[str, Any]:
+        """Build and warm ``version`` of ``kind`` unless it is loaded; return its load report."""
+        entry = self._entry(kind, version)
+        with entry.lock:
+            if not entry.ready:
+                self._make_room(kind, version)
+                builder, warmup = self._builders[kind]
+                rss_before = self.rss()
+                started = time.perf_counter()
+                try:
+                    entry.model = builder(version)
+                    loaded = time.perf_counter()
+                    entry.report["load_ms"] = (loaded - started) * 1000
+                    if entry.model is not False:
+                        warmup(entry.model)
+                        entry.report["available"] = True
+                        entry.report["warmup_ms"] = (time.perf_counter() - loaded) * 1000
+                except Exception as e:
+                    with self._lock:
+                        self._models.pop((kind, version), None)
+                    entry.report["error"] = str(e)
+                    raise
+                rss_after = self.rss()
+                if rss_before is not None and rss_after is not None:
+                    entry.footprint_mb = max(0.0, rss_after - rss_before)
+                    entry.report["rss_mb"] = round(entry.footprint_mb, 1)
+                entry.ready = True
+                entry.last_used = time.monotonic()
+            entry.retired = False
+        self._evict(kind, keep=version)
+        return dict(entry.report, version=version)
+
+    @contextmanager
+    def use(self, kind: str, version: Optional[str] = None) -> Iterator[Any]:
+        """Yield the model for ``version`` (the pinned or configured one when omitted).
+
+        The version is loaded on first use and cannot be unloaded while the
+        block runs.
+        """
+        version = version or _pinned.get().get(kind) or default_versions()[kind]
+        while True:
+            self.load(kind, version)
+            with self._lock:
+                # Another thread may have evicted it between the two steps.
+                entry = self._models.get((kind, version))
+                if entry is not None and entry.ready:
+                    now = time.monotonic()
+                    entry.heat = entry.heat_at(now) + 1.0
+                    entry.inflight += 1
+                    entry.last_used = now
+                    break
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.inflight -= 1
+            if entry.retired:
+                self.unload(kind, version)
+
+    def unload(self, kind: str, version: str) -> bool:
+        """Drop ``version`` now, or as soon as its last user finishes. True if dropped."""
+        with self._lock:
+            entry = self._models.get((kind, version))
+            if entry is None:
+                return True
+            entry.retired = True
+            if entry.inflight:
+                return False
+            del self._models[(kind, version)]
+            # Callers that still hold the entry must not keep the model alive.
+            entry.model = None
+        # Model objects (InsightFace's, with their session pools) can hold
+        # reference cycles; collect now so their memory is back at once.
+        gc.collect()
+        logger.info("Unloaded %s model %s", kind, version)
+        return True
+
+    def _evict(self, kind: str, keep: str) -> None:
+        variant = self._variants[kind](keep)
+        with self._lock:
+            idle = sorted(
+                (entry.last_used, version)
+                for (k, version), entry in self._models.items()
+                if k == kind and entry.variant == variant and version != keep and entry.ready and not entry.inflight
+            )
+            loaded = sum(1 for (k, _), entry in self._models.items() if k == kind and entry.variant == variant)
+        for _, version in idle[: max(0, loaded - self.max_versions)]:
+            self.unload(kind, version)
+
+    def _protected(self) -> set:
+        """Models kept under memory pressure: pinned variants and the hottest versions per kind."""
+        now = time.monotonic()
+        protected = set()
+        with self._lock:
+            for kind in self._builders:
+                pinned = set(self._pinned[kind]())
+                ranked = []
+                for (k, version), entry in self._models.items():
+                    if k != kind:
+                        continue
+                    if entry.variant in pinned:
+                        protected.add((k, version))
+                    ranked.append((entry.heat_at(now), version))
+                ranked.sort(reverse=True)
+                protected.update((kind, version) for heat, version in ranked[: self.hot_versions] if heat > 0)
+        return protected
+
+    def _make_room(self, kind: str, version: str) -> None:
+        """Evict idle models until one more of ``kind`` fits in the memory budget."""
+        if self.rss_budget_mb <= 0:
+            return
+        rss = self.rss()
+        if rss is None:
+            return
+        with self._lock:
+            sizes = [e.footprint_mb for (k, _), e in self._models.items() if k == kind and e.footprint_mb]
+        expected = sum(sizes) / len(sizes) if sizes else 0.0
+        protected = self._protected()
+        while rss + expected > self.rss_budget_mb:
+            with self._lock:
+                idle = sorted(
+                    (entry.last_used, key)
+                    for key, entry in self._models.items()
+                    if entry.ready and not entry.inflight and key not in protected and key != (kind, version)
+                )
+            if not idle:
+                logger.warning(
+                    "Loading %s model %s over the %.0f MiB budget (%.0f MiB resident)", kind, version, self.rss_budget_mb, rss
+                )
+                return
+            self.unload(*idle[0][1])
+            self.evictions += 1
+            gc.collect()
+            rss = self.rss() or 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                f"{kind}:{version}": {"in_flight": entry.inflight, "rss_mb": round(entry.footprint_mb, 1)}
+                for (kind, version), entry in self._models.items()
+                if entry.ready
+            }
+        return {"rss_mb": self.rss(), "budget_mb": self.rss_budget_mb, "evictions": self.evictions, "models": models}
+
+    def loaded(self) -> Dict[str, List[str]]:
+        with self._lock:
+            versions: Dict[str, List[str]] = {}
+            for (kind, version), entry in self._models.items():
+                if entry.ready:
+                    versions.setdefault(kind, []).append(version)
+            return versions
+
+
+model_registry = ModelRegistry(
+    max_versions=settings.AI_MODEL_MAX_VERSIONS,
+    rss_budget_mb=settings.AI_MODEL_RSS_BUDGET_MB,
+    hot_versions=settings.AI_MODEL_HOT_VERSIONS,
+)
+
+
+def _stage(kind: str, version: str) -> Dict[str, Any]:
+    return model_registry.load(kind, version)
+
+
+def _retire(kind: str, version: str) -> bool:
+    return model_registry.unload(kind, version)
+
+
+def registry_stats() -> Dict[str, Any]:
+    return model_registry.stats()
+
+
+class ModelVersions:
+    """Which model version serves new requests, and which are still draining.
+
+    Lives in the API process. ``hold`` marks a request as using the active
+    version for its whole duration; ``activate`` stages a new version in
+    every inference process, swaps it in and unloads the old one once its
+    holders are done.
+    """
+
+    def __init__(self, active: Dict[str, str], drain_timeout_s: float):
+        self.active = dict(active)
+        self.drain_timeout_s = drain_timeout_s
+        self._holders: Dict[Tuple[str, str], int] = {}
+        self._draining: Dict[Tuple[str, str], asyncio.Event] = {}
+        self._activating: Dict[str, asyncio.Lock] = {}
+        self._tasks: set = set()
+        self.history: List[Dict[str, Any]] = []
+
+    def current(self, kind: str) -> str:
+        return self.active[kind]
+
+    @contextmanager
+    def hold(self, kind: str) -> Iterator[str]:
+        """Yield the version of ``kind`` to use, keeping it loaded until the block ends.
+
+        That is the active version, unless the caller pinned another one
+        (pipeline stages pin the versions active when their submission was
+        enqueued, whichever process runs them).
+        """
+        key = (kind, _pinned.get().get(kind) or self.active[kind])
+        self._holders[key] = self._holders.get(key, 0) + 1
+        try:
+            yield key[1]
+        finally:
+            self._holders[key] -= 1
+            if not self._holders[key]:
+                del self._holders[key]
+                if key in self._draining:
+                    self._draining[key].set()
+
+    async def activate(self, kind: str, version: str) -> Dict[str, Any]:
+        """Load and warm ``version`` everywhere, then route new ``kind`` requests to it.
+
+        Raises ``KeyError`` for an unknown kind and whatever the model loader
+        raises when the version cannot be built; the active version is left
+        untouched in both cases.
+        """
+        from app.services.inference_executor import inference_executor
+
+        if kind not in self.active:
+            raise KeyError(f"unknown model kind {kind!r}")
+        lock = self._activating.setdefault(kind, asyncio.Lock())
+        async with lock:
+            previous = self.active[kind]
+            if version == previous:
+                return {"kind": kind, "active": version, "previous": previous, "staged": {}}
+            started = time.perf_counter()
+            staged = await inference_executor.broadcast(_stage, kind, version)
+            self.active[kind] = version
+            self._draining[(kind, previous)] = asyncio.Event()
+            if (kind, previous) not in self._holders:
+                self._draining[(kind, previous)].set()
+            task = asyncio.ensure_future(self._drain(kind, previous, self._draining[(kind, previous)]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        record = {
+            "kind": kind,
+            "active": version,
+            "previous": previous,
+            "staged": staged,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+        self.history.append({"kind": kind, "version": version, "previous": previous, "at": time.time()})
+        logger.info("Activated %s model %s (was %s)", kind, version, previous)
+        return record
+
+    async def _drain(self, kind: str, version: str, event: asyncio.Event) -> None:
+        from app.services.inference_executor import inference_executor
+
+        try:
+            await asyncio.wait_for(event.wait(), self.drain_timeout_s)
+        except asyncio.TimeoutError:
+            logger.warning("%s model %s still in use after %.0fs; unloading once idle", kind, version, self.drain_timeout_s)
+        try:
+            # A version that was re-activated while draining must stay.
+            if self.active[kind] != version:
+                await inference_executor.broadcast(_retire, kind, version)
+        except Exception:
+            logger.exception("Unloading %s model %s failed", kind, version)
+        finally:
+            if self._draining.get((kind, version)) is event:
+                del self._draining[(kind, version)]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            kind: {
+                "active": version,
+                "draining": [v for (k, v) in self._draining if k == kind],
+                "in_flight": {v: n for (k, v), n in self._holders.items() if k == kind},
+            }
+            for kind, version in self.active.items()
+        }
+
+
+model_versions = ModelVersions(default_versions(), settings.AI_MODEL_DRAIN_TIMEOUT_S)
@@ -0,0 +1,103 @@
+"""
+Language routing for document OCR.
+
+PaddleOCR ships one recognition model per language or script, and an OCR
+model version names its language (``paddleocr-<lang>[-angle]``). A document
+is first read with the active (default language) model; its language is then
+taken from the MRZ issuing state or nationality, or from the words of the
+printed header, all of which the Latin model reads. Documents in another
+language are read again by that language's model. Pages the default model
+cannot read at all, with no such signal, are probed with the pinned
+languages.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.config import settings
+
+# ICAO issuing state / nationality code -> PaddleOCR language code.
+COUNTRY_LANGUAGES: Dict[str, str] = {
+    "FRA": "fr", "BEL": "fr", "LUX": "fr", "MCO": "fr", "SEN": "fr", "CIV": "fr",
+    "D": "german", "DEU": "german", "AUT": "german", "LIE": "german",
+    "ESP": "es", "MEX": "es", "ARG": "es", "COL": "es", "CHL": "es", "PER": "es", "VEN": "es",
+    "ITA": "it", "SMR": "it",
+    "PRT": "pt", "BRA": "pt", "AGO": "pt", "MOZ": "pt",
+    "RUS": "ru", "BLR": "ru", "KAZ": "ru", "KGZ": "ru", "UKR": "uk",
+    "IND": "hi", "NPL": "ne", "PAK": "ur", "IRN": "fa",
+    "SAU": "ar", "ARE": "ar", "EGY": "ar", "JOR": "ar", "MAR": "ar", "QAT": "ar", "KWT": "ar",
+    "CHN": "ch", "TWN": "chinese_cht", "HKG": "chinese_cht", "JPN": "japan", "KOR": "korean",
+    "USA": "en", "GBR": "en", "CAN": "en", "AUS": "en", "NZL": "en", "IRL": "en", "SGP": "en",
+}
+
+_HEADER_KEYWORDS = [
+    ("fr", re.compile(r"R[EÉ]PUBLIQUE|CARTE NATIONALE D.IDENTIT|PERMIS DE CONDUIRE")),
+    ("german", re.compile(r"BUNDESREPUBLIK|PERSONALAUSWEIS|REISEPASS|F[UÜ]HRERSCHEIN")),
+    ("es", re.compile(r"\bREINO DE ESPA|ESTADOS UNIDOS MEXICANOS|DOCUMENTO NACIONAL DE IDENTIDAD|PASAPORTE")),
+    ("it", re.compile(r"REPUBBLICA ITALIANA|CARTA D.IDENTIT|PASSAPORTO")),
+    ("pt", re.compile(r"REP[UÚ]BLICA PORTUGUESA|REP[UÚ]BLICA FEDERATIVA DO BRASIL|CART[AÃ]O DE CIDAD")),
+]
+
+# Scripts the Latin recognizer can read nearly as well as the language's
+# own model, so a valid MRZ from the first pass is enough.
+LATIN_LANGUAGES = frozenset({"en", "fr", "german", "es", "it", "pt", "latin"})
+# Issuing states whose documents print their data in Latin script beside the
+# national one (Indian passports: English beside Hindi), so the Latin model
+# reads them as well.
+LATIN_PRINTED_STATES = frozenset({"IND"})
+
+
+def version_language(version: str) -> str:
+    """The language of an OCR model version, ``paddleocr-<lang>[-angle]``."""
+    spec = version.partition("-")[2]
+    return spec[: -len("-angle")] if spec.endswith("-angle") else spec
+
+
+def with_language(version: str, language: str) -> str:
+    """``version`` with its language replaced, keeping its other options."""
+    family, _, spec = version.partition("-")
+    suffix = "-angle" if spec.endswith("-angle") else ""
+    return f"{family}-{language}{suffix}"
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def supported_languages() -> List[str]:
+    return _csv(settings.AI_OCR_LANGUAGES)
+
+
+def pinned_languages() -> List[str]:
+    return _csv(settings.AI_OCR_PINNED_LANGUAGES)
+
+
+def detect_language(lines: Iterable[str], fields: Dict[str, Any]) -> Optional[str]:
+    """Guess a document's language from a first OCR pass.
+
+    ``fields`` are the fields extracted from ``lines``. The MRZ issuing state
+    wins, then the nationality, then header keywords. Only supported
+    languages are returned.
+    """
+    mrz = fields.get("mrz") or {}
+    language = None
+    for country in (mrz.get("issuing_state"), fields.get("nationality")):
+        if country and country.upper() in COUNTRY_LANGUAGES:
+            language = COUNTRY_LANGUAGES[country.upper()]
+            break
+    if language is None:
+        text = " ".join(lines).upper()
+        language = next((lang for lang, pattern in _HEADER_KEYWORDS if pattern.search(text)), None)
+    return language if language in supported_languages() else None
+
+
+def latin_printed(language: Optional[str], fields: Dict[str, Any]) -> bool:
+    """Whether a document in ``language`` with these ``fields`` prints its data in Latin script."""
+    if language in LATIN_LANGUAGES:
+        return True
+    mrz = fields.get("mrz") or {}
+    return any(country and country.upper() in LATIN_PRINTED_STATES for country in (mrz.get("issuing_state"), fields.get("nationality")))
+
+
+def field_score(fields: Dict[str, Any]) -> int:
+    """How much of a document a pass read: key fields found, plus a valid MRZ."""
+    found = sum(bool(fields.get(f)) for f in ("full_name", "date_of_birth", "document_number", "expiry_date"))
+    return found + (2 if (fields.get("mrz") or {}).get("valid") else 0)
@@ -0,0 +1,167 @@
+"""
+Shared ONNX Runtime layer for the inference workers.
+
+Models are opened with explicit session options rather than the library
+defaults. Intra-op threads are sized so all inference workers together use
+each core once. Inter-op parallelism and thread spinning are off, and the
+CPU memory arena is configurable. A model can also be served from an INT8
+dynamically quantized copy, written next to the FP32 file on first use.
+Sessions are pooled, so concurrent calls in one process never queue on a
+single session, and a pool lives only as long as the models using it.
+"""
+import logging
+import os
+import queue
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disabled": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+_quantize_lock = threading.Lock()
+
+# Inference processes sharing this host's cores, as told by the process that
+# started them; until then the configured executor size.
+_inference_processes: Optional[int] = None
+
+
+def set_inference_processes(count: int) -> None:
+    """Record how many inference processes split the cores, before any model loads."""
+    global _inference_processes
+    _inference_processes = max(1, count)
+
+
+def intra_op_threads() -> int:
+    """Threads per session: the configured count, or the cores left per session."""
+    if settings.ONNX_INTRA_OP_THREADS > 0:
+        return settings.ONNX_INTRA_OP_THREADS
+    processes = _inference_processes or max(1, settings.AI_INFERENCE_WORKERS)
+    sessions = processes * max(1, settings.ONNX_SESSION_POOL_SIZE)
+    return max(1, (os.cpu_count() or 1) // sessions)
+
+
+def session_options(intra_threads: Optional[int] = None):
+    import onnxruntime as ort
+
+    spinning = "1" if settings.ONNX_ALLOW_SPINNING else "0"
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_threads or intra_op_threads()
+    options.inter_op_num_threads = max(1, settings.ONNX_INTER_OP_THREADS)
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, _GRAPH_OPTIMIZATION_LEVELS[settings.ONNX_GRAPH_OPTIMIZATION]
+    )
+    options.enable_cpu_mem_arena = settings.ONNX_CPU_MEM_ARENA
+    options.enable_mem_pattern = settings.ONNX_CPU_MEM_ARENA
+    options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    return options
+
+
+def quantized_path(model_path: str) -> str:
+    """Return the INT8 copy of ``model_path``, quantizing it on first use."""
+    root, ext = os.path.splitext(model_path)
+    target = f"{root}.int8{ext}"
+    with _quantize_lock:
+        if not os.path.exists(target):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            # Several workers may race here; each writes its own file and the
+            # rename makes the finished model appear atomically.
+            partial = f"{target}.{os.getpid()}.partial"
+            logger.info("Quantizing %s to INT8", model_path)
+            quantize_dynamic(model_path, partial, weight_type=QuantType.QInt8)
+            os.replace(partial, target)
+    return target
+
+
+def precision_for(task: Optional[str]) -> str:
+    int8_tasks = {t.strip() for t in settings.ONNX_INT8_MODELS.split(",") if t.strip()}
+    return "int8" if settings.ONNX_PRECISION == "int8" and task in int8_tasks else "fp32"
+
+
+class SessionPool:
+    """A fixed set of InferenceSessions for one model, lent out per call.
+
+    Offers ``run``, ``get_inputs`` and ``get_outputs`` like a single session,
+    so it can stand in for the session inside InsightFace model objects.
+    """
+
+    def __init__(self, model_path: str, size: int = 1, precision: str = "fp32", options=None):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        self.precision = precision
+        self.path = quantized_path(model_path) if precision == "int8" else model_path
+        self.size = max(1, size)
+        options = options or session_options()
+        self._sessions: "queue.LifoQueue" = queue.LifoQueue()
+        for _ in range(self.size):
+            session = ort.InferenceSession(self.path, sess_options=options, providers=["CPUExecutionProvider"])
+            self._sessions.put(session)
+        self._template = session
+        self.calls = 0
+        self.waits = 0
+
+    @contextmanager
+    def acquire(self):
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            self.waits += 1
+            session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def run(self, output_names, input_feed, run_options=None) -> List[Any]:
+        with self.acquire() as session:
+            self.calls += 1
+            return session.run(output_names, input_feed, run_options)
+
+    def get_inputs(self):
+        return self._template.get_inputs()
+
+    def get_outputs(self):
+        return self._template.get_outputs()
+
+    def get_providers(self):
+        return self._template.get_providers()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "precision": self.precision,
+            "sessions": self.size,
+            "idle": self._sessions.qsize(),
+            "calls": self.calls,
+            "waits": self.waits,
+        }
+
+
+# By model file and precision: an INT8 and an FP32 user of one file get their
+# own. The loaded models own their pools; a pool goes when its last model is
+# unloaded, so hot swaps and evictions give the sessions' memory back.
+_pools: "weakref.WeakValueDictionary[Tuple[str, str], SessionPool]" = weakref.WeakValueDictionary()
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(model_path: str, task: Optional[str] = None) -> SessionPool:
+    """Return a session pool for a model file at ``task``'s precision, shared while one is loaded."""
+    precision = precision_for(task)
+    with _pools_lock:
+        pool = _pools.get((model_path, precision))
+        if pool is None:
+            pool = SessionPool(model_path, size=settings.ONNX_SESSION_POOL_SIZE, precision=precision)
+            _pools[(model_path, precision)] = pool
+        return pool
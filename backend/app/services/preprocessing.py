@@ -0,0 +1,86 @@
+"""
+Resolution-aware image decoding for the AI models.
+
+Uploads are decoded once, straight to the largest resolution any requested
+model needs: JPEGs use draft mode (DCT-domain downscaling by 1/2, 1/4 or 1/8)
+so a 12 MP phone photo never materialises at full size, EXIF orientation is
+applied, and the result is a single contiguous uint8 RGB buffer. Smaller
+per-model views are derived from that buffer on demand.
+"""
+import io
+from typing import Dict, Iterable, Optional
+from app.core.config import settings
+
+
+def model_max_side(model: str) -> int:
+    return {
+        "ocr": settings.AI_OCR_MAX_SIDE,
+        "face": settings.AI_FACE_MAX_SIDE,
+        "deepfake": settings.AI_DEEPFAKE_MAX_SIDE,
+        "forgery": settings.AI_FORGERY_MAX_SIDE,
+        "quality": settings.AI_QUALITY_MAX_SIDE,
+    }[model]
+
+
+class PreparedImage:
+    """A decoded upload shared by every model that inspects it."""
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self._views: Dict[int, object] = {}
+
+    @property
+    def shape(self):
+        return self.pixels.shape
+
+    def for_model(self, model: str):
+        """Return the buffer (or a cached downscaled copy) sized for ``model``."""
+        max_side = model_max_side(model)
+        height, width = self.pixels.shape[:2]
+        if max(height, width) <= max_side:
+            return self.pixels
+        view = self._views.get(max_side)
+        if view is None:
+            import numpy as np
+            from PIL import Image
+
+            scale = max_side / max(height, width)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            view = np.ascontiguousarray(Image.fromarray(self.pixels).resize(size, Image.BILINEAR))
+            self._views[max_side] = view
+        return view
+
+
+def prepare_image(data: bytes, models: Iterable[str] = ("ocr",)) -> Optional[PreparedImage]:
+    """Decode ``data`` once at the resolution the given models need.
+
+    Returns ``None`` when Pillow or NumPy are unavailable.
+    """
+    try:
+        import numpy as np
+        from PIL import Image, ImageOps
+    except Exception:
+        return None
+    max_side = max(model_max_side(m) for m in models)
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    target = None
+    if max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # Draft picks the coarsest JPEG DCT scale that still covers the
+        # target, then a single resample lands on it exactly.
+        image.draft("RGB", target)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if target is not None and image.size != target:
+        image = image.resize(target, Image.BILINEAR)
+    # Rotate after downscaling so the transpose touches fewer pixels.
+    image = ImageOps.exif_transpose(image)
+    return PreparedImage(np.ascontiguousarray(np.array(image, dtype=np.uint8)))
+
+
+def decode_for(data: bytes, model: str):
+    """Decode ``data`` for a single model; ``None`` if decoding is unavailable."""
+    prepared = prepare_image(data, (model,))
+    return prepared.for_model(model) if prepared is not None else None
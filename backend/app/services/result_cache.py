@@ -0,0 +1,183 @@
+"""
+Content-addressed cache for AI inference results.
+
+Entries are keyed by a digest of the uploaded bytes plus the model version,
+so a re-uploaded selfie or document skips inference entirely. An in-process
+LRU tier (bounded by entry count, byte budget and TTL) sits in front of an
+optional Redis tier shared by all workers.
+"""
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.core.config import settings
+
+
+def _encode(value: Any) -> Any:
+    try:
+        import numpy as np
+    except Exception:
+        np = None
+    if np is not None and isinstance(value, np.ndarray):
+        return {
+            "__ndarray__": base64.b64encode(value.tobytes()).decode("ascii"),
+            "dtype": value.dtype.str,
+            "shape": list(value.shape),
+        }
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__ndarray__" in value:
+            import numpy as np
+
+            data = base64.b64decode(value["__ndarray__"])
+            return np.frombuffer(data, dtype=np.dtype(value["dtype"])).reshape(value["shape"]).copy()
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _sizeof(value: Any) -> int:
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, dict):
+        return sum(len(str(k)) + _sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(v) for v in value)
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 8
+
+
+class ResultCache:
+    """Two-tier (process-local LRU + optional Redis) result cache."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        redis_url: Optional[str] = None,
+        namespace: str = "verity:ai",
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._redis = None
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(kind: str, model_version: str, data: bytes) -> str:
+        return f"{kind}:{model_version}:{hashlib.sha256(data).hexdigest()}"
+
+    def _redis_client(self):
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except Exception:
+                self.redis_url = None
+                return None
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    def _store_local(self, key: str, value: Any) -> None:
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        self._evict_key(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _evict_key(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, _, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._evict_key(key)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                raw = await client.get(f"{self.namespace}:{key}")
+            except Exception:
+                self.redis_errors += 1
+                raw = None
+            if raw is not None:
+                value = _decode(json.loads(raw))
+                self._store_local(key, value)
+                self.hits += 1
+                self.redis_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        self._store_local(key, value)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                # Milliseconds, at least one: Redis rejects a zero expiry, so a
+                # sub-second TTL in whole seconds would fail every write.
+                ttl_ms = max(1, int(self.ttl_seconds * 1000))
+                await client.set(f"{self.namespace}:{key}", json.dumps(_encode(value)), px=ttl_ms)
+            except Exception:
+                self.redis_errors += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "redis_enabled": bool(self.redis_url),
+            "redis_hits": self.redis_hits,
+            "redis_errors": self.redis_errors,
+            "evictions": self.evictions,
+        }
+
+
+result_cache = ResultCache(
+    max_entries=settings.AI_CACHE_MAX_ENTRIES,
+    max_bytes=settings.AI_CACHE_MAX_BYTES,
+    ttl_seconds=settings.AI_CACHE_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.AI_CACHE_REDIS_ENABLED else None,
+)
@@ -10,8 +10,12 @@ from app.models.invitation import KYCInvitation
 from app.core.config import settings
 from app.schemas import CustomerSubmissionCreate, SubmissionApprove, SubmissionReject
 from fastapi import HTTPException, status
+import asyncio
+import logging
+import time
 import uuid
-import random
+
+logger = logging.getLogger(__name__)
 
 
 class SubmissionService:
@@ -51,10 +55,12 @@ class SubmissionService:
             customer_phone=submission_data.customer_phone,
             status="submitted",
             submitted_at=datetime.now(timezone.utc),
-            risk_score=random.randint(20, 80),  # Placeholder - will be replaced with real scoring
-            risk_level="green" if random.random() > 0.3 else "amber",  # Placeholder
+            # Scored by the verification pipeline once its stages finish.
+            risk_score=None,
+            risk_level=None,
             source_ip="0.0.0.0",  # Will be captured from request in router
             source_location="Unknown",  # Will be geocoded in future
+            submission_metadata={"pipeline": {"status": "queued", "task_id": str(uuid.uuid4()), "queued_at": time.time()}},
         )
         db.add(submission)
         
@@ -62,6 +68,21 @@ class SubmissionService:
         invitation.usage_count += 1
         
         await db.commit()
+        
+        # OCR, face matching and liveness run in Celery; the request does not
+        # wait for them. The images go to the artifact store and the stages
+        # get references; the callback reads the committed rows, so enqueue after.
+        pipeline = submission.submission_metadata["pipeline"]
+        try:
+            from app.services.verification_pipeline import artifact_manifest, submission_context
+            from app.workers.celery_app import start_verification_pipeline
+
+            manifest = await asyncio.to_thread(artifact_manifest, submission_context(submission, session))
+            await asyncio.to_thread(start_verification_pipeline, submission.id, pipeline["task_id"], manifest)
+        except Exception as e:
+            logger.exception("Could not enqueue verification for submission %s", submission.id)
+            submission.submission_metadata = {"pipeline": {**pipeline, "status": "not_queued", "error": str(e)}}
+            await db.commit()
         await db.refresh(submission)
         
         return submission
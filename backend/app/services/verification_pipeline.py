@@ -0,0 +1,273 @@
+"""
+Asynchronous verification pipeline for KYC submissions.
+
+Creating a submission enqueues a Celery chord (see
+``app.workers.celery_app.start_verification_pipeline``): the OCR, face and
+liveness stages run in parallel as a group and a callback turns their
+results into the risk score, writing ``risk_score``/``risk_level`` on the
+submission and the full assessment to ``KYCSession.risk_assessment``.
+
+Images never travel through the broker. Before enqueueing, the submitted
+document, selfie and liveness video go to the artifact store and the stages
+receive a small manifest of references (storage key plus SHA-256); each
+stage fetches only the artifacts it needs and checks their digests. The
+manifest also carries the model versions active in the API when the
+submission was enqueued, and every stage pins them, so a worker whose
+defaults predate a hot swap still scores with the swapped-in models. The
+stages are plain coroutines over that manifest, so a task only wraps one
+call. A stage never raises: a failure is reported as a stage result and the
+chord still reaches its callback. Every stage records how long it waited in
+the queue and how long it ran.
+"""
+import asyncio
+import base64
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.models.session import KYCSession
+from app.models.submission import CustomerSubmission
+from app.services.artifacts import get_artifact_store
+from app.services.ai_models import (
+    FaceDeduplicationService,
+    FaceVerificationService,
+    _check_document_forgery,
+    _read_document,
+    score_risk_batch,
+)
+from app.services.inference_executor import inference_executor
+from app.services.liveness import analyse_video
+from app.services.model_registry import model_versions, pinned
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("ocr", "face", "liveness")
+# Fields of the OCR result kept in the assessment (the raw text is not).
+OCR_FIELDS = ("document_type", "full_name", "date_of_birth", "document_number", "expiry_date", "nationality", "model_version")
+
+
+def _image_bytes(data: Optional[dict], *keys: str) -> Optional[bytes]:
+    """Decode the first data URL found under ``keys``, if present."""
+    if not data:
+        return None
+    image = next((data[key] for key in keys if data.get(key)), None)
+    if not image:
+        return None
+    try:
+        return base64.b64decode(image.split(",", 1)[-1])
+    except Exception:
+        return None
+
+
+def _selfie_bytes(biometric: Optional[dict]) -> Optional[bytes]:
+    """Decode the selfie data URL captured by the KYC flow, if present."""
+    return _image_bytes(biometric, "selfieImage", "selfie_image")
+
+
+def _document_bytes(document: Optional[dict]) -> Optional[bytes]:
+    """Decode the document photo data URL captured by the KYC flow, if present."""
+    return _image_bytes(document, "capturedImage", "captured_image")
+
+
+def submission_context(submission: CustomerSubmission, session: Optional[KYCSession]) -> Dict[str, Any]:
+    """The stored submission data the pipeline works from."""
+    return {
+        "submission_id": submission.id,
+        "organization_id": submission.organization_id,
+        "document": session.document if session else None,
+        "biometric": session.biometric if session else None,
+        "gps": session.gps if session else None,
+        "phone_verification": session.phone_verification if session else None,
+    }
+
+
+async def load_context(sessions, submission_id: str) -> Optional[Dict[str, Any]]:
+    """Load the submission's context, or ``None`` if it is gone."""
+    async with sessions() as db:
+        submission = await db.get(CustomerSubmission, submission_id)
+        if submission is None:
+            return None
+        session = await db.get(KYCSession, submission.kyc_session_id) if submission.kyc_session_id else None
+        return submission_context(submission, session)
+
+
+def artifact_manifest(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Store the submission's images and return what the stage tasks are sent."""
+    store = get_artifact_store()
+    biometric = context["biometric"] or {}
+    images = {
+        "document": _document_bytes(context["document"]),
+        "selfie": _selfie_bytes(biometric),
+        "video": _image_bytes(biometric, "livenessVideo", "liveness_video"),
+    }
+    return {
+        "submission_id": context["submission_id"],
+        "organization_id": context["organization_id"],
+        "document_type": (context["document"] or {}).get("type"),
+        # The capture flow's own verdict, for when there is no video.
+        "liveness_detected": biometric.get("livenessDetected"),
+        "artifacts": {name: store.put(data) for name, data in images.items() if data is not None},
+        "model_versions": dict(model_versions.active),
+    }
+
+
+async def load_manifest(sessions, submission_id: str) -> Optional[Dict[str, Any]]:
+    """Build the stage manifest from the stored submission, or ``None`` if it is gone."""
+    context = await load_context(sessions, submission_id)
+    if context is None:
+        return None
+    return await asyncio.to_thread(artifact_manifest, context)
+
+
+async def _fetch(manifest: Dict[str, Any], name: str) -> Optional[bytes]:
+    ref = manifest["artifacts"].get(name)
+    if ref is None:
+        return None
+    return await asyncio.to_thread(get_artifact_store().get, ref)
+
+
+async def ocr_stage(manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    image = await _fetch(manifest, "document")
+    if image is None:
+        return None
+    ocr, forgery = await asyncio.gather(_read_document(image, manifest["document_type"]), _check_document_forgery(image))
+    return {"document": {field: ocr.get(field) for field in OCR_FIELDS}, "forgery": forgery}
+
+
+async def face_stage(manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    selfie = await _fetch(manifest, "selfie")
+    if selfie is None:
+        return None
+    submission_id, organization_id = manifest["submission_id"], manifest["organization_id"]
+    # Check the selfie against every face already seen by this organization.
+    result = {
+        "face_dedup": await FaceDeduplicationService.find_duplicates(
+            organization_id, selfie, subject_id=submission_id, enroll=True
+        ),
+        "face_match": None,
+    }
+    document = await _fetch(manifest, "document")
+    if document is not None:
+        # The embeddings are kept under the submission ID, so reviews and
+        # threshold changes can re-check the match without the model.
+        result["face_match"] = await FaceVerificationService.match_images(
+            selfie, document, reference_id=submission_id, organization_id=organization_id
+        )
+    return result
+
+
+async def liveness_stage(manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    ref = manifest["artifacts"].get("video")
+    if ref is None:
+        # Without a recorded video only the capture flow's own verdict exists.
+        if manifest["liveness_detected"] is None:
+            return None
+        return {"source": "client", "is_live": bool(manifest["liveness_detected"])}
+    # The engine streams frames from a file; the stored artifact is one.
+    path = await asyncio.to_thread(get_artifact_store().path, ref)
+    return {"source": "video", **await inference_executor.call(analyse_video, path)}
+
+
+STAGE_FUNCTIONS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]] = {
+    "ocr": ocr_stage,
+    "face": face_stage,
+    "liveness": liveness_stage,
+}
+
+
+async def run_stage(stage: str, manifest: Optional[Dict[str, Any]], enqueued_at: float) -> Dict[str, Any]:
+    """Run one stage over a manifest; ``enqueued_at`` is the pipeline's ``time.time()``."""
+    queue_ms = max(0.0, (time.time() - enqueued_at) * 1000)
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"stage": stage, "status": "completed", "result": None, "queue_ms": round(queue_ms, 1)}
+    try:
+        if manifest is None:
+            report["status"] = "skipped"
+        else:
+            with pinned(manifest.get("model_versions")):
+                report["result"] = await STAGE_FUNCTIONS[stage](manifest)
+            if report["result"] is None:
+                report["status"] = "skipped"
+    except Exception as e:
+        logger.exception("%s stage failed for submission %s", stage, (manifest or {}).get("submission_id"))
+        report.update(status="failed", error=str(e))
+    report["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def assess(context: Dict[str, Any], stages: List[Dict[str, Any]], enqueued_at: float) -> Dict[str, Any]:
+    """Combine the stage reports and the stored phone and GPS checks into a risk assessment."""
+    results = {report["stage"]: report.get("result") or {} for report in stages}
+    features: Dict[str, float] = {}
+    flags: List[str] = []
+
+    forgery = results.get("ocr", {}).get("forgery") or {}
+    if forgery.get("checked"):
+        features["documentAuthenticity"] = round(forgery["score"] * 100, 2)
+        if forgery["is_forged"]:
+            flags.append("document_forgery")
+    face_match = results.get("face", {}).get("face_match")
+    if face_match is not None:
+        features["faceMatchScore"] = round(face_match["confidence"] * 100, 2)
+        if not face_match.get("match"):
+            flags.append("face_mismatch")
+    if (results.get("face", {}).get("face_dedup") or {}).get("duplicates"):
+        flags.append("duplicate_face")
+    liveness = results.get("liveness")
+    # "unavailable" means the engine could not run here, not a failed check.
+    if liveness and liveness.get("stopped") != "unavailable" and not liveness.get("is_live"):
+        flags.append("liveness_failed")
+    gps = context.get("gps") or {}
+    if gps.get("isMatched"):
+        features["gpsMatch"] = float(gps.get("matchConfidence") or 0)
+    if (context.get("phone_verification") or {}).get("isVerified"):
+        features["phoneVerification"] = 100.0
+    flags.extend(f"{report['stage']}_failed" for report in stages if report["status"] == "failed")
+
+    risk = score_risk_batch([features])[0]
+    level = risk["level"]
+    if flags and level == "green":
+        level = "amber"
+    return {
+        **features,
+        "systemRiskScore": risk["score"],
+        "riskLevel": level,
+        "flags": flags,
+        "stages": {
+            report["stage"]: {key: report.get(key) for key in ("status", "queue_ms", "latency_ms", "error") if key in report}
+            for report in stages
+        },
+        "total_ms": round((time.time() - enqueued_at) * 1000, 1),
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def record_assessment(
+    sessions, stages: List[Dict[str, Any]], submission_id: str, enqueued_at: float
+) -> Optional[Dict[str, Any]]:
+    """Chord callback body: score the submission and write the result back."""
+    async with sessions() as db:
+        submission = await db.get(CustomerSubmission, submission_id)
+        if submission is None:
+            return None
+        session = await db.get(KYCSession, submission.kyc_session_id) if submission.kyc_session_id else None
+        context = {
+            "gps": session.gps if session else None,
+            "phone_verification": session.phone_verification if session else None,
+        }
+        assessment = assess(context, stages, enqueued_at)
+        submission.risk_score = assessment["systemRiskScore"]
+        submission.risk_level = assessment["riskLevel"]
+        # JSON columns only notice reassignment, not in-place changes.
+        metadata = dict(submission.submission_metadata or {})
+        face = next((report.get("result") for report in stages if report["stage"] == "face"), None) or {}
+        metadata.update({key: face[key] for key in ("face_dedup", "face_match") if face.get(key) is not None})
+        metadata["pipeline"] = {**metadata.get("pipeline", {}), "status": "completed", "total_ms": assessment["total_ms"]}
+        submission.submission_metadata = metadata
+        if assessment["flags"] and submission.status == "submitted":
+            submission.status = "needs_review"
+        if session is not None:
+            session.risk_assessment = assessment
+        await db.commit()
+        return assessment
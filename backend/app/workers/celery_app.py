@@ -1,8 +1,51 @@
 """
-Celery background tasks (placeholder - will integrate with trained models)
+Celery background tasks
+
+Submissions are verified by a chord (``start_verification_pipeline``): the
+OCR, face and liveness stage tasks run as a group and
+``calculate_risk_score_task`` scores and records the result. The stage
+bodies live in ``app.services.verification_pipeline``. Stage tasks carry a
+manifest of artifact references, never image bytes, and task and result
+bodies use the compact ``msgpack-zstd`` serializer (``CELERY_SERIALIZER``).
+
+Tasks are routed to four queues: interactive inference (the pipeline),
+batch inference (bulk re-scoring), notifications and maintenance, so a
+re-scoring backlog never delays a verification or an OTP email. Within a
+queue tasks carry priorities. Each worker role (``CELERY_WORKER_ROLE``)
+subscribes to its own set of queues with its own pool, concurrency, prefetch
+and child recycling. Inference children load and warm the models once, in
+``worker_process_init``, before they accept work; every worker thread keeps
+one event loop and database engine for all its tasks. Workers record how
+long each task waited and ran per queue (``queue_stats``).
+
+Callers go through ``app.workers.dispatch``: with ``TASK_BACKEND=local`` the
+same tasks run from an on-disk queue in the API process, without a broker.
 """
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
 from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    celeryd_after_setup,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+)
 from app.core.config import settings
+from app.services import verification_pipeline
+from app.services.ai_models import score_risk_batch
+from app.services.artifacts import get_artifact_store
+from app.workers.queue_stats import QueueLatency
+from app.workers.serialization import SERIALIZER, register_serializer
+
+logger = logging.getLogger(__name__)
 
 celery_app = Celery(
     "verity_ai",
@@ -10,38 +53,286 @@ celery_app = Celery(
     backend=settings.CELERY_RESULT_BACKEND,
 )
 
+QUEUES = ("inference", "batch", "notifications", "maintenance")
+# Priorities within a queue, lowest first. Finishing a pipeline outranks
+# starting stages of the next one; OTP emails go with PRIORITY_URGENT. Celery
+# ignores a task default of 0, so the scale starts at 1.
+PRIORITY_URGENT = 1
+PRIORITY_INTERACTIVE = 3
+PRIORITY_DEFAULT = 5
+PRIORITY_BULK = 9
+
+serializer = settings.CELERY_SERIALIZER
+if serializer == SERIALIZER and not register_serializer():
+    logger.warning("msgpack is not installed; Celery falls back to JSON")
+    serializer = "json"
+
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer=serializer,
+    # JSON stays accepted, for messages queued before a serializer change.
+    accept_content=sorted({"json", serializer}),
+    result_serializer=serializer,
     timezone="UTC",
     enable_utc=True,
+    task_default_queue="maintenance",
+    task_routes={
+        "app.workers.celery_app.process_ocr_task": {"queue": "inference"},
+        "app.workers.celery_app.match_faces_task": {"queue": "inference"},
+        "app.workers.celery_app.check_liveness_task": {"queue": "inference"},
+        "app.workers.celery_app.calculate_risk_score_task": {"queue": "inference"},
+        "app.workers.celery_app.calculate_risk_scores_task": {"queue": "batch"},
+        "app.workers.celery_app.send_email_task": {"queue": "notifications"},
+        "app.workers.celery_app.prune_artifacts_task": {"queue": "maintenance"},
+    },
+    task_default_priority=PRIORITY_DEFAULT,
+    # Redis keeps one list per priority and pops the lowest number first.
+    broker_transport_options={"queue_order_strategy": "priority", "priority_steps": list(range(10)), "sep": ":"},
+    beat_schedule={
+        "prune-artifacts": {"task": "app.workers.celery_app.prune_artifacts_task", "schedule": 6 * 3600},
+    },
 )
 
+# Per-role worker settings. Inference children hold the models, so they take
+# one task at a time and their start-up may take as long as loading does.
+WORKER_POOLS: Dict[str, Dict[str, Any]] = {
+    "inference": {
+        "queues": ("inference",),
+        "worker_pool": "prefork",
+        "worker_concurrency": settings.CELERY_INFERENCE_CONCURRENCY,
+        "worker_prefetch_multiplier": settings.CELERY_INFERENCE_PREFETCH,
+        "worker_max_tasks_per_child": settings.CELERY_INFERENCE_MAX_TASKS_PER_CHILD or None,
+        "worker_proc_alive_timeout": settings.CELERY_INFERENCE_INIT_TIMEOUT_S,
+    },
+    "batch": {
+        "queues": ("batch",),
+        "worker_pool": "prefork",
+        "worker_concurrency": settings.CELERY_BATCH_CONCURRENCY,
+        "worker_prefetch_multiplier": settings.CELERY_BATCH_PREFETCH,
+        "worker_max_tasks_per_child": settings.CELERY_BATCH_MAX_TASKS_PER_CHILD or None,
+    },
+    "io": {
+        "queues": ("notifications", "maintenance"),
+        "worker_pool": settings.CELERY_IO_POOL,
+        "worker_concurrency": settings.CELERY_IO_CONCURRENCY,
+        "worker_prefetch_multiplier": settings.CELERY_IO_PREFETCH,
+        "worker_max_tasks_per_child": settings.CELERY_IO_MAX_TASKS_PER_CHILD or None,
+    },
+}
+# A worker without a role serves every queue from inference-style children.
+WORKER_POOLS[""] = {**WORKER_POOLS["inference"], "queues": QUEUES}
+
+
+def worker_pool() -> Dict[str, Any]:
+    if settings.CELERY_WORKER_ROLE not in WORKER_POOLS:
+        raise ValueError(f"Unknown CELERY_WORKER_ROLE: {settings.CELERY_WORKER_ROLE}")
+    return WORKER_POOLS[settings.CELERY_WORKER_ROLE]
+
+
+celery_app.conf.update({key: value for key, value in worker_pool().items() if key != "queues"})
+
+# Set once a worker starts; until then (eager calls, scripts) each call gets
+# a throwaway event loop (and engine).
+_in_worker = False
+_resident = threading.local()
+worker_report: Dict[str, Any] = {}
+queue_latency = QueueLatency(settings.CELERY_QUEUE_STATS_WINDOW, redis_url=settings.REDIS_URL)
+# Task ID -> (queue, wait ms, perf_counter at start) while a task runs.
+_running: Dict[str, tuple] = {}
+
+
+@worker_init.connect
+def _mark_worker(**kwargs) -> None:
+    global _in_worker
+    _in_worker = True
+
+
+@celeryd_after_setup.connect
+def _select_queues(sender, instance, **kwargs) -> None:
+    # Only when the command line named no queues (-Q) of its own.
+    queues = instance.app.amqp.queues
+    if set(queues) <= {instance.app.conf.task_default_queue}:
+        queues.select(worker_pool()["queues"])
+
+
+@before_task_publish.connect
+def _stamp_published(headers=None, **kwargs) -> None:
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **kwargs) -> None:
+    request = task.request
+    published_at = getattr(request, "published_at", None)
+    if request.is_eager or published_at is None:
+        return
+    queue = (request.delivery_info or {}).get("routing_key") or "unknown"
+    _running[task_id] = (queue, max(0.0, (time.time() - published_at) * 1000), time.perf_counter())
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, **kwargs) -> None:
+    started = _running.pop(task_id, None)
+    if started is not None:
+        queue, wait_ms, at = started
+        queue_latency.record(queue, wait_ms, (time.perf_counter() - at) * 1000)
+
+
+def queue_stats() -> Dict[str, Dict[str, Any]]:
+    """Depth, and wait and run times of recent tasks, per queue."""
+    from app.workers.dispatch import get_dispatcher
+
+    depths = get_dispatcher().depths(QUEUES)
+    return {name: {"depth": depths[name], **queue_latency.summary(name)} for name in QUEUES}
+
+
+def _resident_loop() -> asyncio.AbstractEventLoop:
+    """This thread's event loop, created on first use."""
+    loop = getattr(_resident, "loop", None)
+    if loop is None:
+        loop = _resident.loop = asyncio.new_event_loop()
+    return loop
+
 
-@celery_app.task
-def process_ocr_task(session_id: str, document_url: str):
-    """Process OCR extraction task."""
-    # Placeholder - will integrate real OCR model
-    return {"session_id": session_id, "ocr_result": {}}
+def _resident_sessions():
+    """This thread's session factory, created on first use (stage tasks never need one)."""
+    sessions = getattr(_resident, "sessions", None)
+    if sessions is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+        # One task at a time per thread, so a couple of connections suffice.
+        _resident.engine = create_async_engine(settings.DATABASE_URL, pool_size=1, max_overflow=1, pool_pre_ping=True)
+        sessions = _resident.sessions = async_sessionmaker(_resident.engine, expire_on_commit=False, autoflush=False)
+    return sessions
 
-@celery_app.task
-def check_liveness_task(session_id: str, video_url: str):
-    """Check liveness task."""
-    # Placeholder - will integrate real liveness model
-    return {"session_id": session_id, "liveness_result": {}}
 
+@worker_process_init.connect
+def _init_worker_process(**kwargs) -> None:
+    """Load and warm the models in a fresh inference child before it takes work."""
+    if "inference" not in worker_pool()["queues"]:
+        return
+    from app.services.ai_models import preload_models
+    from app.services.onnx_runtime import set_inference_processes
 
-@celery_app.task
-def calculate_risk_score_task(submission_id: str, submission_data: dict):
-    """Calculate risk score task."""
-    # Placeholder - will integrate real risk scoring
-    return {"submission_id": submission_id, "risk_score": 50}
+    # The pool's children are the inference processes ONNX Runtime splits
+    # the cores between.
+    set_inference_processes(celery_app.conf.worker_concurrency or os.cpu_count() or 1)
 
+    started = time.perf_counter()
+    models = tuple(m.strip() for m in settings.AI_ENABLED_MODELS.split(",") if m.strip())
+    worker_report.update(models=preload_models(models), pid=os.getpid())
+    worker_report["ready_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Inference child %s ready in %.0fms: %s", os.getpid(), worker_report["ready_ms"], worker_report["models"])
 
-@celery_app.task
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**kwargs) -> None:
+    loop = getattr(_resident, "loop", None)
+    if loop is None:
+        return
+    engine = getattr(_resident, "engine", None)
+    if engine is not None:
+        loop.run_until_complete(engine.dispose())
+    loop.close()
+    _resident.loop = _resident.sessions = _resident.engine = None
+
+
+def _run_async(coro):
+    """Run a coroutine on the thread's resident loop in a worker, else on a fresh one."""
+    if _in_worker:
+        return _resident_loop().run_until_complete(coro)
+    return asyncio.run(coro)
+
+
+def _run(fn, *args):
+    """Run a pipeline coroutine ``fn(sessions, *args)`` and return its result.
+
+    In a worker it runs on the thread's resident loop and engine; elsewhere
+    on a fresh loop with an unpooled engine that lives as long as the call.
+    """
+    if _in_worker:
+        return _run_async(fn(_resident_sessions(), *args))
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    async def main():
+        engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+        try:
+            return await fn(async_sessionmaker(engine, expire_on_commit=False, autoflush=False), *args)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@celery_app.task(priority=PRIORITY_INTERACTIVE)
+def process_ocr_task(manifest: dict, enqueued_at: float):
+    """Read the submitted document and check it against the genuine templates."""
+    return _run_async(verification_pipeline.run_stage("ocr", manifest, enqueued_at))
+
+
+@celery_app.task(priority=PRIORITY_INTERACTIVE)
+def match_faces_task(manifest: dict, enqueued_at: float):
+    """Deduplicate the selfie within the organization and match it to the document photo."""
+    return _run_async(verification_pipeline.run_stage("face", manifest, enqueued_at))
+
+
+@celery_app.task(priority=PRIORITY_INTERACTIVE)
+def check_liveness_task(manifest: dict, enqueued_at: float):
+    """Check liveness from the recorded video, or the capture flow's verdict."""
+    return _run_async(verification_pipeline.run_stage("liveness", manifest, enqueued_at))
+
+
+@celery_app.task(priority=PRIORITY_URGENT)
+def calculate_risk_score_task(stages: list, submission_id: str, enqueued_at: float):
+    """Chord callback: score the stage results and write the assessment back."""
+    assessment = _run(verification_pipeline.record_assessment, stages, submission_id, enqueued_at)
+    if assessment is None:
+        return {"submission_id": submission_id, "risk_score": None, "risk_level": None}
+    return {"submission_id": submission_id, "risk_score": assessment["systemRiskScore"], "risk_level": assessment["riskLevel"]}
+
+
+STAGE_TASKS = {"ocr": process_ocr_task, "face": match_faces_task, "liveness": check_liveness_task}
+
+
+def start_verification_pipeline(
+    submission_id: str, task_id: Optional[str] = None, manifest: Optional[Dict[str, Any]] = None
+) -> str:
+    """Enqueue the verification chord for a committed submission; return the callback's task ID.
+
+    ``manifest`` is the submission's ``artifact_manifest``; without one it is
+    built from the stored submission.
+    """
+    if manifest is None:
+        manifest = _run(verification_pipeline.load_manifest, submission_id)
+        if manifest is None:
+            raise LookupError(f"Submission {submission_id} not found")
+    from app.workers.dispatch import get_dispatcher
+
+    enqueued_at = time.time()
+    return get_dispatcher().chord(
+        [(STAGE_TASKS[stage].name, (manifest, enqueued_at)) for stage in verification_pipeline.STAGES],
+        (calculate_risk_score_task.name, (submission_id, enqueued_at)),
+        task_id,
+        tenant=manifest["organization_id"] or "",
+    )
+
+
+@celery_app.task(priority=PRIORITY_DEFAULT)
+def calculate_risk_scores_task(rows: list):
+    """Re-score many submissions (rows of features with an ``id``) in one vectorized pass."""
+    return score_risk_batch(rows)
+
+
+@celery_app.task(priority=PRIORITY_DEFAULT)
 def send_email_task(to_email: str, subject: str, html_content: str):
-    """Send email task."""
+    """Send email task (enqueue OTP and confirmation emails with ``priority=PRIORITY_URGENT``)."""
     # Placeholder - will integrate email service
     return {"email": to_email, "sent": True}
+
+
+@celery_app.task(priority=PRIORITY_BULK)
+def prune_artifacts_task():
+    """Remove stored artifacts no pipeline has used for ``ARTIFACT_RETENTION_HOURS``."""
+    return {"removed": get_artifact_store().prune(settings.ARTIFACT_RETENTION_HOURS * 3600)}
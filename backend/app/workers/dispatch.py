@@ -0,0 +1,159 @@
+"""
+Task dispatch: Celery in production, a local queue on a single box.
+
+``TASK_BACKEND`` picks how tasks registered on ``celery_app`` are run:
+
+- ``celery``: published to the broker and run by Celery workers;
+- ``local``: queued in the SQLite file ``LOCAL_TASK_QUEUE_PATH`` and run by a
+  bounded pool in the API process (``app.workers.local_queue``), for
+  deployments and test environments without Redis.
+
+Both take the same task names, arguments, queues and priorities, so callers
+such as ``start_verification_pipeline`` do not know which one runs. Callers
+may name the tenant (organization) a task is for; the local queue shares
+its workers fairly between tenants, while Celery orders by queue and
+priority alone.
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# (task name, arguments)
+TaskCall = Tuple[str, Sequence[Any]]
+
+
+class CeleryDispatcher:
+    """Publish to the Celery broker."""
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def send(self, name: str, args: Sequence[Any], priority: Optional[int] = None, tenant: str = "") -> str:
+        from app.workers.celery_app import celery_app
+
+        options = {} if priority is None else {"priority": priority}
+        return celery_app.tasks[name].apply_async(tuple(args), **options).id
+
+    def chord(self, header: List[TaskCall], callback: TaskCall, task_id: Optional[str] = None, tenant: str = "") -> str:
+        from celery import chord, group
+        from app.workers.celery_app import celery_app
+
+        stages = group(celery_app.signature(name, args=tuple(args)) for name, args in header)
+        name, args = callback
+        return chord(stages)(celery_app.signature(name, args=tuple(args)), task_id=task_id).id
+
+    def depths(self, queues: Iterable[str]) -> Dict[str, Optional[int]]:
+        from app.workers.celery_app import celery_app
+        from app.workers.queue_stats import queue_depths
+
+        return queue_depths(celery_app, queues)
+
+
+class LocalDispatcher:
+    """Queue in SQLite and run in this process; the executor starts with the first task."""
+
+    def __init__(
+        self,
+        path: str,
+        workers: int,
+        pool: str = "threads",
+        poll_interval: float = 0.5,
+        max_attempts: int = 3,
+    ):
+        from app.workers.local_queue import LocalTaskExecutor, SQLiteTaskQueue
+        from app.workers.celery_app import _shutdown_worker_process, queue_latency
+
+        self.queue = SQLiteTaskQueue(path, max_attempts=max_attempts)
+        self.executor = LocalTaskExecutor(
+            self.queue,
+            workers,
+            pool=pool,
+            poll_interval=poll_interval,
+            initializer=_init_local_worker,
+            # Close the thread's resident loop and engine.
+            on_thread_exit=_shutdown_worker_process,
+            on_finished=queue_latency.record,
+        )
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            self.executor.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self.executor.stop()
+
+    def _spec(self, name: str, args: Sequence[Any], priority: Optional[int] = None):
+        from app.workers.celery_app import celery_app
+
+        task = celery_app.tasks[name]
+        queue = celery_app.amqp.router.route({}, name)["queue"].name
+        return name, list(args), queue, task.priority if priority is None else priority
+
+    def send(self, name: str, args: Sequence[Any], priority: Optional[int] = None, tenant: str = "") -> str:
+        task_id = self.queue.put(self._spec(name, args, priority), tenant=tenant)
+        self._wake()
+        return task_id
+
+    def chord(self, header: List[TaskCall], callback: TaskCall, task_id: Optional[str] = None, tenant: str = "") -> str:
+        task_id = self.queue.put_chord([self._spec(*call) for call in header], self._spec(*callback), task_id, tenant)
+        self._wake()
+        return task_id
+
+    def depths(self, queues: Iterable[str]) -> Dict[str, Optional[int]]:
+        depths = self.queue.depths()
+        return {name: depths.get(name, 0) for name in queues}
+
+    def _wake(self) -> None:
+        if not self.executor.running:
+            self.start()
+        self.executor.notify(everyone=True)
+
+
+def _init_local_worker() -> None:
+    """Run tasks the way a Celery worker does: resident loops, and warm models in a child."""
+    import multiprocessing
+
+    from app.workers import celery_app as workers
+
+    workers._mark_worker()
+    if multiprocessing.parent_process() is not None:
+        workers._init_worker_process()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Return the dispatcher for ``TASK_BACKEND``."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            if settings.TASK_BACKEND == "celery":
+                _dispatcher = CeleryDispatcher()
+            elif settings.TASK_BACKEND == "local":
+                _dispatcher = LocalDispatcher(
+                    settings.LOCAL_TASK_QUEUE_PATH,
+                    settings.LOCAL_TASK_WORKERS,
+                    pool=settings.LOCAL_TASK_POOL,
+                    poll_interval=settings.LOCAL_TASK_POLL_INTERVAL_S,
+                    max_attempts=settings.LOCAL_TASK_MAX_ATTEMPTS,
+                )
+            else:
+                raise ValueError(f"Unknown TASK_BACKEND: {settings.TASK_BACKEND}")
+        return _dispatcher
+
+
+def reset_dispatcher() -> None:
+    """Stop and forget the current dispatcher (settings changed, tests)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+        _dispatcher = None
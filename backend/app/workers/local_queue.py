@@ -0,0 +1,428 @@
+"""
+Local task execution over an on-disk SQLite queue.
+
+For single-node deployments and offline environments without a broker
+(``TASK_BACKEND=local``, see ``app.workers.dispatch``). The tasks are the
+same Celery task functions, looked up by name and called directly; only the
+transport is replaced. Every task is a row of ``LOCAL_TASK_QUEUE_PATH`` until
+it finishes, so a restart loses nothing: rows left running by a process that
+is gone are queued again, up to ``LOCAL_TASK_MAX_ATTEMPTS`` runs in all. A
+row's owner is the claiming process's PID and start time, so a restarted
+process that got the same PID (PID 1 in a container) still recovers them.
+
+Rows are claimed by priority, then round-robin across tenants (the
+submitting organizations), then age, so one organization's burst of
+submissions cannot hold back another's. A bounded set of worker threads run
+the tasks themselves or hand them to a process pool of the same size.
+A chord is its member rows plus a row describing the callback; the member
+that finishes last enqueues the callback with every member's result, in the
+same transaction that records its own.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    tenant TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    chord_id TEXT,
+    chord_index INTEGER,
+    result TEXT,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, priority, enqueued_at);
+CREATE INDEX IF NOT EXISTS tasks_chord ON tasks (chord_id);
+CREATE TABLE IF NOT EXISTS chords (
+    id TEXT PRIMARY KEY,
+    callback_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    tenant TEXT NOT NULL DEFAULT ''
+);
+-- When each tenant last had a task claimed.
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant TEXT PRIMARY KEY,
+    served_at REAL NOT NULL
+);
+"""
+
+# (name, args, queue, priority)
+TaskSpec = Tuple[str, Sequence[Any], str, int]
+# (id, name, args, queue, enqueued_at)
+ClaimedTask = Tuple[str, str, List[Any], str, float]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _started(pid: int) -> Optional[str]:
+    """Start time of process ``pid`` in clock ticks after boot, or ``None`` if unknown."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces; the fields after it do not.
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+_owner: Tuple[int, str] = (0, "")
+
+
+def _owner_token() -> str:
+    """This process's ``pid:start`` token, recorded on the rows it claims."""
+    global _owner
+    pid = os.getpid()
+    if _owner[0] != pid:
+        # Without /proc a random suffix still tells this run from earlier ones.
+        _owner = (pid, f"{pid}:{_started(pid) or uuid.uuid4().hex}")
+    return _owner[1]
+
+
+def _owner_running(owner: Any) -> bool:
+    """Whether the process that claimed a row with ``owner`` is still running."""
+    if owner is None:
+        return False
+    pid, _, start = str(owner).partition(":")
+    if int(pid) == os.getpid():
+        return str(owner) == _owner_token()
+    if not _alive(int(pid)):
+        return False
+    # The PID may have been reused since; the start time tells.
+    running = _started(int(pid))
+    return running is None or running == start
+
+
+class SQLiteTaskQueue:
+    """Durable priority queue of task rows, safe to share between processes on one box."""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._db()
+        db.executescript(SCHEMA)
+        for table in ("tasks", "chords"):
+            # Queue files written before tasks had tenants.
+            if "tenant" not in [column[1] for column in db.execute(f"PRAGMA table_info({table})")]:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit; writes take the lock up front with BEGIN IMMEDIATE.
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def _insert(
+        db: sqlite3.Connection, task_id: str, spec: TaskSpec, tenant: str = "", chord_id=None, chord_index=None
+    ) -> None:
+        name, args, queue, priority = spec
+        db.execute(
+            "INSERT INTO tasks (id, name, args, queue, priority, tenant, state, chord_id, chord_index, enqueued_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (task_id, name, json.dumps(list(args)), queue, priority, tenant, chord_id, chord_index, time.time()),
+        )
+
+    def put(self, spec: TaskSpec, task_id: Optional[str] = None, tenant: str = "") -> str:
+        task_id = task_id or str(uuid.uuid4())
+        with self._transaction() as db:
+            self._insert(db, task_id, spec, tenant)
+        return task_id
+
+    def put_chord(
+        self, header: List[TaskSpec], callback: TaskSpec, callback_id: Optional[str] = None, tenant: str = ""
+    ) -> str:
+        """Queue ``header`` to run in parallel, then ``callback`` with their results; return its ID."""
+        chord_id, callback_id = str(uuid.uuid4()), callback_id or str(uuid.uuid4())
+        name, args, queue, priority = callback
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO chords (id, callback_id, name, args, queue, priority, tenant) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chord_id, callback_id, name, json.dumps(list(args)), queue, priority, tenant),
+            )
+            for index, spec in enumerate(header):
+                self._insert(db, str(uuid.uuid4()), spec, tenant, chord_id, index)
+        return callback_id
+
+    def claim(self) -> Optional[ClaimedTask]:
+        """Take the most urgent queued task of the tenant served longest ago, or ``None``."""
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT t.id, t.name, t.args, t.queue, t.enqueued_at, t.tenant FROM tasks t"
+                " LEFT JOIN tenants s ON s.tenant = t.tenant WHERE t.state = 'queued'"
+                " ORDER BY t.priority, COALESCE(s.served_at, 0), t.enqueued_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            db.execute(
+                "UPDATE tasks SET state = 'running', attempts = attempts + 1, owner = ?, started_at = ? WHERE id = ?",
+                (_owner_token(), now, row[0]),
+            )
+            db.execute("INSERT OR REPLACE INTO tenants (tenant, served_at) VALUES (?, ?)", (row[5], now))
+        return row[0], row[1], json.loads(row[2]), row[3], row[4]
+
+    def complete(self, task_id: str, result: Any) -> Optional[str]:
+        """Record a finished task; return the callback ID if it completed a chord."""
+        with self._transaction() as db:
+            row = db.execute("SELECT chord_id FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None or row[0] is None:
+                db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+                return None
+            chord_id = row[0]
+            db.execute("UPDATE tasks SET state = 'done', result = ? WHERE id = ?", (json.dumps(result), task_id))
+            pending = db.execute(
+                "SELECT COUNT(*) FROM tasks WHERE chord_id = ? AND state != 'done'", (chord_id,)
+            ).fetchone()[0]
+            if pending:
+                return None
+            callback_id, name, args, queue, priority, tenant = db.execute(
+                "SELECT callback_id, name, args, queue, priority, tenant FROM chords WHERE id = ?", (chord_id,)
+            ).fetchone()
+            results = [
+                json.loads(value)
+                for (value,) in db.execute("SELECT result FROM tasks WHERE chord_id = ? ORDER BY chord_index", (chord_id,))
+            ]
+            self._insert(db, callback_id, (name, [results, *json.loads(args)], queue, priority), tenant)
+            db.execute("DELETE FROM tasks WHERE chord_id = ?", (chord_id,))
+            db.execute("DELETE FROM chords WHERE id = ?", (chord_id,))
+        return callback_id
+
+    def fail(self, task_id: str, error: str) -> None:
+        # Kept for inspection. As with Celery, a chord with a failed member
+        # never runs its callback.
+        with self._transaction() as db:
+            db.execute("UPDATE tasks SET state = 'failed', error = ? WHERE id = ?", (error, task_id))
+
+    def release(self, task_id: str, error: str) -> None:
+        """Give a task whose run was cut off back to the queue, unless it has used its attempts."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = ?, owner = NULL WHERE id = ?",
+                (self.max_attempts, error, task_id),
+            )
+
+    def recover(self) -> int:
+        """Release the tasks of processes that stopped while running them; return how many.
+
+        Rows claimed under this process's PID by an earlier run are released
+        too; only this run's own rows and other live processes' are kept.
+        """
+        with self._transaction() as db:
+            stale = [
+                task_id
+                for task_id, owner in db.execute("SELECT id, owner FROM tasks WHERE state = 'running'").fetchall()
+                if not _owner_running(owner)
+            ]
+        for task_id in stale:
+            self.release(task_id, "interrupted")
+        return len(stale)
+
+    def depths(self) -> Dict[str, int]:
+        rows = self._db().execute("SELECT queue, COUNT(*) FROM tasks WHERE state = 'queued' GROUP BY queue")
+        return dict(rows.fetchall())
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._db().execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+
+
+def run_task(name: str, args: List[Any]) -> Any:
+    """Call a registered task function by name (also the process pool's entry point)."""
+    from app.workers.celery_app import celery_app
+
+    return celery_app.tasks[name](*args)
+
+
+class LocalTaskExecutor:
+    """Bounded pool of worker threads draining a :class:`SQLiteTaskQueue`.
+
+    ``initializer`` prepares the process that runs tasks (this one, or each
+    pool child), ``on_thread_exit`` runs in every worker thread as it stops,
+    and ``on_finished(queue, wait_ms, run_ms)`` is called after every task.
+    """
+
+    def __init__(
+        self,
+        queue: SQLiteTaskQueue,
+        workers: int,
+        pool: str = "threads",
+        poll_interval: float = 0.5,
+        initializer: Optional[Callable[[], None]] = None,
+        on_thread_exit: Optional[Callable[[], None]] = None,
+        on_finished: Optional[Callable[[str, float, float], None]] = None,
+    ):
+        if pool not in ("threads", "processes"):
+            raise ValueError(f"Unknown local task pool: {pool}")
+        self.queue = queue
+        self.workers = max(1, workers)
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.initializer = initializer
+        self.on_thread_exit = on_thread_exit
+        self.on_finished = on_finished
+        self._threads: List[threading.Thread] = []
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._processes_lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        recovered = self.queue.recover()
+        if recovered:
+            logger.warning("Requeued %s local tasks interrupted by a restart", recovered)
+        if self.pool == "processes":
+            self._processes = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer)
+        elif self.initializer is not None:
+            self.initializer()
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"local-task-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop after the running tasks finish; queued ones stay on disk for the next start."""
+        self._stopping.set()
+        self.notify(everyone=True)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._processes is not None:
+            self._processes.shutdown(wait=True, cancel_futures=True)
+            self._processes = None
+
+    def notify(self, everyone: bool = False) -> None:
+        """Wake idle workers for newly queued work (other processes' work is found by polling)."""
+        with self._wake:
+            if everyone:
+                self._wake.notify_all()
+            else:
+                self._wake.notify()
+
+    def _loop(self) -> None:
+        try:
+            self._drain()
+        finally:
+            if self.on_thread_exit is not None:
+                self.on_thread_exit()
+
+    def _drain(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                task = self.queue.claim()
+            except sqlite3.Error:
+                logger.exception("Could not claim a local task")
+                task = None
+            if task is None:
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+                continue
+            self._execute(task)
+
+    def _call(self, name: str, args: List[Any]) -> Any:
+        if self._processes is None:
+            return run_task(name, args)
+        try:
+            return self._processes.submit(run_task, name, args).result()
+        except BrokenProcessPool:
+            # A child died (e.g. OOM-killed); replace the pool for later tasks.
+            with self._processes_lock:
+                if self._processes is not None and not self._stopping.is_set():
+                    self._processes.shutdown(wait=False)
+                    self._processes = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer)
+            raise
+
+    def _complete(self, task_id: str, name: str, result: Any) -> None:
+        try:
+            callback_id = self.queue.complete(task_id, result)
+        except sqlite3.Error as e:
+            # e.g. "database is locked": the run itself succeeded, so try again.
+            logger.exception("Could not record local task %s (%s)", name, task_id)
+            self._settle(self.queue.release, task_id, f"{type(e).__name__}: {e}")
+        except Exception as e:
+            # e.g. a result that is not JSON; another run would not help.
+            logger.exception("Could not record local task %s (%s)", name, task_id)
+            self._settle(self.queue.fail, task_id, f"{type(e).__name__}: {e}")
+        else:
+            if callback_id is not None:
+                self.notify()
+
+    def _settle(self, update: Callable[[str, str], None], task_id: str, error: str) -> None:
+        """Fail or release a task; if even that fails, the row is left to the next start's recovery."""
+        try:
+            update(task_id, error)
+        except sqlite3.Error:
+            logger.exception("Could not record the outcome of local task %s", task_id)
+            return
+        if update == self.queue.release:
+            self.notify()
+
+    def _execute(self, task: ClaimedTask) -> None:
+        task_id, name, args, queue, enqueued_at = task
+        wait_ms = max(0.0, (time.time() - enqueued_at) * 1000)
+        started = time.perf_counter()
+        try:
+            result = self._call(name, args)
+        except BrokenProcessPool as e:
+            self._settle(self.queue.release, task_id, f"BrokenProcessPool: {e}")
+        except Exception as e:
+            logger.exception("Local task %s (%s) failed", name, task_id)
+            self._settle(self.queue.fail, task_id, f"{type(e).__name__}: {e}")
+        else:
+            self._complete(task_id, name, result)
+        if self.on_finished is not None:
+            self.on_finished(queue, wait_ms, (time.perf_counter() - started) * 1000)
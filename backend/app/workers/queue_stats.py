@@ -0,0 +1,117 @@
+"""
+Per-queue depth and latency for the Celery queues.
+
+Depth comes from the broker: a passive queue declare, which on Redis sums
+the queue's priority lists. Latency is measured by the workers. Every
+published message is stamped with ``published_at``, and a worker records how
+long each task waited in its queue and how long it ran. The last
+``CELERY_QUEUE_STATS_WINDOW`` samples per queue go to a Redis list, so the API
+process can report what the workers saw. Without Redis they stay in the
+recording process.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# After a Redis error, record locally for this long before trying again.
+REDIS_RETRY_S = 30.0
+
+
+class QueueLatency:
+    """Rolling (wait, run) times in milliseconds per queue."""
+
+    def __init__(self, window: int, redis_url: Optional[str] = None, namespace: str = "verity:queues"):
+        self.window = window
+        self.redis_url = redis_url
+        self.namespace = namespace
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_retry_at = 0.0
+        self.redis_errors = 0
+
+    def _redis_client(self):
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            try:
+                import redis
+            except Exception:
+                self.redis_url = None
+                return None
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._redis
+
+    def _redis_failed(self) -> None:
+        self.redis_errors += 1
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_S
+
+    def record(self, queue: str, wait_ms: float, run_ms: float) -> None:
+        with self._lock:
+            self._samples[queue].append((wait_ms, run_ms))
+        client = self._redis_client()
+        if client is None:
+            return
+        key = f"{self.namespace}:{queue}"
+        try:
+            pipe = client.pipeline()
+            pipe.lpush(key, f"{wait_ms:.1f},{run_ms:.1f}")
+            pipe.ltrim(key, 0, self.window - 1)
+            pipe.execute()
+        except Exception:
+            self._redis_failed()
+
+    def samples(self, queue: str) -> List[Tuple[float, float]]:
+        client = self._redis_client()
+        if client is not None:
+            try:
+                items = client.lrange(f"{self.namespace}:{queue}", 0, -1)
+                return [tuple(float(v) for v in item.decode().split(",")) for item in items]
+            except Exception:
+                self._redis_failed()
+        with self._lock:
+            return list(self._samples.get(queue, ()))
+
+    def summary(self, queue: str) -> Dict[str, Any]:
+        samples = self.samples(queue)
+        if not samples:
+            return {"tasks": 0, "wait_ms": None, "run_ms": None}
+        times = np.asarray(samples, dtype=np.float64)
+        p50, p95 = np.percentile(times, (50, 95), axis=0)
+        return {
+            "tasks": len(samples),
+            "wait_ms": {"p50": round(float(p50[0]), 1), "p95": round(float(p95[0]), 1), "max": round(float(times[:, 0].max()), 1)},
+            "run_ms": {"p50": round(float(p50[1]), 1), "p95": round(float(p95[1]), 1), "max": round(float(times[:, 1].max()), 1)},
+        }
+
+
+def queue_depths(app, queues: Iterable[str]) -> Dict[str, Optional[int]]:
+    """Messages waiting per queue; ``None`` for all of them if the broker is unreachable."""
+    queues = list(queues)
+    depths: Dict[str, Optional[int]] = {}
+    try:
+        with app.connection_for_read() as conn:
+            conn.ensure_connection(max_retries=1, interval_start=0, interval_step=0)
+            channel = conn.channel()
+            try:
+                for name in queues:
+                    try:
+                        depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+                    except conn.channel_errors:
+                        # Never declared: nothing was ever sent to it. AMQP
+                        # closes the channel on a failed passive declare.
+                        depths[name] = 0
+                        channel.close()
+                        channel = conn.channel()
+            finally:
+                channel.close()
+    except Exception as e:
+        logger.warning("Could not read queue depths: %s", e)
+        return {name: None for name in queues}
+    return depths
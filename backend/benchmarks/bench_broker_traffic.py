@@ -0,0 +1,240 @@
+"""
+Benchmark: broker traffic of the verification pipeline, inline images vs references.
+
+Run from backend/:  python -m benchmarks.bench_broker_traffic [--submissions 40] [--video-share 0.5] [--video-kb 1500]
+
+Publishes the pipeline's messages for synthetic submissions (a rendered
+passport JPEG, a selfie JPEG and, for ``--video-share`` of them, a recorded
+liveness video) through kombu's filesystem transport, which frames bodies
+like the Redis transport does, and sizes every message and stored result:
+
+- ``inline``: stage tasks carry the data URLs they need, task and result
+  bodies are JSON;
+- ``reference``: images go to the artifact store once, stage tasks carry the
+  manifest of keys and digests, bodies are ``msgpack-zstd``.
+
+The stage results (OCR fields, a real forgery check, face deduplication and
+match, liveness) are the same on both paths. Reports bytes per submission for
+the stage messages, the stored results and the chord callback, and the
+producer and worker CPU time per submission, artifact store I/O included.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+from kombu.serialization import dumps, loads
+
+from app.core.config import settings
+from app.services import verification_pipeline
+from app.services.artifacts import get_artifact_store
+from app.services.document_forgery import build_index, check_forgery
+from app.services.preprocessing import PreparedImage
+from app.workers.celery_app import STAGE_TASKS, calculate_risk_score_task, celery_app, serializer
+from benchmarks.bench_ocr_roi import _render
+
+STAGE_IMAGES = {"ocr": ("document",), "face": ("selfie", "document"), "liveness": ("video",)}
+
+
+def _jpeg(pixels: np.ndarray, quality: int = 90) -> bytes:
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _selfie(rng: np.random.Generator) -> bytes:
+    # Smooth shading plus sensor noise compresses like a phone selfie.
+    y, x = np.mgrid[0:480, 0:640]
+    base = 120 + 60 * np.sin(x / rng.uniform(40, 90)) * np.cos(y / rng.uniform(40, 90))
+    pixels = base[..., None] + rng.normal(0, 6, (480, 640, 3))
+    return _jpeg(np.clip(pixels, 0, 255).astype(np.uint8), quality=85)
+
+
+def _data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64," + base64.b64encode(data).decode()
+
+
+def _submission(i: int, rng: random.Random, nrng: np.random.Generator, index, video_share: float, video_kb: int):
+    pixels, truth = _render("passport", rng)
+    images = {"document": _jpeg(pixels), "selfie": _selfie(nrng)}
+    if rng.random() < video_share:
+        # Recorded video is already compressed: random bytes model it.
+        images["video"] = nrng.bytes(video_kb * 1024)
+    forgery = check_forgery(PreparedImage(pixels).for_model("forgery"), index)
+    duplicates = [
+        {"subject_id": str(uuid.uuid4()), "similarity": round(rng.uniform(0.5, 0.9), 4)} for _ in range(rng.randrange(4))
+    ]
+    stages = [
+        {"stage": "ocr", "result": {"document": {"document_type": "passport", "nationality": "UTO", **truth}, "forgery": forgery}},
+        {
+            "stage": "face",
+            "result": {
+                "face_dedup": {"face_detected": True, "duplicates": duplicates, "enrolled": True, "model_version": "insightface-buffalo_l"},
+                "face_match": {"match": True, "confidence": round(rng.uniform(0.5, 0.9), 4), "model_version": "insightface-buffalo_l"},
+            },
+        },
+        {
+            "stage": "liveness",
+            "result": {
+                "source": "video" if "video" in images else "client",
+                "is_live": True,
+                "confidence": 0.8,
+                "liveness_score": 0.9,
+                "frames_sampled": 42,
+                "blinks": 2,
+                "features": {"blink_rate": 0.31, "motion": 0.12, "texture": 0.88, "specular": 0.05},
+                "stopped": "confident",
+            },
+        },
+    ]
+    for report in stages:
+        report.update(status="completed", queue_ms=round(rng.uniform(5, 80), 1), latency_ms=round(rng.uniform(20, 400), 1))
+    context = {
+        "submission_id": f"sub-{i}",
+        "organization_id": "org-1",
+        "document": {"type": "passport", "capturedImage": _data_url(images["document"], "image/jpeg")},
+        "biometric": {
+            "selfieImage": _data_url(images["selfie"], "image/jpeg"),
+            "livenessDetected": True,
+            **({"livenessVideo": _data_url(images["video"], "video/webm")} if "video" in images else {}),
+        },
+    }
+    return context, stages
+
+
+def _folder_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def _publish_inline(context: dict, enqueued_at: float):
+    """Send each stage the data URLs it needs; return how a worker gets an image."""
+    biometric, document = context["biometric"], context["document"]
+    urls = {"document": document["capturedImage"], "selfie": biometric["selfieImage"], "video": biometric.get("livenessVideo")}
+    for stage, task in STAGE_TASKS.items():
+        payload = {
+            "submission_id": context["submission_id"],
+            "organization_id": context["organization_id"],
+            "document_type": document["type"],
+            "liveness_detected": biometric["livenessDetected"],
+            **{name: urls[name] for name in STAGE_IMAGES[stage] if urls[name]},
+        }
+        task.apply_async((payload, enqueued_at), serializer="json")
+    return lambda payload, name: base64.b64decode(payload[name].split(",", 1)[1]) if payload.get(name) else None
+
+
+def _publish_reference(context: dict, enqueued_at: float):
+    """Store the images and send each stage the manifest; return how a worker gets an image."""
+    manifest = verification_pipeline.artifact_manifest(context)
+    for task in STAGE_TASKS.values():
+        task.apply_async((manifest, enqueued_at))
+    store = get_artifact_store()
+    return lambda payload, name: store.get(payload["artifacts"][name]) if name in payload["artifacts"] else None
+
+
+def _drain(folder: str) -> dict:
+    """Decode every queued message the way the consumer does and remove it; task name -> arguments."""
+    bodies = {}
+    for entry in os.listdir(folder):
+        path = os.path.join(folder, entry)
+        with open(path, "rb") as fh:
+            message = json.loads(fh.read())
+        body = loads(base64.b64decode(message["body"]), message["content-type"], message["content-encoding"])
+        bodies[message["headers"]["task"]] = body[0]
+        os.unlink(path)
+    return bodies
+
+
+def _result_meta(task_id: str, result) -> dict:
+    # What the Redis result backend stores per task.
+    return {
+        "status": "SUCCESS",
+        "result": result,
+        "traceback": None,
+        "children": [],
+        "date_done": datetime.now(timezone.utc).isoformat(),
+        "task_id": task_id,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submissions", type=int, default=40)
+    parser.add_argument("--video-share", type=float, default=0.5)
+    parser.add_argument("--video-kb", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    rng, nrng = random.Random(args.seed), np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        folders = {name: os.path.join(directory, name) for name in ("broker", "processed", "control", "index", "artifacts")}
+        for path in folders.values():
+            os.makedirs(path)
+        settings.ARTIFACT_STORE_PATH = folders["artifacts"]
+        celery_app.conf.update(
+            broker_url="filesystem://",
+            broker_transport_options={
+                "data_folder_in": folders["broker"],
+                "data_folder_out": folders["broker"],
+                "processed_folder": folders["processed"],
+                "control_folder": folders["control"],
+            },
+            # Results are sized below, nothing reads them back.
+            result_backend=f"file://{folders['processed']}",
+        )
+        index = build_index(folders["index"], {"uto-passport": ("passport", [_render("passport", rng)[0] for _ in range(2)])})
+        submissions = [_submission(i, rng, nrng, index, args.video_share, args.video_kb) for i in range(args.submissions)]
+        image_kib = sum(
+            len(url) * 3 / 4 / 1024
+            for context, _ in submissions
+            for url in (context["document"]["capturedImage"], context["biometric"]["selfieImage"], context["biometric"].get("livenessVideo", ""))
+        )
+        print(
+            f"{args.submissions} submissions, {image_kib / args.submissions:.0f} KiB of images each on average, "
+            f"reference path serializer={serializer}"
+        )
+
+        for path, publish, name in (("inline", _publish_inline, "json"), ("reference", _publish_reference, serializer)):
+            stage_bytes = result_bytes = callback_bytes = 0
+            producer_s = worker_s = 0.0
+            for context, stages in submissions:
+                enqueued_at = time.time()
+                started = time.process_time()
+                fetch = publish(context, enqueued_at)
+                producer_s += time.process_time() - started
+                stage_bytes += _folder_bytes(folders["broker"])
+
+                # Stage workers decode their message, get their images and store a result.
+                started = time.process_time()
+                received = _drain(folders["broker"])
+                for report in stages:
+                    payload = received[STAGE_TASKS[report["stage"]].name][0]
+                    for image in STAGE_IMAGES[report["stage"]]:
+                        fetch(payload, image)
+                    result_bytes += len(dumps(_result_meta(str(uuid.uuid4()), report), serializer=name)[2])
+                worker_s += time.process_time() - started
+
+                # The chord callback gets every stage report as its argument.
+                calculate_risk_score_task.apply_async((stages, context["submission_id"], enqueued_at), serializer=name)
+                callback_bytes += _folder_bytes(folders["broker"])
+                _drain(folders["broker"])
+
+            n = args.submissions
+            total = stage_bytes + result_bytes + callback_bytes
+            print(
+                f"{path:>9}: stage messages={stage_bytes / n / 1024:8.1f} KiB  results={result_bytes / n / 1024:5.2f} KiB  "
+                f"callback={callback_bytes / n / 1024:5.2f} KiB  total={total / n / 1024:8.1f} KiB/submission  "
+                f"producer={producer_s / n * 1000:6.2f} ms  workers={worker_s / n * 1000:6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
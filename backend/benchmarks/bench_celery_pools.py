@@ -0,0 +1,167 @@
+"""
+Benchmark: Celery inference throughput with per-task vs per-process model loading.
+
+Run from backend/:  python -m benchmarks.bench_celery_pools [--tasks 100] [--concurrency 1,2,4] [--max-tasks-per-child 50]
+
+Starts real ``celery worker`` processes of the inference pool
+(``CELERY_WORKER_ROLE=inference``) on kombu's filesystem transport, so no
+broker is needed, and pushes ``--tasks`` inference tasks through each
+configuration. The model is synthetic with a fixed load time
+(``--load-ms``, weights of ``--model-mb``) and a fixed amount of matrix
+work per task, so the numbers isolate the pool behaviour from any
+particular model:
+
+- ``per-task``: every task loads the model, as a task body without
+  residency would;
+- ``resident``: children load it in ``worker_process_init``, as the
+  inference pool does, and recycle after ``--max-tasks-per-child``.
+
+Reports tasks/sec, tasks/sec per busy core and the median task latency.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.environ.get("BENCH_CELERY_DIR")
+if BENCH_DIR:
+    # Imported by the worker (and the producer) with the benchmark's broker.
+    from celery.signals import worker_process_init
+
+    from app.workers.celery_app import celery_app
+
+    celery_app.conf.update(
+        broker_url="filesystem://",
+        broker_transport_options={
+            "data_folder_in": os.path.join(BENCH_DIR, "broker"),
+            "data_folder_out": os.path.join(BENCH_DIR, "broker"),
+            "processed_folder": os.path.join(BENCH_DIR, "processed"),
+            "control_folder": os.path.join(BENCH_DIR, "control"),
+            "store_processed": False,
+            "polling_interval": 0.005,
+        },
+        result_backend=f"file://{os.path.join(BENCH_DIR, 'results')}",
+        task_routes={"bench.infer": {"queue": "inference"}},
+    )
+    _model = None
+
+    def _load_model():
+        time.sleep(float(os.environ["BENCH_LOAD_MS"]) / 1000)
+        side = int((float(os.environ["BENCH_MODEL_MB"]) * 2**20 / 4) ** 0.5)
+        return np.random.default_rng(0).standard_normal((side, side), dtype=np.float32)
+
+    @worker_process_init.connect
+    def _load_resident(**kwargs):
+        global _model
+        if os.environ["BENCH_MODE"] == "resident":
+            _model = _load_model()
+
+    @celery_app.task(name="bench.infer")
+    def infer(sent_at: float):
+        model = _model if _model is not None else _load_model()
+        x = np.ones((64, model.shape[0]), np.float32)
+        for _ in range(int(os.environ["BENCH_STEPS"])):
+            x = np.tanh(x @ model[:, : x.shape[1]] / model.shape[0] ** 0.5)
+        return time.time() - sent_at
+
+
+def _run_config(mode: str, concurrency: int, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="bench-celery-")
+    for name in ("broker", "processed", "control", "results"):
+        os.makedirs(os.path.join(directory, name))
+    env = {
+        **os.environ,
+        "BENCH_CELERY_DIR": directory,
+        "BENCH_MODE": mode,
+        "BENCH_LOAD_MS": str(args.load_ms),
+        "BENCH_MODEL_MB": str(args.model_mb),
+        "BENCH_STEPS": str(args.steps),
+        "CELERY_WORKER_ROLE": "inference",
+        "CELERY_INFERENCE_CONCURRENCY": str(concurrency),
+        "CELERY_INFERENCE_MAX_TASKS_PER_CHILD": str(args.max_tasks_per_child),
+        # The filesystem transport has no async consumer: with a prefetch of
+        # one the worker's polling loop idles up to 2 s between tasks, which
+        # a real broker does not.
+        "CELERY_INFERENCE_PREFETCH": "4",
+        "AI_ENABLED_MODELS": "",
+        # One BLAS thread per child, so a child is one core.
+        "OMP_NUM_THREADS": "1",
+        "OPENBLAS_NUM_THREADS": "1",
+        "MKL_NUM_THREADS": "1",
+    }
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "celery", "-A", "benchmarks.bench_celery_pools:celery_app", "worker", "--loglevel=WARNING"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        producer = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_celery_pools", "--produce", str(args.tasks), "--warm", str(concurrency)],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=args.timeout,
+        )
+    finally:
+        worker.terminate()
+        worker.wait(timeout=30)
+        shutil.rmtree(directory, ignore_errors=True)
+    if producer.returncode:
+        raise RuntimeError(producer.stderr.strip().splitlines()[-1] if producer.stderr else "producer failed")
+    elapsed, median_latency = (float(v) for v in producer.stdout.split())
+    busy_cores = min(concurrency, os.cpu_count() or 1)
+    return {
+        "tasks_per_s": args.tasks / elapsed,
+        "per_core": args.tasks / elapsed / busy_cores,
+        "latency_ms": median_latency * 1000,
+    }
+
+
+def _produce(tasks: int, warm: int) -> None:
+    # Wait for every child to be up before the clock starts.
+    for result in [infer.delay(time.time()) for _ in range(warm)]:
+        result.get(timeout=300, interval=0.005)
+    started = time.perf_counter()
+    results = [infer.delay(time.time()) for _ in range(tasks)]
+    latencies = [result.get(timeout=300, interval=0.005) for result in results]
+    print(time.perf_counter() - started, statistics.median(latencies))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--concurrency", default="1,2,4")
+    parser.add_argument("--max-tasks-per-child", type=int, default=50)
+    parser.add_argument("--load-ms", type=float, default=400)
+    parser.add_argument("--model-mb", type=float, default=64)
+    parser.add_argument("--steps", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--produce", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--warm", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.produce is not None:
+        _produce(args.produce, args.warm)
+        return
+
+    print(
+        f"{args.tasks} tasks, model load {args.load_ms:.0f} ms / {args.model_mb:.0f} MiB, "
+        f"children recycled every {args.max_tasks_per_child} tasks, {os.cpu_count()} cores"
+    )
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        for mode in ("per-task", "resident"):
+            row = _run_config(mode, concurrency, args)
+            print(
+                f"concurrency={concurrency} {mode:>8}: {row['tasks_per_s']:7.1f} tasks/s  "
+                f"{row['per_core']:6.1f} tasks/s/core  median latency={row['latency_ms']:.0f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
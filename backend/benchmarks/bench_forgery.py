@@ -0,0 +1,116 @@
+"""
+Benchmark: document forgery checks against a precomputed template index.
+
+Run from backend/:  python -m benchmarks.bench_forgery [--template-samples 3] [--documents 60] [--seed 7]
+
+Genuine templates are built from synthetic renders of passport data pages,
+ID card backs and driving licences (see ``bench_ocr_roi``), then unseen
+genuine captures and tampered ones (a field pasted over and retyped in a
+larger font) are checked on the service's ``forgery`` view. Reports the
+index build time and size, per-check latency against
+``AI_FORGERY_BUDGET_MS`` split by stage, template identification accuracy,
+the false alarm rate on genuine captures and the detection rate on tampered
+ones.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.document_forgery import build_index, check_forgery
+from app.services.preprocessing import PreparedImage
+from benchmarks.bench_ocr_roi import _render
+
+KINDS = {"passport": ((1250, 880), "passport"), "id_card": ((1100, 694), "national_id"), "license": ((1100, 694), "license")}
+
+
+def _tamper(pixels: np.ndarray, kind: str, rng: random.Random) -> np.ndarray:
+    """Paste paper colour over a body field and retype it bigger."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    (width, height), _ = KINDS[kind]
+    card_height = height * 1400 / width
+    top = (1200 - card_height) / 2
+    image = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(image)
+    y = top + card_height * rng.uniform(0.18, 0.45)
+    x = 100 + 1400 * rng.uniform(0.28, 0.4)
+    draw.rectangle((x, y, x + 1400 * 0.4, y + card_height * 0.12), fill=(236, 232, 220))
+    font = ImageFont.load_default(size=int(card_height * rng.uniform(0.07, 0.09)))
+    draw.text((x, y), rng.choice(["SMITH JOHN", "DOE JANE", "X1234567"]), fill=(20, 20, 20), font=font)
+    return np.asarray(image)
+
+
+def _pct(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--template-samples", type=int, default=3)
+    parser.add_argument("--documents", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as path:
+        started = time.perf_counter()
+        index = build_index(
+            path,
+            {
+                f"uto-{kind}": (document_type, [_render(kind, rng)[0] for _ in range(args.template_samples)])
+                for kind, (_, document_type) in KINDS.items()
+            },
+        )
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(
+            f"index: {len(index.templates)} templates, {index.rows} keypoints, {size / 1024:.1f} KiB, "
+            f"built in {time.perf_counter() - started:.2f} s"
+        )
+
+        runs = {"genuine": [], "tampered": []}
+        for i in range(args.documents):
+            kind = list(KINDS)[i % len(KINDS)]
+            pixels = _render(kind, rng)[0]
+            for label, capture in (("genuine", pixels), ("tampered", _tamper(pixels, kind, rng))):
+                view = PreparedImage(capture).for_model("forgery")
+                result = check_forgery(
+                    view, index, budget_ms=settings.AI_FORGERY_BUDGET_MS, threshold=settings.AI_FORGERY_THRESHOLD
+                )
+                runs[label].append((kind, result))
+
+    budget = settings.AI_FORGERY_BUDGET_MS
+    every = [result for results in runs.values() for _, result in results]
+    elapsed = [result["elapsed_ms"] for result in every]
+    print(
+        f"latency: p50={_pct(elapsed, 50):.1f} ms  p95={_pct(elapsed, 95):.1f} ms  "
+        f"over budget ({budget:.0f} ms)={sum(e > budget for e in elapsed) / len(elapsed):.1%}  "
+        f"font step skipped={sum('font_check_skipped' in r['reasons'] for r in every) / len(every):.1%}"
+    )
+    stages = sorted({stage for result in every for stage in result["timings_ms"]})
+    print("  stages (median): " + "  ".join(
+        f"{stage}={statistics.median(r['timings_ms'][stage] for r in every if stage in r['timings_ms']):.1f} ms"
+        for stage in stages
+    ))
+    identified = sum(result["template"] == f"uto-{kind}" for results in runs.values() for kind, result in results)
+    print(f"template identification: {identified / len(every):.1%}")
+    false_alarms = [result for _, result in runs["genuine"] if result["is_forged"] is not False]
+    detected = [result for _, result in runs["tampered"] if result["is_forged"]]
+    print(f"genuine flagged: {len(false_alarms) / len(runs['genuine']):.1%}")
+    print(f"tampered detected: {len(detected) / len(runs['tampered']):.1%}")
+    for kind in KINDS:
+        scores = [result["score"] or 0.0 for k, result in runs["tampered"] if k == kind]
+        genuine = [result["score"] or 0.0 for k, result in runs["genuine"] if k == kind]
+        print(
+            f"  {kind:>9}: genuine score median={statistics.median(genuine):.2f}  "
+            f"tampered score median={statistics.median(scores):.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
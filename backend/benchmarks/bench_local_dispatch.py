@@ -0,0 +1,220 @@
+"""
+Benchmark: verification pipeline throughput on the local task backend.
+
+Run from backend/:  python -m benchmarks.bench_local_dispatch [--submissions 60] [--workers 1,2,4] [--stage-ms 20] [--stage-kind wait]
+
+Runs whole pipelines (three stage tasks and the scoring callback per
+submission) with ``TASK_BACKEND=local``: an SQLite task queue, SQLite for the
+application database and a temporary artifact store, so no Redis, broker or
+database server is involved. The model calls are replaced by a fixed cost of
+``--stage-ms`` per call:
+
+- ``wait``: the task waits, as it does while the inference process pool or
+  the database works (the API's case);
+- ``cpu``: the task computes in Python and holds the GIL.
+
+Reports submissions/sec and the median time from enqueueing a submission to
+its score for the ``threads`` and ``processes`` pools at each worker count.
+Then it stops the executor halfway through a run, starts a new one on the
+same queue file, as a restarted API would, and checks every submission was
+scored.
+"""
+import argparse
+import asyncio
+import base64
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.models import Base, CustomerSubmission, KYCSession
+from app.services import verification_pipeline
+from app.workers.celery_app import start_verification_pipeline
+from app.workers.dispatch import get_dispatcher, reset_dispatcher
+
+IMAGE = "data:image/jpeg;base64," + base64.b64encode(b"jpeg bytes").decode()
+STAGE_S = 0.0
+STAGE_KIND = "wait"
+
+
+def _work() -> None:
+    if STAGE_KIND == "wait":
+        time.sleep(STAGE_S)
+        return
+    deadline = time.perf_counter() + STAGE_S
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def _read_document(data, document_type):
+    _work()
+    return {"document_type": document_type, "full_name": "ANNA ERIKSSON", "raw_text": "..."}
+
+
+async def _check_forgery(data):
+    _work()
+    return {"checked": True, "score": 0.96, "is_forged": False}
+
+
+async def _find_duplicates(organization_id, selfie, subject_id=None, enroll=False):
+    _work()
+    return {"face_detected": True, "duplicates": [], "enrolled": enroll}
+
+
+async def _match_images(selfie, document, reference_id=None, organization_id=""):
+    _work()
+    return {"match": True, "confidence": 0.92}
+
+
+def _replace_models() -> None:
+    # Set before the executor starts, so forked pool children inherit them.
+    verification_pipeline._read_document = _read_document
+    verification_pipeline._check_document_forgery = _check_forgery
+    verification_pipeline.FaceDeduplicationService.find_duplicates = staticmethod(_find_duplicates)
+    verification_pipeline.FaceVerificationService.match_images = staticmethod(_match_images)
+
+
+def _context(submission_id: str) -> dict:
+    return {
+        "submission_id": submission_id,
+        "organization_id": "org-1",
+        "document": {"type": "passport", "capturedImage": IMAGE},
+        "biometric": {"selfieImage": IMAGE, "livenessDetected": True},
+    }
+
+
+async def _create(url: str, ids) -> None:
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine)() as db:
+        for submission_id in ids:
+            context = _context(submission_id)
+            db.add(
+                KYCSession(
+                    id=f"ses-{submission_id}",
+                    organization_id="org-1",
+                    status="submitted",
+                    document=context["document"],
+                    biometric=context["biometric"],
+                    gps={"isMatched": True, "matchConfidence": 90},
+                    phone_verification={"isVerified": True},
+                )
+            )
+            db.add(
+                CustomerSubmission(
+                    id=submission_id,
+                    organization_id="org-1",
+                    invitation_id=f"inv-{submission_id}",
+                    kyc_session_id=f"ses-{submission_id}",
+                    status="submitted",
+                )
+            )
+        await db.commit()
+    await engine.dispose()
+
+
+async def _scored(url: str) -> int:
+    engine = create_async_engine(url)
+    async with async_sessionmaker(engine)() as db:
+        rows = (await db.execute(select(CustomerSubmission.risk_score))).scalars().all()
+    await engine.dispose()
+    return sum(score is not None for score in rows)
+
+
+def _drained(queue, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while queue.counts():
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"queue not drained: {queue.counts()}")
+        time.sleep(0.005)
+
+
+def _configure(directory: str, name: str, pool: str, workers: int, submissions: int) -> list:
+    settings.DATABASE_URL = f"sqlite+aiosqlite:///{directory}/{name}.db"
+    settings.LOCAL_TASK_QUEUE_PATH = f"{directory}/{name}-tasks.db"
+    settings.LOCAL_TASK_POOL = pool
+    settings.LOCAL_TASK_WORKERS = workers
+    ids = [f"{name}-{i}" for i in range(submissions)]
+    asyncio.run(_create(settings.DATABASE_URL, ids))
+    return ids
+
+
+def _enqueue(ids) -> None:
+    for submission_id in ids:
+        start_verification_pipeline(submission_id, manifest=verification_pipeline.artifact_manifest(_context(submission_id)))
+
+
+def _run_config(directory: str, pool: str, workers: int, args) -> dict:
+    ids = _configure(directory, f"{pool}-{workers}", pool, workers, args.submissions)
+    reset_dispatcher()
+    dispatcher = get_dispatcher()
+    dispatcher.start()
+    finished = []
+    record = dispatcher.executor.on_finished
+    dispatcher.executor.on_finished = lambda queue, wait_ms, run_ms: (record(queue, wait_ms, run_ms), finished.append(time.time()))
+    started = time.perf_counter()
+    enqueued_at = time.time()
+    _enqueue(ids)
+    _drained(dispatcher.queue, args.timeout)
+    elapsed = time.perf_counter() - started
+    reset_dispatcher()
+    scored = asyncio.run(_scored(settings.DATABASE_URL))
+    if scored != len(ids):
+        raise RuntimeError(f"{scored} of {len(ids)} submissions scored")
+    # The callbacks are the last task of each submission.
+    ends = sorted(finished)[-len(ids):]
+    return {"per_s": len(ids) / elapsed, "latency_ms": statistics.median(end - enqueued_at for end in ends) * 1000}
+
+
+def _restart(directory: str, args) -> str:
+    ids = _configure(directory, "restart", "threads", 2, args.submissions)
+    reset_dispatcher()
+    queue = get_dispatcher().queue
+    _enqueue(ids)
+    while sum(queue.counts().values()) > 2 * len(ids):
+        time.sleep(0.005)
+    reset_dispatcher()
+    left = sum(queue.counts().values())
+    get_dispatcher().start()
+    _drained(get_dispatcher().queue, args.timeout)
+    reset_dispatcher()
+    scored = asyncio.run(_scored(settings.DATABASE_URL))
+    return f"stopped with {left} tasks queued, {scored}/{len(ids)} submissions scored after the restart"
+
+
+def main() -> None:
+    global STAGE_S, STAGE_KIND
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submissions", type=int, default=60)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--pools", default="threads,processes")
+    parser.add_argument("--stage-ms", type=float, default=20)
+    parser.add_argument("--stage-kind", choices=("wait", "cpu"), default="wait")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+    STAGE_S, STAGE_KIND = args.stage_ms / 1000, args.stage_kind
+    _replace_models()
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings.TASK_BACKEND = "local"
+        settings.ARTIFACT_STORE_PATH = f"{directory}/artifacts"
+        settings.LOCAL_TASK_POLL_INTERVAL_S = 0.05
+        # Pool children would otherwise load the real models.
+        settings.AI_ENABLED_MODELS = ""
+        print(f"{args.submissions} submissions, 4 tasks each, {args.stage_ms:.0f} ms per model call ({args.stage_kind})")
+        for pool in args.pools.split(","):
+            for workers in (int(w) for w in args.workers.split(",")):
+                row = _run_config(directory, pool, workers, args)
+                print(
+                    f"{pool:>9} workers={workers}: {row['per_s']:7.1f} submissions/s  "
+                    f"median enqueue-to-score={row['latency_ms']:.0f} ms"
+                )
+        print("restart:", _restart(directory, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark: full-page OCR vs document-type classification plus region OCR.
+
+Run from backend/:  python -m benchmarks.bench_ocr_roi [--documents 60] [--samples DIR] [--seed 7]
+
+Documents are synthetic renders of TD3 passport data pages, TD1 ID card
+backs and ID-1 card fronts (driving licences) placed on a
+camera-sized background, or real captures from ``--samples``, which must
+hold ``passport/``, ``id_card/`` and ``license/`` folders of images. The
+classifier's accuracy and latency, and the share of the page the regions
+cover, are measured without any OCR model. When PaddleOCR is installed both
+paths also run end to end and report per-document latency, field accuracy
+and how often region OCR fell back to the full page.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.services.document_fields import extract_fields, mrz_check_digit
+from app.services.document_roi import TEMPLATES, classify_document, plan_regions, regions_sufficient
+from app.services.preprocessing import PreparedImage
+from benchmarks.bench_ocr_fields import FIRST, LAST, _correct, _mrz_field
+
+FIELDS = ("full_name", "date_of_birth", "document_number", "expiry_date")
+# Expected template per sample kind.
+EXPECTED = {"passport": "passport", "id_card": "id_card_mrz", "license": "id_card"}
+
+
+def _font(size: int):
+    from PIL import ImageFont
+
+    return ImageFont.load_default(size=size)
+
+
+def _fit_font(text: str, width: float):
+    size = 40
+    return _font(max(8, int(size * width / _font(size).getlength(text))))
+
+
+def _render(kind: str, rng: random.Random):
+    """Render one document on a 1600 x 1200 background; return ``(pixels, truth)``."""
+    from PIL import Image, ImageDraw
+
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    dob = date(1950, 1, 1) + timedelta(days=rng.randrange(20000))
+    expiry = date(2026, 1, 1) + timedelta(days=rng.randrange(3650))
+    ymd = lambda d: d.strftime("%y%m%d")  # noqa: E731
+    truth = {"full_name": f"{first} {last}", "date_of_birth": dob.isoformat(), "expiry_date": expiry.isoformat()}
+    size = (1250, 880) if kind == "passport" else (1100, 694)
+    card = Image.new("RGB", size, (236, 232, 220))
+    draw = ImageDraw.Draw(card)
+    width, height = size
+    draw.rectangle((40, height * 0.2, width * 0.24, height * 0.68), fill=(150, 140, 130))
+    body = _font(int(height * 0.045))
+    if kind == "passport":
+        number = f"{rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ')}{rng.randrange(10**7, 10**8)}"
+        l1 = f"P<UTO{last}<<{first}".ljust(44, "<")[:44]
+        l2 = f"{_mrz_field(number)}UTO{_mrz_field(ymd(dob))}F{_mrz_field(ymd(expiry))}{'<' * 14}<"
+        l2 += str(mrz_check_digit(l2[0:10] + l2[13:20] + l2[21:43]))
+        header = ["REPUBLIC OF UTOPIA   PASSPORT"]
+        viz = ["Surname", last, "Given names", first, f"Date of birth {dob.strftime('%d %b %Y').upper()}",
+               f"Passport No. {number}", f"Date of expiry {expiry.strftime('%d %b %Y').upper()}"]
+        mrz = [l1, l2]
+    elif kind == "id_card":
+        number = f"D{rng.randrange(10**7, 10**8)}"
+        l1 = f"I<UTO{_mrz_field(number)}".ljust(30, "<")
+        l2 = f"{_mrz_field(ymd(dob))}M{_mrz_field(ymd(expiry))}UTO".ljust(29, "<")
+        l2 += str(mrz_check_digit(l1[5:30] + l2[0:7] + l2[8:15] + l2[18:29]))
+        header = ["NATIONAL IDENTITY CARD"]
+        viz = ["Issued by the Republic of Utopia"]
+        mrz = [l1, l2, f"{last}<<{first}".ljust(30, "<")]
+    else:
+        number = f"D{rng.randrange(1000, 9999)}-{rng.randrange(1000, 9999)}-{rng.randrange(1000, 9999)}"
+        header = ["STATE OF UTOPIA   DRIVER LICENSE"]
+        viz = [f"DL NO: {number}", "NAME:", f"{first} {last}", f"DOB {dob.strftime('%d/%m/%Y')}",
+               f"EXP {expiry.strftime('%d/%m/%Y')}", "CLASS C"]
+        mrz = []
+    truth["document_number"] = number
+
+    draw.text((40, height * 0.05), header[0], fill=(40, 40, 90), font=body)
+    y = height * 0.2
+    for line in viz:
+        draw.text((width * 0.28, y), line, fill=(20, 20, 20), font=body)
+        y += height * 0.065
+    if mrz:
+        font = _fit_font(mrz[0], width * 0.92)
+        line_height = font.getbbox("P<0")[3] * 1.35
+        y = height - 30 - line_height * len(mrz)
+        for line in mrz:
+            draw.text((width * 0.04, y), line, fill=(10, 10, 10), font=font)
+            y += line_height
+
+    frame = Image.new("RGB", (1600, 1200), (70, 80, 90))
+    scale = 1400 / width
+    card = card.resize((1400, int(height * scale)), Image.BILINEAR)
+    frame.paste(card, (100 + rng.randrange(-40, 40), (1200 - card.height) // 2 + rng.randrange(-40, 40)))
+    pixels = np.asarray(frame, dtype=np.float32) + np.random.default_rng(rng.randrange(10**6)).normal(0, 4, (1200, 1600, 1))
+    return np.clip(pixels, 0, 255).astype(np.uint8), truth
+
+
+def _samples(directory: str):
+    from PIL import Image
+
+    for kind in EXPECTED:
+        folder = os.path.join(directory, kind)
+        for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+            image = Image.open(os.path.join(folder, name)).convert("RGB")
+            yield kind, np.asarray(image), None
+
+
+def _ocr(images):
+    from app.services.ai_models import _ocr_batch, _ocr_lines
+
+    return [_ocr_lines(result) for result in _ocr_batch(images)]
+
+
+def _accuracy(outputs, corpus):
+    scored = [(out, truth) for out, (_, _, truth) in zip(outputs, corpus) if truth]
+    if not scored:
+        return "n/a (no ground truth)"
+    correct = {f: sum(_correct(f, out.get(f), truth[f]) for out, truth in scored) / len(scored) for f in FIELDS}
+    return " ".join(f"{f}={v:.1%}" for f, v in correct.items())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=60)
+    parser.add_argument("--samples", help="directory with passport/, id_card/ and license/ captures")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.samples:
+        corpus = list(_samples(args.samples))
+    else:
+        rng = random.Random(args.seed)
+        corpus = []
+        for i in range(args.documents):
+            kind = list(EXPECTED)[i % len(EXPECTED)]
+            pixels, truth = _render(kind, rng)
+            corpus.append((kind, pixels, truth))
+    print(f"corpus: {len(corpus)} documents")
+
+    # Classification and region planning, on the same views the service uses.
+    layouts, plans, timings = [], [], []
+    for kind, pixels, _ in corpus:
+        prepared = PreparedImage(pixels)
+        img, view = prepared.for_model("ocr"), prepared.for_model("quality")
+        started = time.perf_counter()
+        layout = classify_document(view)
+        plan = plan_regions(layout, img.shape, img.shape[0] / view.shape[0]) if layout and layout["template"] else []
+        timings.append((time.perf_counter() - started) * 1000)
+        layouts.append(layout)
+        plans.append((img, plan))
+    correct = sum((layout or {}).get("template") == EXPECTED[kind] for (kind, _, _), layout in zip(corpus, layouts))
+    area = [
+        sum((b - t) * (r - l) for _, (t, b, l, r) in plan) / (img.shape[0] * img.shape[1]) for img, plan in plans if plan
+    ]
+    print(
+        f"classifier: accuracy={correct / len(corpus):.1%}  median={statistics.median(timings):.2f} ms  "
+        f"regions cover {statistics.mean(area) if area else 0:.1%} of the page"
+    )
+    for kind in EXPECTED:
+        picked = [(layout or {}).get("template") for (k, _, _), layout in zip(corpus, layouts) if k == kind]
+        print(f"  {kind:>9}: {', '.join(f'{t}={picked.count(t)}' for t in sorted(set(picked), key=str))}")
+
+    try:
+        import paddleocr  # noqa: F401
+    except ImportError:
+        print("PaddleOCR is not installed; skipping the end-to-end comparison")
+        return
+
+    _ocr([plans[0][0]])  # load and warm up the model
+    full_ms, full_fields = [], []
+    for img, _ in plans:
+        started = time.perf_counter()
+        lines = _ocr([img])[0]
+        full_ms.append((time.perf_counter() - started) * 1000)
+        full_fields.append(extract_fields(lines["lines"]))
+    roi_ms, roi_fields, fallbacks = [], [], 0
+    for (img, plan), layout in zip(plans, layouts):
+        started = time.perf_counter()
+        fields = None
+        if plan and layout["confidence"] >= 0.6:
+            results = _ocr([np.ascontiguousarray(img[t:b, l:r]) for _, (t, b, l, r) in plan])
+            lines = [text for result in results for text in result["lines"]]
+            template = layout["template"]
+            fields = extract_fields(lines, TEMPLATES[template]["document_type"])
+            if not regions_sufficient(template, fields):
+                fields = None
+        if fields is None:
+            fallbacks += 1
+            fields = extract_fields(_ocr([img])[0]["lines"])
+        roi_ms.append((time.perf_counter() - started) * 1000)
+        roi_fields.append(fields)
+    for name, ms, outputs in (("full page", full_ms, full_fields), ("regions", roi_ms, roi_fields)):
+        print(
+            f"{name:>10}: median={statistics.median(ms):.0f} ms  mean={statistics.mean(ms):.0f} ms  "
+            f"{_accuracy(outputs, corpus)}"
+        )
+    print(f"region OCR fell back to the full page for {fallbacks}/{len(corpus)} documents")
+
+
+if __name__ == "__main__":
+    main()
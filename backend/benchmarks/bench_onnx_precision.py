@@ -0,0 +1,109 @@
+"""
+Benchmark: FP32 vs INT8 (dynamically quantized) ONNX face recognition.
+
+Run from backend/:  python -m benchmarks.bench_onnx_precision [--model PATH] [--faces DIR] [--iterations 200]
+
+Both variants are opened through app.services.onnx_runtime with the same
+session options. Latency is measured per single-face call (the shape the
+micro-batcher sees at low load) and per batch. Accuracy is the cosine
+similarity between FP32 and INT8 embeddings of the same input, plus how
+often the two variants agree on the match decision (similarity >= 0.4, as in
+FaceVerificationService) over every input pair. ``--faces`` takes a
+directory of face crops; without it a fixed-seed synthetic set is used,
+which is only good for latency.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+from app.services.onnx_runtime import SessionPool, intra_op_threads, session_options
+
+DEFAULT_MODEL = os.path.expanduser("~/.insightface/models/buffalo_l/w600k_r50.onnx")
+MATCH_THRESHOLD = 0.4
+
+
+def _inputs(faces_dir, count: int, size: int) -> np.ndarray:
+    if faces_dir:
+        from PIL import Image
+
+        names = sorted(n for n in os.listdir(faces_dir) if n.lower().endswith((".jpg", ".jpeg", ".png")))[:count]
+        crops = [np.asarray(Image.open(os.path.join(faces_dir, n)).convert("RGB").resize((size, size))) for n in names]
+        pixels = np.stack(crops).astype(np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 255, (count, size, size, 3)).astype(np.float32)
+    # ArcFace preprocessing: RGB, (x - 127.5) / 127.5, NCHW.
+    return np.ascontiguousarray(((pixels - 127.5) / 127.5).transpose(0, 3, 1, 2))
+
+
+def _embed(pool: SessionPool, blob: np.ndarray) -> np.ndarray:
+    name = pool.get_inputs()[0].name
+    feats = pool.run(None, {name: blob})[0]
+    return feats / np.maximum(np.linalg.norm(feats, axis=1, keepdims=True), 1e-12)
+
+
+def _latency(pool: SessionPool, inputs: np.ndarray, iterations: int, batch: int):
+    name = pool.get_inputs()[0].name
+    for i in range(min(5, len(inputs))):
+        pool.run(None, {name: inputs[i : i + 1]})
+    single = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        pool.run(None, {name: inputs[i % len(inputs) : i % len(inputs) + 1]})
+        single.append((time.perf_counter() - started) * 1000)
+    started = time.perf_counter()
+    rounds = max(1, iterations // batch)
+    for _ in range(rounds):
+        pool.run(None, {name: inputs[:batch]})
+    batched = (time.perf_counter() - started) * 1000 / rounds
+    single.sort()
+    return statistics.median(single), single[int(len(single) * 0.95) - 1], batched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--faces", help="directory of face crops (optional)")
+    parser.add_argument("--count", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (default: settings)")
+    args = parser.parse_args()
+
+    threads = args.threads or intra_op_threads()
+    pools = {
+        precision: SessionPool(args.model, precision=precision, options=session_options(threads))
+        for precision in ("fp32", "int8")
+    }
+    size = pools["fp32"].get_inputs()[0].shape[2]
+    inputs = _inputs(args.faces, args.count, size)
+    args.batch = min(args.batch, len(inputs))
+    print(f"model: {args.model}  inputs: {len(inputs)}  intra-op threads: {threads}")
+
+    embeddings = {}
+    for precision, pool in pools.items():
+        p50, p95, batched = _latency(pool, inputs, args.iterations, args.batch)
+        embeddings[precision] = np.concatenate(
+            [_embed(pool, inputs[i : i + args.batch]) for i in range(0, len(inputs), args.batch)]
+        )
+        print(
+            f"{precision:>5}: size={os.path.getsize(pool.path) / 1e6:.1f} MB  single p50={p50:.2f} ms "
+            f"p95={p95:.2f} ms  batch[{args.batch}]={batched:.2f} ms ({batched / args.batch:.2f} ms/face)"
+        )
+
+    fp32, int8 = embeddings["fp32"], embeddings["int8"]
+    agreement = np.sum(fp32 * int8, axis=1)
+    pairs = np.triu_indices(len(inputs), k=1)
+    decisions_fp32 = (fp32 @ fp32.T)[pairs] >= MATCH_THRESHOLD
+    decisions_int8 = (int8 @ int8.T)[pairs] >= MATCH_THRESHOLD
+    print(
+        f"accuracy: fp32/int8 cosine mean={agreement.mean():.4f} min={agreement.min():.4f}  "
+        f"match-decision agreement={np.mean(decisions_fp32 == decisions_int8):.2%} over {len(pairs[0])} pairs"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: full-resolution upload decode vs resolution-aware preprocessing.
+
+Run from backend/:  python -m benchmarks.bench_preprocessing [--megapixels 12] [--iterations 10]
+
+Variants: ``full`` is the old decode (full-resolution RGB array, no EXIF
+handling), ``ocr_only`` decodes for OCR alone, and ``prepared`` decodes once
+and derives the OCR, face and deepfake views from the shared buffer.
+
+Each variant runs in a fresh interpreter so its peak RSS is not polluted by
+the other; latency is the median over the iterations.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _make_jpeg(megapixels: float) -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, size=(height // 8, width // 8, 3)).repeat(8, 0).repeat(8, 1)
+    pixels = np.clip(gradient + noise[:height, :width], 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees, as phone cameras commonly store it
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90, exif=exif)
+    return buf.getvalue()
+
+
+def _decode_full(data: bytes):
+    import numpy as np
+    from PIL import Image
+
+    return np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def _decode_ocr_only(data: bytes):
+    from app.services.preprocessing import decode_for
+
+    return decode_for(data, "ocr")
+
+
+def _decode_prepared(data: bytes):
+    from app.services.preprocessing import prepare_image
+
+    prepared = prepare_image(data, ("ocr", "face", "deepfake"))
+    for model in ("ocr", "face", "deepfake"):
+        prepared.for_model(model)
+    return prepared.pixels
+
+
+def _peak_rss_kb() -> int:
+    # VmHWM is reset by exec, unlike ru_maxrss which Linux carries over from
+    # the parent that generated the test image.
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_variant(variant: str, path: str, iterations: int) -> None:
+    import numpy  # noqa: F401  (import cost is not part of the measurement)
+    import PIL.Image  # noqa: F401
+    import app.services.preprocessing  # noqa: F401
+
+    with open(path, "rb") as fh:
+        data = fh.read()
+    fn = {"full": _decode_full, "ocr_only": _decode_ocr_only, "prepared": _decode_prepared}[variant]
+    baseline_kb = _peak_rss_kb()
+    timings = []
+    shape = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        shape = fn(data).shape
+        timings.append((time.perf_counter() - started) * 1000)
+    peak_kb = _peak_rss_kb()
+    print(json.dumps({
+        "variant": variant,
+        "shape": list(shape),
+        "median_ms": statistics.median(timings),
+        "peak_rss_delta_mb": (peak_kb - baseline_kb) / 1024,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megapixels", type=float, default=12.0)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        _run_variant(args.variant, args.path, args.iterations)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as fh:
+        fh.write(_make_jpeg(args.megapixels))
+        path = fh.name
+    try:
+        print(f"input: {args.megapixels:.0f} MP JPEG, {os.path.getsize(path) / 1e6:.1f} MB")
+        for variant in ("full", "ocr_only", "prepared"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_preprocessing", "--variant", variant,
+                 "--path", path, "--iterations", str(args.iterations)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out)
+            print(
+                f"{result['variant']:>9}: shape={tuple(result['shape'])} "
+                f"median={result['median_ms']:.1f} ms peak_rss_delta={result['peak_rss_delta_mb']:.1f} MB"
+            )
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
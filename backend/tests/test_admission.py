@@ -0,0 +1,83 @@
+"""
+Tests for per-endpoint admission control
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.admission import AdmissionController, AdmissionMiddleware, Overloaded
+
+
+def test_queue_bounds_and_fifo_handover():
+    """Slots are handed to waiters in order; beyond the queue, requests are shed"""
+    controller = AdmissionController("test", max_concurrency=1, max_queue=2, queue_timeout_s=5)
+    order = []
+
+    async def request(i, hold):
+        await controller.acquire()
+        order.append(i)
+        await asyncio.sleep(hold)
+        controller.release(10.0)
+
+    async def run():
+        first = asyncio.create_task(request(0, 0.02))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(request(i, 0)) for i in (1, 2)]
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 2
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire()
+        await asyncio.gather(first, *waiting)
+        return shed.value
+
+    shed = asyncio.run(run())
+
+    assert order == [0, 1, 2]
+    assert shed.reason == "queue_full"
+    assert shed.retry_after >= 1
+    stats = controller.stats()
+    assert stats["rejected"] == 1
+    assert stats["admitted"] == 3
+    assert stats["active"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_queue_timeout_sheds_and_frees_the_queue_slot():
+    """A request that waits past the timeout is shed and leaves the queue"""
+    controller = AdmissionController("test", max_concurrency=1, max_queue=4, queue_timeout_s=0.01)
+
+    async def run():
+        await controller.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire()
+        controller.release()
+        return shed.value
+
+    assert asyncio.run(run()).reason == "queue_timeout"
+    assert controller.queue_depth == 0
+    assert controller.active == 0
+    assert controller.timeouts == 1
+
+
+def test_middleware_returns_503_with_retry_after():
+    """Shed requests get 503, Retry-After and the queue depth; others pass with their wait"""
+    app = FastAPI()
+    controller = AdmissionController("ocr", max_concurrency=1, max_queue=0, queue_timeout_s=1)
+    app.add_middleware(AdmissionMiddleware, controllers={"ocr": controller})
+
+    @app.post("/api/v1/ai/ocr")
+    async def ocr():
+        return {"ok": True}
+
+    client = TestClient(app)
+    admitted = client.post("/api/v1/ai/ocr")
+    controller.active = 1  # simulate a request holding the only slot
+    shed = client.post("/api/v1/ai/ocr")
+
+    assert admitted.status_code == 200
+    assert admitted.headers["x-queue-wait-ms"] == "0"
+    assert shed.status_code == 503
+    assert int(shed.headers["retry-after"]) >= 1
+    assert shed.json()["reason"] == "queue_full"
@@ -0,0 +1,45 @@
+"""
+Tests for the AI micro-batching scheduler
+"""
+import asyncio
+
+from app.services.ai_models import MicroBatcher
+
+
+def test_concurrent_submits_share_a_batch():
+    """Concurrent submits within the wait window are run as one batch"""
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [i * 2 for i in items]
+
+    batcher = MicroBatcher("test", double, max_batch_size=4, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+
+    results = asyncio.run(run())
+
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+    stats = batcher.stats()
+    assert stats["batches"] == 2
+    assert stats["items"] == 6
+    assert stats["fill_rate"] == 0.75
+
+
+def test_batch_failure_propagates_to_every_caller():
+    """An exception in the batch function is raised in each awaiting caller"""
+    def boom(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher("test", boom, max_batch_size=2, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert batcher.stats()["failed_batches"] == 1
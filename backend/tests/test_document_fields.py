@@ -0,0 +1,105 @@
+"""
+Tests for OCR field extraction and ICAO 9303 MRZ parsing
+"""
+from app.services.document_fields import extract_fields, mrz_check_digit, parse_mrz
+
+TD3 = [
+    "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<",
+    "L898902C36UTO7408122F1204159ZE184226B<<<<<10",
+]
+TD1 = [
+    "I<UTOD231458907<<<<<<<<<<<<<<<",
+    "7408122F1204159UTO<<<<<<<<<<<6",
+    "ERIKSSON<<ANNA<MARIA<<<<<<<<<<",
+]
+
+
+def test_check_digit():
+    """Check digits follow the 7-3-1 weighting with letters and fillers"""
+    assert mrz_check_digit("L898902C3") == 6
+    assert mrz_check_digit("740812") == 2
+    assert mrz_check_digit("<<<<<<") == 0
+
+
+def test_parse_td3_specimen():
+    """The ICAO passport specimen parses with every check digit valid"""
+    mrz = parse_mrz(TD3)
+
+    assert mrz["format"] == "TD3"
+    assert mrz["valid"] is True
+    assert mrz["document_number"] == "L898902C3"
+    assert mrz["date_of_birth"] == "1974-08-12"
+    assert mrz["expiry_date"] == "2012-04-15"
+    assert mrz["surname"] == "ERIKSSON"
+    assert mrz["given_names"] == "ANNA MARIA"
+
+
+def test_parse_td1_specimen():
+    """The ICAO identity card specimen parses with every check digit valid"""
+    mrz = parse_mrz(TD1)
+
+    assert mrz["format"] == "TD1"
+    assert mrz["valid"] is True
+    assert mrz["document_number"] == "D23145890"
+    assert mrz["nationality"] == "UTO"
+
+
+def test_corrupted_check_digit_is_reported():
+    """A damaged field fails its own check and the composite check"""
+    mrz = parse_mrz([TD3[0], TD3[1].replace("L898902C3", "L898902C4")])
+
+    assert mrz["valid"] is False
+    assert mrz["checks"]["document_number"] is False
+    assert mrz["checks"]["date_of_birth"] is True
+
+
+def test_mrz_overrides_visual_zone_and_tolerates_ocr_noise():
+    """Lower-case, spaced and O-for-0 MRZ lines still validate"""
+    lines = [
+        "REPUBLIC OF UTOPIA",
+        "PASSPORT",
+        "Surname",
+        "ERIKSSON",
+        "Given names",
+        "ANNA MARIA",
+        "p<utoeriksson<<anna<maria<<<<<<<<<<<<<<<<<<<",
+        "L898902C36UTO74O8122F12O4159ZE184226B<<<<<1O",
+    ]
+
+    fields = extract_fields(lines)
+
+    assert fields["document_type"] == "passport"
+    assert fields["full_name"] == "Anna Maria Eriksson"
+    assert fields["document_number"] == "L898902C3"
+    assert fields["date_of_birth"] == "1974-08-12"
+    assert fields["mrz"]["valid"] is True
+
+
+def test_labelled_fields_without_mrz():
+    """Labelled values on the same or the following line are extracted"""
+    lines = [
+        "DRIVER LICENSE",
+        "DL NO: D1234-5678-9012",
+        "NAME: JOHN DOE",
+        "DOB 05/15/1990 EXP",
+        "05/15/2030",
+    ]
+
+    fields = extract_fields(lines)
+
+    assert fields["document_type"] == "license"
+    assert fields["document_number"] == "D1234-5678-9012"
+    assert fields["full_name"] == "John Doe"
+    assert fields["date_of_birth"] == "1990-05-15"
+    assert fields["expiry_date"] == "2030-05-15"
+
+
+def test_aadhaar_name_above_date_of_birth():
+    """Unlabelled Aadhaar names and numbers are recognised"""
+    lines = ["GOVERNMENT OF INDIA", "Rahul Kumar Sharma", "DOB: 15/05/1990", "Male", "1234 5678 9012"]
+
+    fields = extract_fields(lines)
+
+    assert fields["document_type"] == "aadhar"
+    assert fields["full_name"] == "Rahul Kumar Sharma"
+    assert fields["document_number"] == "123456789012"
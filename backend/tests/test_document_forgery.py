@@ -0,0 +1,119 @@
+"""
+Tests for document forgery checks against the genuine template index
+"""
+import asyncio
+import io
+import os
+import random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from app.core.config import settings
+from app.services import ai_models
+from app.services.document_forgery import build_index, check_forgery
+from app.services.result_cache import result_cache
+
+NAMES = ["ERIKSSON ANNA", "MARTIN PAUL", "OKAFOR GRACE", "TANAKA YUKI", "SILVA JOAO", "NOVAK EVA"]
+
+
+def _render(kind, rng, tamper=False):
+    """Draw a card with fixed labels and random personal data on a camera frame."""
+    width, height = (1250, 880) if kind == "passport" else (1100, 694)
+    card = Image.new("RGB", (width, height), (236, 232, 220))
+    draw = ImageDraw.Draw(card)
+    body = ImageFont.load_default(size=int(height * 0.045))
+    for x in range(0, width, 90):  # printed background pattern
+        draw.line((x, height * 0.75, x + 60, height * 0.95), fill=(190, 180, 200), width=3)
+    draw.text((40, height * 0.05), "REPUBLIC OF UTOPIA " + kind.upper(), fill=(40, 40, 90), font=body)
+    draw.rectangle((40, height * 0.2, width * 0.24, height * 0.68), fill=(rng.randrange(120, 180),) * 3)
+    for i, label in enumerate(["Surname", "Given names", "Date of birth", "Document No."]):
+        y = height * (0.2 + 0.13 * i)
+        draw.text((width * 0.28, y), label, fill=(60, 60, 60), font=body)
+        value = rng.choice(NAMES) if i < 2 else f"{rng.randrange(10**7, 10**8)}"
+        draw.text((width * 0.28, y + height * 0.055), value, fill=(20, 20, 20), font=body)
+    if tamper:
+        # The surname label and value pasted over and retyped bigger.
+        draw.rectangle((width * 0.27, height * 0.19, width * 0.9, height * 0.32), fill=(236, 232, 220))
+        draw.text((width * 0.28, height * 0.2), "SMITH JOHN", fill=(20, 20, 20), font=ImageFont.load_default(size=70))
+    frame = Image.new("RGB", (1600, 1200), (70, 80, 90))
+    scale = rng.uniform(1300, 1450) / width
+    card = card.resize((round(width * scale), round(height * scale)), Image.BILINEAR)
+    frame.paste(card, (rng.randrange(40, 1600 - card.width - 40), (1200 - card.height) // 2 + rng.randrange(-30, 30)))
+    return np.asarray(frame)
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    rng = random.Random(3)
+    templates = {
+        "uto-passport": ("passport", [_render("passport", rng) for _ in range(3)]),
+        "uto-id": ("national_id", [_render("id_card", rng) for _ in range(3)]),
+    }
+    return build_index(str(tmp_path_factory.mktemp("forgery_index")), templates)
+
+
+def test_genuine_documents_match_their_template(index):
+    """Unseen genuine captures pick the right template and show no deviations"""
+    rng = random.Random(11)
+    for kind, template in (("passport", "uto-passport"), ("id_card", "uto-id")):
+        result = check_forgery(_render(kind, rng), index)
+        assert result["template"] == template and result["checked"]
+        assert not result["is_forged"], result["reasons"]
+        assert result["layout_deviations"] == [] and result["font_deviations"] == []
+
+
+def test_retyped_field_is_flagged(index):
+    """A pasted-over, retyped field breaks the printed layout and the font metrics"""
+    result = check_forgery(_render("passport", random.Random(5), tamper=True), index, "uto-passport")
+
+    assert result["is_forged"]
+    assert {"layout_deviation", "font_deviation"} <= set(result["reasons"])
+    boxes = result["layout_deviations"] + result["font_deviations"]
+    assert all(d["box"][0] < 0.5 for d in boxes)  # in the top half, where the edit is
+    with pytest.raises(KeyError):
+        check_forgery(_render("passport", random.Random(5)), index, "uto-visa")
+
+
+def test_service_reports_missing_index_and_scores_documents(index, monkeypatch, tmp_path):
+    """Without an index nothing is checked; with one the template's verdict comes back"""
+    buffer = io.BytesIO()
+    Image.fromarray(_render("id_card", random.Random(8))).save(buffer, format="PNG")
+    result_cache.clear()
+
+    monkeypatch.setattr(settings, "FORGERY_INDEX_PATH", str(tmp_path / "missing"))
+    missing = asyncio.run(ai_models._check_document_forgery(buffer.getvalue()))
+    assert missing["checked"] is False and missing["reasons"] == ["no_template_index"]
+
+    monkeypatch.setattr(settings, "FORGERY_INDEX_PATH", index.path)
+    result = asyncio.run(ai_models._check_document_forgery(buffer.getvalue()))
+    assert result["checked"] and result["template"] == "uto-id" and not result["is_forged"]
+    with pytest.raises(KeyError):
+        asyncio.run(ai_models._check_document_forgery(buffer.getvalue(), template_id="uto-visa"))
+
+
+def test_rebuilds_switch_atomically_and_leave_open_builds_intact(tmp_path, monkeypatch):
+    """A reader keeps its build's data through rebuilds; new readers get the latest build"""
+    from app.services import forgery_index
+    from app.services.forgery_index import TemplateIndex
+
+    def write(rows, seed):
+        rng = np.random.default_rng(seed)
+        meta = [{"id": f"t{seed}", "rows": [0, rows]}]
+        descriptors = rng.integers(0, 256, (rows, 32), dtype=np.uint8)
+        TemplateIndex.write(str(tmp_path), meta, descriptors, np.zeros((rows, 2), np.float32), np.zeros(rows, np.int32))
+        return descriptors
+
+    first = write(50, 1)
+    monkeypatch.setattr(settings, "FORGERY_INDEX_PATH", str(tmp_path))
+    monkeypatch.setattr(forgery_index, "_index", None)
+    reader = forgery_index.get_forgery_index()
+    for seed in (2, 3, 4):
+        latest = write(80, seed)
+
+    assert reader.rows == 50 and np.array_equal(np.asarray(reader.descriptors), first)
+    current = forgery_index.get_forgery_index()
+    assert current is not reader and current.templates[0]["id"] == "t4"
+    assert np.array_equal(np.asarray(current.descriptors), latest)
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("build-")]) == forgery_index.KEEP_BUILDS
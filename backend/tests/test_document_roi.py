@@ -0,0 +1,93 @@
+"""
+Tests for document layout classification and region-of-interest OCR
+"""
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from app.services import ai_models
+from app.services.document_roi import classify_document
+from app.services.result_cache import result_cache
+
+TD3 = ["P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<", "L898902C36UTO7408122F1204159ZE184226B<<<<<10"]
+TD1 = ["I<UTOD231458907<<<<<<<<<<<<<<<", "7408122F1204159UTO<<<<<<<<<<<6", "ERIKSSON<<ANNA<MARIA<<<<<<<<<<"]
+
+
+def _render(size, body, mrz=()):
+    """Draw a document card with body text and MRZ lines on a camera frame."""
+    width, height = size
+    card = Image.new("RGB", size, (236, 232, 220))
+    draw = ImageDraw.Draw(card)
+    draw.rectangle((30, height * 0.2, width * 0.24, height * 0.68), fill=(150, 140, 130))
+    font = ImageFont.load_default(size=int(height * 0.045))
+    for i, line in enumerate(body):
+        draw.text((width * 0.28, height * (0.2 + 0.065 * i)), line, fill=(20, 20, 20), font=font)
+    if mrz:
+        mrz_font = ImageFont.load_default(size=40)
+        mrz_font = ImageFont.load_default(size=int(40 * width * 0.92 / mrz_font.getlength(mrz[0])))
+        line_height = mrz_font.getbbox("P<0")[3] * 1.35
+        for i, line in enumerate(mrz):
+            draw.text((width * 0.04, height - 30 - line_height * (len(mrz) - i)), line, fill=(10, 10, 10), font=mrz_font)
+    frame = Image.new("RGB", (1600, 1200), (70, 80, 90))
+    card = card.resize((1400, round(height * 1400 / width)))
+    frame.paste(card, (100, (1200 - card.height) // 2))
+    return np.asarray(frame)
+
+
+def _passport():
+    return _render((1250, 880), ["Surname", "ERIKSSON", "Given names", "ANNA MARIA"], TD3)
+
+
+def _small(pixels):
+    return np.asarray(Image.fromarray(pixels).resize((512, 384)))
+
+
+def test_layouts_are_told_apart():
+    """TD3 pages, TD1 card backs and card fronts map to their templates"""
+    passport = classify_document(_small(_passport()))
+    card_back = classify_document(_small(_render((1100, 694), ["IDENTITY CARD"], TD1)))
+    card_front = classify_document(_small(_render((1100, 694), ["DL NO: D1234-5678", "NAME:", "ANNA ERIKSSON"])))
+
+    assert (passport["template"], passport["mrz_lines"]) == ("passport", 2)
+    assert (card_back["template"], card_back["mrz_lines"]) == ("id_card_mrz", 3)
+    assert (card_front["template"], card_front["mrz_lines"]) == ("id_card", 0)
+    assert classify_document(np.full((384, 512, 3), 128, np.uint8)) is None
+
+
+def _ocr_upload(monkeypatch, crop_lines):
+    """Read the rendered passport with a fake OCR model; return the result and OCR'd image shapes."""
+    seen = []
+
+    def fake_ocr(images):
+        seen.extend(image.shape for image in images)
+        lines = [crop_lines if image.shape[0] < 600 else ["PASSPORT", "ERIKSSON"] + TD3 for image in images]
+        return [[[[None, (text, 0.98)] for text in texts]] for texts in lines]
+
+    result_cache.clear()
+    monkeypatch.setattr(ai_models.ocr_batcher, "batch_fn", fake_ocr)
+    buf = io.BytesIO()
+    Image.fromarray(_passport()).save(buf, format="PNG")
+    return asyncio.run(ai_models._read_document(buf.getvalue(), None)), seen
+
+
+def test_passport_is_read_from_the_mrz_band_only(monkeypatch):
+    """Only the MRZ crop goes through OCR when its check digits validate"""
+    result, seen = _ocr_upload(monkeypatch, TD3)
+
+    assert len(seen) == 1
+    assert seen[0][0] < 300 and seen[0][1] > 1200
+    assert result["ocr_template"] == "passport"
+    assert result["document_number"] == "L898902C3"
+    assert result["mrz"]["valid"] is True
+
+
+def test_unreadable_regions_fall_back_to_the_full_page(monkeypatch):
+    """When the crop does not yield a valid MRZ the whole page is read"""
+    result, seen = _ocr_upload(monkeypatch, ["P<UTOERIKSSON"])
+
+    assert len(seen) == 2
+    assert seen[1][:2] == (1200, 1600)
+    assert result["ocr_template"] is None
+    assert result["document_number"] == "L898902C3"
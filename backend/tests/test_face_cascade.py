@@ -0,0 +1,65 @@
+"""
+Tests for the two-pass face detection cascade
+"""
+import numpy as np
+
+from app.services import ai_models
+
+
+class FakeDetector:
+    """Returns one face whose size and score depend on the detector input size."""
+
+    input_shape = [1, 3, "?", "?"]
+
+    def __init__(self, face_side, light_score=0.9):
+        self.face_side = face_side
+        self.light_score = light_score
+        self.sizes = []
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        self.sizes.append(input_size)
+        score = self.light_score if input_size and input_size[0] <= 320 else 0.95
+        side = self.face_side
+        bboxes = np.array([[100, 100, 100 + side, 100 + side, score]], dtype=np.float32)
+        return bboxes, np.zeros((1, 5, 2), dtype=np.float32)
+
+
+def test_detector_size_follows_the_input():
+    """Detector inputs keep the image's aspect, round up to 32 and never upscale"""
+    assert ai_models.detector_size((1200, 1600, 3), 320) == (320, 256)
+    assert ai_models.detector_size((1200, 1600, 3), 640) == (640, 480)
+    assert ai_models.detector_size((200, 150, 3), 640) == (160, 224)
+
+
+def test_large_confident_face_stops_after_the_light_pass():
+    """A selfie-sized face is accepted from the low-resolution pass alone"""
+    detector = FakeDetector(face_side=600)
+
+    det, _ = ai_models._detect_primary(detector, np.zeros((1200, 1600, 3), np.uint8))
+
+    assert detector.sizes == [(320, 256)]
+    assert det[4] == np.float32(0.9)
+
+
+def test_small_or_uncertain_faces_get_the_full_pass():
+    """Small document portraits and low scores escalate to the full detector size"""
+    image = np.zeros((1200, 1600, 3), np.uint8)
+    small = FakeDetector(face_side=150)
+    unsure = FakeDetector(face_side=600, light_score=0.3)
+
+    ai_models._detect_primary(small, image)
+    det, _ = ai_models._detect_primary(unsure, image)
+
+    assert small.sizes == [(320, 256), (640, 480)]
+    assert unsure.sizes == [(320, 256), (640, 480)]
+    assert det[4] == np.float32(0.95)
+
+
+def test_fixed_size_models_run_once():
+    """Detectors with a fixed input shape skip the cascade"""
+    detector = FakeDetector(face_side=600)
+    detector.input_shape = [1, 3, 640, 640]
+
+    ai_models._detect_primary(detector, np.zeros((480, 640, 3), np.uint8))
+
+    assert detector.sizes == [None]
@@ -0,0 +1,219 @@
+"""
+Tests for the persisted selfie/document embedding store and re-verification
+"""
+import asyncio
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import ai_models, face_embeddings
+from app.services.face_embeddings import FaceEmbeddingStore
+
+
+def _unit(rng, dim=16):
+    vector = rng.normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_pairs_survive_reopen_and_a_new_match_replaces_the_whole_pair(tmp_path):
+    """Stored float16 pairs reopen intact; a later match with no document face clears the old one"""
+    rng = np.random.default_rng(0)
+    selfie, document, new_selfie = _unit(rng), _unit(rng), _unit(rng)
+    store = FaceEmbeddingStore(str(tmp_path / "faces"), dim=16, initial_capacity=2)
+    store.put("sub_1", "org_a", selfie, document, model_version="face-v1")
+    for i in range(5):
+        store.put(f"other_{i}", "org_b", _unit(rng), _unit(rng), model_version="face-v1")
+    reopened = FaceEmbeddingStore(str(tmp_path / "faces"), dim=16)
+    entry = reopened.get("sub_1")
+
+    assert len(reopened) == 6
+    assert (entry["organization_id"], entry["model_version"]) == ("org_a", "face-v1")
+    assert np.allclose(entry["selfie"], selfie, atol=1e-3)
+    assert np.allclose(entry["document"], document, atol=1e-3)
+    assert reopened.get("missing") is None
+
+    store.put("sub_1", "org_a", selfie=new_selfie, model_version="face-v1")
+    entry = reopened.get("sub_1")
+    assert np.allclose(entry["selfie"], new_selfie, atol=1e-3) and entry["document"] is None
+
+
+def test_pairs_keep_the_model_version_that_embedded_them(tmp_path):
+    """A pair re-embedded by another model version replaces the old one and rescoring keeps versions apart"""
+    rng = np.random.default_rng(4)
+    store = FaceEmbeddingStore(str(tmp_path / "faces"), dim=16)
+    store.put("sub_1", "org_a", _unit(rng), _unit(rng), model_version="face-v1")
+    store.put("sub_2", "org_a", _unit(rng), _unit(rng), model_version="face-v1")
+    selfie = _unit(rng)
+    store.put("sub_1", "org_a", selfie, selfie, model_version="face-v2")
+
+    assert len(store) == 2
+    assert store.get("sub_1")["model_version"] == "face-v2"
+    assert store.similarities("org_a", "face-v1")[0] == ["sub_2"]
+    keys, scores = store.similarities("org_a", "face-v2")
+    assert keys == ["sub_1"] and np.allclose(scores, [1.0], atol=2e-3)
+    assert store.similarities("org_a")[0] == ["sub_2", "sub_1"]
+
+
+def test_similarities_are_per_organization_and_nan_when_incomplete(tmp_path, monkeypatch):
+    """Bulk scores match per-pair dot products across chunks; half pairs score nan"""
+    monkeypatch.setattr(face_embeddings, "SCORE_CHUNK_ROWS", 7)
+    rng = np.random.default_rng(1)
+    store = FaceEmbeddingStore(str(tmp_path / "faces"), dim=16, initial_capacity=4)
+    expected = {}
+    for i in range(20):
+        selfie, document = _unit(rng), _unit(rng)
+        store.put(f"sub_{i}", "org_a" if i % 2 else "org_b", selfie, document)
+        expected[f"sub_{i}"] = float(selfie @ document)
+    store.put("selfie_only", "org_a", selfie=_unit(rng))
+    # Replaced in place: still the key's only row.
+    store.put("sub_1", "org_a", selfie, document)
+    expected["sub_1"] = float(selfie @ document)
+
+    keys, scores = store.similarities("org_a")
+
+    assert keys == [f"sub_{i}" for i in range(1, 20, 2)] + ["selfie_only"]
+    assert np.allclose(scores[:-1], [expected[k] for k in keys[:-1]], atol=2e-3)
+    assert np.isnan(scores[-1])
+
+
+def test_reverification_and_rescoring_need_no_model(tmp_path, monkeypatch):
+    """Single re-checks and bulk rescoring use stored vectors and respect the organization"""
+    monkeypatch.setattr(settings, "FACE_EMBEDDINGS_PATH", str(tmp_path))
+    monkeypatch.setattr(face_embeddings, "_store", None)
+    monkeypatch.setattr(ai_models, "_embed_face", None)  # any model use would fail
+    version = ai_models.model_versions.active["face"]
+    store = face_embeddings.get_face_embedding_store()
+    base = np.zeros(512, dtype=np.float32)
+    base[0] = 1.0
+    for i, similarity in enumerate((0.9, 0.5, 0.3)):
+        other = np.zeros(512, dtype=np.float32)
+        other[0], other[1] = similarity, np.sqrt(1 - similarity**2)
+        store.put(f"sub_{i}", "org_a", base, other, model_version=version)
+    store.put("sub_old", "org_a", base, base, model_version="insightface-older")
+
+    single = asyncio.run(ai_models.FaceReverificationService.reverify("sub_1", "org_a", threshold=0.6))
+    foreign = asyncio.run(ai_models.FaceReverificationService.reverify("sub_1", "org_b"))
+    default = asyncio.run(ai_models.FaceReverificationService.rescore("org_a"))
+    stricter = asyncio.run(ai_models.FaceReverificationService.rescore("org_a", threshold=0.6))
+
+    assert single["match"] is False and abs(single["confidence"] - 0.5) < 1e-3
+    assert foreign is None
+    assert single["model_version"] == version
+    assert (default["model_version"], default["matched"], default["not_matched"]) == (version, 2, 1)
+    assert stricter["not_matched_ids"] == ["sub_1", "sub_2"]
+
+
+def test_pairs_are_only_stored_and_replaced_by_their_organization(tmp_path, monkeypatch):
+    """Another organization cannot overwrite a stored pair, and unauthenticated calls store nothing"""
+    import pytest
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.ai import router
+
+    rng = np.random.default_rng(2)
+    selfie = _unit(rng)
+    store = FaceEmbeddingStore(str(tmp_path / "faces"), dim=16)
+    store.put("sub_1", "org_victim", selfie, selfie)
+
+    with pytest.raises(PermissionError):
+        store.put("sub_1", "org_other", _unit(rng), _unit(rng))
+    with pytest.raises(ValueError):
+        store.put("sub_2", "", selfie)
+    entry = store.get("sub_1")
+    assert entry["organization_id"] == "org_victim" and np.allclose(entry["selfie"], selfie, atol=1e-3)
+
+    app = FastAPI()
+    app.include_router(router)
+    files = {"selfie": ("a.jpg", b"a", "image/jpeg"), "document_face": ("b.jpg", b"b", "image/jpeg")}
+    response = TestClient(app).post("/api/v1/ai/face/verify", files=files, data={"reference_id": "sub_1"})
+    assert response.status_code == 401
+
+
+def test_storing_a_pair_needs_an_active_user(tmp_path, monkeypatch):
+    """A valid token for a deactivated user cannot store pairs; stored pairs belong to the user's organization"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.api import ai
+    from app.api.ai import router
+    from app.db import get_db
+    from app.models import Base, Organization, User
+    from app.security import create_access_token
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'kyc.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(Organization(id="org_a", name="Bank A"))
+        db.add(User(id="gone", organization_id="org_a", email="gone@a.test", password_hash="x", is_active=False))
+        db.add(User(id="other", organization_id="org_b", email="other@b.test", password_hash="x"))
+        db.commit()
+    monkeypatch.setattr(settings, "FACE_EMBEDDINGS_PATH", str(tmp_path))
+    monkeypatch.setattr(face_embeddings, "_store", None)
+    rng = np.random.default_rng(5)
+    selfie = _unit(rng, 512)
+    face_embeddings.get_face_embedding_store().put("sub_1", "org_a", selfie, selfie)
+
+    def override_db():
+        with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = override_db
+    client = TestClient(app)
+    files = {"selfie": ("a.jpg", b"a", "image/jpeg"), "document_face": ("b.jpg", b"b", "image/jpeg")}
+
+    def verify(user_id, org_id):
+        token = create_access_token({"sub": user_id, "org": org_id})
+        return client.post(
+            "/api/v1/ai/face/verify",
+            files=files,
+            data={"reference_id": "sub_1"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    assert verify("gone", "org_a").status_code == 401
+    entry = face_embeddings.get_face_embedding_store().get("sub_1")
+    assert entry["organization_id"] == "org_a" and np.allclose(entry["selfie"], selfie, atol=1e-3)
+
+    calls = []
+
+    async def verify_face_match(selfie, document_face, reference_id=None, organization_id=""):
+        calls.append(organization_id)
+        return {"match": True}
+
+    monkeypatch.setattr(ai.FaceVerificationService, "verify_face_match", verify_face_match)
+    # Pairs are owned by the user's organization, not the token's org claim.
+    assert verify("other", "org_a").status_code == 200
+    assert calls == ["org_b"]
+
+
+def _put_many(prefix, worker, vectors):
+    store = FaceEmbeddingStore(prefix, dim=16, initial_capacity=4)
+    for i, vector in enumerate(vectors):
+        store.put(f"w{worker}_{i}", "org_a", selfie=vector)
+
+
+def test_processes_writing_one_store_keep_every_pair(tmp_path):
+    """Concurrent writers in several processes get distinct rows and see each other's keys"""
+    import multiprocessing
+
+    rng = np.random.default_rng(3)
+    vectors = np.stack([[_unit(rng) for _ in range(30)] for _ in range(3)])
+    prefix = str(tmp_path / "faces")
+    reader = FaceEmbeddingStore(prefix, dim=16)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_put_many, args=(prefix, w, vectors[w])) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(reader) == 90
+    for w in range(3):
+        for i in range(30):
+            assert np.allclose(reader.get(f"w{w}_{i}")["selfie"], vectors[w, i], atol=1e-3)
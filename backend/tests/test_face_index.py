@@ -0,0 +1,70 @@
+"""
+Tests for the per-organization face deduplication index
+"""
+import numpy as np
+import pytest
+
+from app.services import face_index
+from app.services.face_index import FaceIndex
+
+
+def test_search_returns_top_k_by_cosine(tmp_path, monkeypatch):
+    """Search matches a brute-force cosine ranking across chunks"""
+    monkeypatch.setattr(face_index, "SEARCH_CHUNK_ROWS", 64)
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(300, 16)).astype(np.float32)
+    index = FaceIndex(str(tmp_path / "org"), dim=16, dtype="float32", initial_capacity=8)
+    for i, embedding in enumerate(embeddings):
+        index.add(f"sub_{i}", embedding)
+
+    query = embeddings[42]
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = np.argsort(-(normed @ (query / np.linalg.norm(query))))[:3]
+
+    results = index.search(query, k=3)
+
+    assert [sid for sid, _ in results] == [f"sub_{i}" for i in expected]
+    assert results[0][1] > 0.99
+    assert all(sid != "sub_42" for sid, _ in index.search(query, k=3, exclude="sub_42"))
+
+
+def test_index_survives_reopen(tmp_path):
+    """A reopened index serves the embeddings persisted by the previous one"""
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(10, 16)).astype(np.float32)
+    index = FaceIndex(str(tmp_path / "org"), dim=16, initial_capacity=4)
+    for i, embedding in enumerate(embeddings):
+        index.add(f"sub_{i}", embedding)
+
+    reopened = FaceIndex(str(tmp_path / "org"), dim=16)
+
+    assert len(reopened) == 10
+    assert reopened.search(embeddings[7], k=1)[0][0] == "sub_7"
+
+
+def _append(prefix, worker, embeddings):
+    index = FaceIndex(prefix, dim=16, dtype="float32", initial_capacity=4)
+    for i, embedding in enumerate(embeddings):
+        index.add(f"w{worker}_{i}", embedding)
+
+
+def test_processes_appending_to_one_index_keep_every_row(tmp_path):
+    """Concurrent appends from several processes neither overwrite rows nor misalign IDs"""
+    import multiprocessing
+
+    rng = np.random.default_rng(2)
+    embeddings = rng.normal(size=(3, 40, 16)).astype(np.float32)
+    prefix = str(tmp_path / "org")
+    reader = FaceIndex(prefix, dim=16, dtype="float32", initial_capacity=4)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append, args=(prefix, w, embeddings[w])) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # The index opened before the appends sees them too.
+    assert len(reader) == 120
+    for w in range(3):
+        for i in (0, 17, 39):
+            assert reader.search(embeddings[w, i], k=1)[0] == (f"w{w}_{i}", pytest.approx(1.0, abs=1e-5))
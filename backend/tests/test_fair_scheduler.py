@@ -0,0 +1,115 @@
+"""
+Tests for fair multi-tenant ordering of queued AI requests
+"""
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, Overloaded
+from app.services.fair_scheduler import BATCH, INTERACTIVE, FairQueue
+
+
+def test_tenants_are_served_in_proportion_to_weight():
+    """A weight-4 and a weight-1 tenant share releases 4:1 while both are backlogged"""
+    queue = FairQueue()
+    for i in range(100):
+        queue.push("enterprise", ("enterprise", i), weight=4)
+        queue.push("starter", ("starter", i), weight=1)
+
+    served = [queue.pop()[0] for _ in range(50)]
+
+    assert served.count("enterprise") == 40
+    assert served.count("starter") == 10
+    assert len(queue) == 150
+
+
+def test_bulk_tenant_does_not_starve_a_live_session():
+    """A request queued behind another tenant's backlog is released within one round"""
+    queue = FairQueue()
+    for i in range(1000):
+        queue.push("bulk", ("bulk", i))
+    queue.push("live", ("live", 0))
+
+    served = [queue.pop()[0] for _ in range(3)]
+
+    assert "live" in served
+
+
+def test_interactive_work_is_released_before_batch():
+    """Batch items wait until no interactive item is queued; FIFO holds per tenant"""
+    queue = FairQueue()
+    queue.push("a", "batch-1", priority=BATCH)
+    queue.push("a", "live-1", priority=INTERACTIVE)
+    queue.push("a", "live-2", priority=INTERACTIVE)
+
+    assert [queue.pop(), queue.pop(), queue.pop(), queue.pop()] == ["live-1", "live-2", "batch-1", None]
+
+
+def test_discard_removes_a_waiter():
+    """Timed-out waiters leave their tenant queue"""
+    queue = FairQueue()
+    queue.push("a", 1)
+    queue.push("a", 2)
+
+    assert queue.discard("a", 1) is True
+    assert queue.depths() == {INTERACTIVE: {"a": 1}, BATCH: {}}
+    assert queue.pop() == 2
+    assert len(queue) == 0
+
+
+def test_one_tenant_cannot_fill_the_whole_queue():
+    """Past its share of the wait queue a tenant is shed while others still queue"""
+    controller = AdmissionController("test", max_concurrency=1, max_queue=4, queue_timeout_s=5, tenant_queue_share=0.5)
+
+    async def run():
+        await controller.acquire("bulk")
+        waiting = [asyncio.create_task(controller.acquire("bulk")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire("bulk")
+        other = asyncio.create_task(controller.acquire("live"))
+        await asyncio.sleep(0)
+        depths = controller.stats()["queued_by_tenant"][INTERACTIVE]
+        for _ in range(3):
+            controller.release()
+        await asyncio.gather(*waiting, other)
+        return shed.value, depths
+
+    shed, depths = asyncio.run(run())
+
+    assert shed.reason == "tenant_queue_full"
+    assert depths == {"bulk": 2, "live": 1}
+    assert controller.stats()["tenants"]["bulk"]["rejected"] == 1
+
+
+def test_customer_flow_requests_are_queued_under_the_inviting_organization(tmp_path, monkeypatch):
+    """The invitation code the customer flow sends puts its AI calls in the organization's own share"""
+    import cv2
+    import numpy as np
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app import db as database
+    from app.main import app
+    from app.models import Base, KYCInvitation, Organization
+    from app.services.admission import admission_controllers
+    from app.services.fair_scheduler import tenant_directory
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'kyc.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(Organization(id="org-live", name="Live Bank", plan="enterprise"))
+        db.add(KYCInvitation(code="INV-LIVE", organization_id="org-live"))
+        db.commit()
+    monkeypatch.setattr(database, "SessionLocal", sessions)
+    monkeypatch.setattr(tenant_directory, "_entries", {})
+
+    image = cv2.imencode(".jpg", np.full((64, 64, 3), 127, dtype=np.uint8))[1].tobytes()
+    response = TestClient(app).post(
+        "/api/v1/ai/quality", files={"file": ("doc.jpg", image, "image/jpeg")}, headers={"X-Invitation-Code": "INV-LIVE"}
+    )
+
+    assert response.status_code == 200
+    assert admission_controllers["quality"].stats()["tenants"]["org-live"]["admitted"] >= 1
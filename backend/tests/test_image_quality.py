@@ -0,0 +1,82 @@
+"""
+Tests for the document image quality gate
+"""
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from app.services import ai_models
+from app.services.result_cache import result_cache
+
+
+def _document(scale=1.0, background=90):
+    """A light card with rows of dark 'text' on a darker table."""
+    img = np.full((384, 512, 3), background, np.uint8)
+    height, width = int(300 * scale), int(440 * scale)
+    top, left = (384 - height) // 2, (512 - width) // 2
+    img[top : top + height, left : left + width] = 200
+    for row in range(top + 20, top + height - 20, 14):
+        for col in range(left + 20, left + width - 40, 30):
+            img[row : row + 6, col : col + 18] = 30
+    return img
+
+
+def _blur(img, k=9):
+    out = img.astype(np.float32)
+    for axis in (0, 1):
+        out = sum(np.roll(out, i, axis=axis) for i in range(-(k // 2), k // 2 + 1)) / k
+    return out.astype(np.uint8)
+
+
+def _codes(img):
+    return [reason["code"] for reason in ai_models.assess_image_quality(img)["reasons"]]
+
+
+def test_clear_capture_passes():
+    """A sharp, well exposed document filling most of the frame has no reasons"""
+    result = ai_models.assess_image_quality(_document())
+
+    assert result["passed"] is True
+    assert result["reasons"] == []
+    assert 0.5 < result["metrics"]["coverage"] < 0.8
+
+
+def test_bad_captures_are_rejected_with_reasons():
+    """Blur, darkness, glare and a distant document each map to one reason"""
+    glare = _document()
+    glare[100:200, 150:300] = 255
+
+    assert _codes(_blur(_document())) == ["blurry"]
+    assert _codes((_document() * 0.15).astype(np.uint8)) == ["too_dark"]
+    assert _codes(glare) == ["glare"]
+    assert _codes(_document(scale=0.4)) == ["document_too_small"]
+    result = ai_models.assess_image_quality(np.full((384, 512, 3), 255, np.uint8))
+    assert result["passed"] is False
+    assert all(reason["message"] for reason in result["reasons"])
+
+
+def test_cropped_document_is_only_a_warning():
+    """Text running off the frame edges is flagged but still accepted"""
+    result = ai_models.assess_image_quality(np.ascontiguousarray(_document()[70:320, 60:440]))
+
+    assert result["passed"] is True
+    assert [(r["code"], r["severity"]) for r in result["reasons"]] == [("document_cropped", "warn")]
+
+
+def test_rejected_capture_skips_ocr(monkeypatch):
+    """OCR never runs on an image the gate rejects, and the reasons are returned"""
+    calls = []
+    monkeypatch.setattr(ai_models.ocr_batcher, "batch_fn", lambda images: calls.append(images) or [None] * len(images))
+    result_cache.clear()
+    buf = io.BytesIO()
+    Image.fromarray(_blur(_document())).save(buf, format="PNG")
+    buf.seek(0)
+
+    result = asyncio.run(ai_models.OCRService.extract_document_info(UploadFile(file=buf, filename="doc.png")))
+
+    assert calls == []
+    assert result["full_name"] is None
+    assert [reason["code"] for reason in result["quality"]["reasons"]] == ["blurry"]
@@ -0,0 +1,40 @@
+"""
+Tests for the inference process pool
+"""
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+from app.services.inference_executor import InferenceExecutor
+
+
+def test_calls_failing_together_replace_the_pool_once():
+    """Concurrent calls that see the same broken pool leave one replacement, not one each"""
+    executor = InferenceExecutor(workers=2, models=(), start_method="fork")
+    executor.start()
+    broken = executor._pool
+    starts = []
+    start = executor.start
+    executor.start = lambda: (starts.append(1), start())
+
+    async def crash():
+        return await asyncio.gather(*(executor.call(os._exit, 1) for _ in range(4)), return_exceptions=True)
+
+    try:
+        results = asyncio.run(crash())
+        assert all(isinstance(result, BrokenProcessPool) for result in results)
+        assert len(starts) == 1 and executor._pool is not broken
+        assert asyncio.run(executor.call(os.getpid)) != os.getpid()
+    finally:
+        executor.shutdown()
+
+
+def test_warmup_waits_for_every_worker():
+    """Readiness needs a report from each worker's initializer, not just answers from the first warm one"""
+    executor = InferenceExecutor(workers=3, models=(), start_method="spawn")
+    executor.start()
+    try:
+        asyncio.run(executor.warmup())
+        assert executor.ready and len(executor.warmup_report) == 3
+    finally:
+        executor.shutdown()
@@ -0,0 +1,112 @@
+"""
+Tests for the streaming liveness engine
+"""
+import numpy as np
+from app.services.liveness import LivenessEngine
+
+
+class SyntheticVideo:
+    """Grayscale selfie frames: textured background, a face with two eyes."""
+
+    def __init__(self, frames, face_motion=False, rigid_motion=False, blink=False, fps=30.0):
+        self.fps = fps
+        self.frames = frames
+        self.face_motion = face_motion
+        self.rigid_motion = rigid_motion
+        self.blink = blink
+        self.position = 0
+        self.reads = 0
+        self.skips = []
+        rng = np.random.default_rng(0)
+        self.background = rng.integers(0, 255, (240, 180)).astype(np.uint8)
+        self.face = rng.integers(90, 170, (120, 90)).astype(np.uint8)
+
+    def read(self, skip=0):
+        self.skips.append(skip)
+        self.position += skip
+        if self.position >= self.frames:
+            return None
+        i = self.position
+        self.position += 1
+        self.reads += 1
+        face = self.face.copy()
+        if self.blink and i % 45 in (20, 21, 22, 23):
+            face[30:40, :] = 130
+        else:
+            face[30:40, 20:35] = 10
+            face[30:40, 55:70] = 10
+        dx = int(round(4 * np.sin(i / 5))) if self.face_motion else 0
+        frame = self.background.copy()
+        frame[40:160, 45 + dx : 135 + dx] = face
+        if self.rigid_motion:
+            frame = np.roll(frame, int(round(4 * np.sin(i / 5))), axis=1)
+        return frame
+
+
+def test_still_photo_is_rejected_early():
+    """A still image stops at the minimum sample count as not live"""
+    video = SyntheticVideo(3000)
+
+    result = LivenessEngine(min_frames=8).run(video)
+
+    assert result["is_live"] is False
+    assert result["stopped"] == "confident"
+    assert result["frames_sampled"] == 8
+
+
+def test_still_scene_sampling_gets_sparser():
+    """The sampling stride grows while nothing moves"""
+    video = SyntheticVideo(3000)
+
+    LivenessEngine(sample_fps=6).run(video)
+
+    assert video.skips[1] == 4
+    assert max(video.skips) > 4
+
+
+def test_moving_blinking_face_is_live():
+    """Local face motion plus a blink is accepted before the video ends"""
+    video = SyntheticVideo(3000, face_motion=True, blink=True)
+
+    result = LivenessEngine().run(video)
+
+    assert result["is_live"] is True
+    assert result["blinks"] >= 1
+    assert result["stopped"] == "confident"
+    assert video.reads < 60
+
+
+def test_rigidly_moving_picture_is_not_live():
+    """A picture shaken as a whole shows no face-versus-background motion"""
+    video = SyntheticVideo(600, rigid_motion=True)
+
+    result = LivenessEngine().run(video)
+
+    assert result["is_live"] is False
+    assert result["features"]["parallax"] < 0.2
+
+
+def test_cpu_budget_and_frame_cap_bound_the_work():
+    """Analysis stops at the CPU budget or the frame cap, whichever is first"""
+    assert LivenessEngine(cpu_budget_ms=0).run(SyntheticVideo(3000, face_motion=True))["stopped"] == "cpu_budget"
+
+    video = SyntheticVideo(100000, face_motion=True)
+    result = LivenessEngine(max_frames=20, early_stop_confidence=1.1).run(video)
+
+    assert result["stopped"] == "max_frames"
+    assert video.reads == 20
+
+
+def test_unreadable_video_is_a_client_error():
+    """An upload OpenCV cannot decode is answered with 400, not 500"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.ai import router
+
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).post("/api/v1/ai/liveness", files={"video": ("clip.webm", b"not a video", "video/webm")})
+
+    assert response.status_code == 400
+    assert "video" in response.json()["detail"]
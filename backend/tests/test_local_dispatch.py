@@ -0,0 +1,208 @@
+"""
+Tests for the local task backend (SQLite queue, in-process executor)
+"""
+import asyncio
+import base64
+import os
+import sqlite3
+import time
+
+from app.core.config import settings
+from app.workers import celery_app as workers
+from app.workers import local_queue
+from app.workers.dispatch import get_dispatcher, reset_dispatcher
+from app.workers.local_queue import LocalTaskExecutor, SQLiteTaskQueue
+from tests.test_verification_pipeline import _fake_stages, _load, database  # noqa: F401
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_pipeline_runs_on_the_local_backend(database, tmp_path, monkeypatch):
+    """The chord is queued in SQLite and run in-process, with no broker configured"""
+    monkeypatch.setattr(settings, "TASK_BACKEND", "local")
+    monkeypatch.setattr(settings, "LOCAL_TASK_QUEUE_PATH", str(tmp_path / "tasks.db"))
+    monkeypatch.setattr(settings, "LOCAL_TASK_POLL_INTERVAL_S", 0.05)
+    monkeypatch.setattr(workers.celery_app.conf, "task_always_eager", False)
+    monkeypatch.setattr(workers.celery_app.conf, "broker_url", "redis://unreachable:1/0")
+    monkeypatch.setattr(workers, "_in_worker", False)
+    _fake_stages(monkeypatch)
+    reset_dispatcher()
+    try:
+        workers.start_verification_pipeline("sub-1")
+        queue = get_dispatcher().queue
+        _wait_for(lambda: queue.counts() == {})
+        stats = workers.queue_stats()
+    finally:
+        reset_dispatcher()
+    submission, session = asyncio.run(_load(database))
+
+    assert (submission.risk_score, submission.risk_level) == (95, "green")
+    assert set(session.risk_assessment["stages"]) == {"ocr", "face", "liveness"}
+    assert stats["inference"]["depth"] == 0
+
+
+def test_chord_callback_gets_results_in_order_and_queue_keeps_priorities(tmp_path):
+    """The last member enqueues the callback with every result; lower priorities are claimed first"""
+    queue = SQLiteTaskQueue(str(tmp_path / "tasks.db"))
+    callback_id = queue.put_chord([("a", [1], "inference", 3), ("b", [2], "inference", 3)], ("cb", ["sub-1"], "inference", 1))
+    queue.put(("bulk", [], "batch", 9))
+    queue.put(("otp", [], "notifications", 1))
+
+    claimed = [queue.claim() for _ in range(3)]
+    assert [task[1] for task in claimed] == ["otp", "a", "b"]
+    assert queue.depths() == {"batch": 1}
+    assert queue.complete(claimed[2][0], "second") is None
+    assert queue.complete(claimed[1][0], "first") == callback_id
+    task_id, name, args, _, _ = queue.claim()
+    assert (task_id, name, args) == (callback_id, "cb", [["first", "second"], "sub-1"])
+
+
+def test_tenants_take_turns_within_a_priority(tmp_path):
+    """A tenant's backlog does not hold back another tenant's later task of the same priority"""
+    queue = SQLiteTaskQueue(str(tmp_path / "tasks.db"))
+    for i in range(3):
+        queue.put_chord([(f"bulk-{i}", [], "inference", 3)], ("cb", [], "inference", 1), tenant="org-bulk")
+    queue.put(("live", [], "inference", 3), tenant="org-live")
+    queue.put(("urgent", [], "notifications", 1), tenant="org-bulk")
+
+    claimed = [queue.claim()[1] for _ in range(5)]
+    assert claimed == ["urgent", "live", "bulk-0", "bulk-1", "bulk-2"]
+    # Chord callbacks keep their tenant.
+    callback_id = queue.put_chord([("a", [], "inference", 3)], ("cb", [], "inference", 1), tenant="org-live")
+    queue.complete(queue.claim()[0], None)
+    assert queue._db().execute("SELECT tenant FROM tasks WHERE id = ?", (callback_id,)).fetchone() == ("org-live",)
+
+
+def test_queued_and_interrupted_tasks_survive_a_restart(tmp_path, monkeypatch):
+    """Tasks left on disk, or running in a process that died, run after the next start"""
+    path = str(tmp_path / "tasks.db")
+    queue = SQLiteTaskQueue(path, max_attempts=2)
+    for i in range(3):
+        queue.put(("app.workers.celery_app.send_email_task", [f"u{i}@example.com", "Code", "<p>1</p>"], "notifications", 1))
+    interrupted = queue.claim()[0]
+    # The process that claimed it is gone.
+    queue._db().execute("UPDATE tasks SET owner = ? WHERE id = ?", (f"{2**22 + os.getpid()}:0", interrupted))
+
+    finished = []
+    restarted = SQLiteTaskQueue(path, max_attempts=2)
+    executor = LocalTaskExecutor(restarted, 2, poll_interval=0.05, on_finished=lambda *sample: finished.append(sample))
+    executor.start()
+    try:
+        _wait_for(lambda: len(finished) == 3)
+    finally:
+        executor.stop()
+    assert restarted.counts() == {}
+    assert all(sample[0] == "notifications" for sample in finished)
+
+
+def test_a_restart_under_the_same_pid_recovers_the_interrupted_tasks(tmp_path, monkeypatch):
+    """A process that got its predecessor's PID (PID 1 in a container) still requeues its running rows"""
+    path = str(tmp_path / "tasks.db")
+    queue = SQLiteTaskQueue(path)
+    queue.put(("app.workers.celery_app.send_email_task", ["u@example.com", "Code", "<p>1</p>"], "notifications", 1))
+    queue.claim()
+    # The restarted process: same PID, later start.
+    monkeypatch.setattr(local_queue, "_owner", (os.getpid(), f"{os.getpid()}:later"))
+
+    finished = []
+    executor = LocalTaskExecutor(SQLiteTaskQueue(path), 1, poll_interval=0.05, on_finished=lambda *sample: finished.append(sample))
+    executor.start()
+    try:
+        _wait_for(lambda: len(finished) == 1)
+    finally:
+        executor.stop()
+    assert queue.counts() == {}
+
+
+def test_a_result_that_cannot_be_recorded_does_not_strand_the_task(tmp_path, monkeypatch):
+    """An unstorable result fails the task and a locked database requeues it; the worker keeps going"""
+    queue = SQLiteTaskQueue(str(tmp_path / "tasks.db"))
+    # Only chord members' results are stored.
+    queue.put_chord([("unstorable", [], "notifications", 1)], ("callback", [], "notifications", 1))
+    locked = queue.put(("locked", [], "notifications", 2))
+    complete = queue.complete
+    lock_errors = [sqlite3.OperationalError("database is locked")]
+
+    def flaky_complete(task_id, result):
+        if task_id == locked and lock_errors:
+            raise lock_errors.pop()
+        return complete(task_id, result)
+
+    monkeypatch.setattr(queue, "complete", flaky_complete)
+    finished = []
+    executor = LocalTaskExecutor(queue, 1, poll_interval=0.05, on_finished=lambda *sample: finished.append(sample))
+    monkeypatch.setattr(executor, "_call", lambda name, args: object() if name == "unstorable" else "ok")
+    executor.start()
+    try:
+        _wait_for(lambda: len(finished) == 3)
+    finally:
+        executor.stop()
+    assert queue._db().execute("SELECT name, state FROM tasks").fetchall() == [("unstorable", "failed")]
+
+
+def test_real_stages_share_the_batchers_across_local_task_threads(tmp_path, monkeypatch):
+    """Stages running on several task threads' loops at once each get their batched results back"""
+    import cv2
+    import numpy as np
+
+    from app.services import ai_models, verification_pipeline
+    from app.workers.celery_app import _shutdown_worker_process
+    from app.workers.dispatch import _init_local_worker
+
+    monkeypatch.setattr(settings, "ARTIFACT_STORE_PATH", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(settings, "FACE_INDEX_PATH", str(tmp_path / "face_index"))
+    monkeypatch.setattr(settings, "FACE_EMBEDDINGS_PATH", str(tmp_path / "face_embeddings"))
+    monkeypatch.setattr(settings, "AI_FORGERY_ENABLED", False)
+    # The initializer marks the process as a worker, for resident loops.
+    monkeypatch.setattr(workers, "_in_worker", False)
+    # Wait long enough for items from different threads to meet in one batcher.
+    for batcher in (ai_models.ocr_batcher, ai_models.face_batcher):
+        monkeypatch.setattr(batcher, "max_wait_ms", 100.0)
+    monkeypatch.setattr(ai_models.ocr_batcher, "batch_fn", lambda images: [[[]] for _ in images])
+    embedding = np.ones(512, dtype=np.float32) / np.sqrt(512)
+    monkeypatch.setattr(
+        ai_models.face_batcher,
+        "batch_fn",
+        lambda images: [{"bbox": [0, 0, 8, 8], "det_score": 0.9, "embedding": embedding} for _ in images],
+    )
+    reports = []
+    run_stage = verification_pipeline.run_stage
+
+    async def recorded(stage, manifest, enqueued_at):
+        reports.append(await run_stage(stage, manifest, enqueued_at))
+        return reports[-1]
+
+    monkeypatch.setattr(verification_pipeline, "run_stage", recorded)
+
+    queue = SQLiteTaskQueue(str(tmp_path / "tasks.db"))
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        image = "data:image/jpeg;base64," + base64.b64encode(
+            cv2.imencode(".jpg", rng.integers(0, 255, (64, 64, 3), dtype=np.uint8))[1].tobytes()
+        ).decode()
+        manifest = verification_pipeline.artifact_manifest(
+            {
+                "submission_id": f"sub-{i}",
+                "organization_id": "org-1",
+                "document": {"type": "passport", "capturedImage": image},
+                "biometric": {"selfieImage": image},
+            }
+        )
+        for task in ("process_ocr_task", "match_faces_task"):
+            queue.put((f"app.workers.celery_app.{task}", [manifest, time.time()], "inference", 1))
+
+    executor = LocalTaskExecutor(
+        queue, 4, poll_interval=0.05, initializer=_init_local_worker, on_thread_exit=_shutdown_worker_process
+    )
+    executor.start()
+    try:
+        _wait_for(lambda: len(reports) == 8)
+    finally:
+        executor.stop(timeout=5)
+    assert [report["status"] for report in reports] == ["completed"] * 8
+    assert all(report["result"]["face_match"]["match"] for report in reports if report["stage"] == "face")
@@ -0,0 +1,81 @@
+"""
+Tests for the versioned model registry and hot swapping
+"""
+import asyncio
+
+from app.services import ai_models
+from app.services.model_registry import ModelRegistry, ModelVersions, model_registry, pinned
+
+
+def _fake_models(loads):
+    def build(version):
+        loads.append(version)
+        return f"model:{version}"
+
+    return build, lambda model: None
+
+
+def test_registry_keeps_versions_side_by_side():
+    """Pinned versions load lazily, stay while in use and the oldest idle one is evicted"""
+    loads = []
+    registry = ModelRegistry(max_versions=2)
+    registry.register("ocr", *_fake_models(loads))
+
+    with pinned({"ocr": "v1"}):
+        with registry.use("ocr") as model:
+            assert model == "model:v1"
+            assert registry.unload("ocr", "v1") is False  # in use: dropped on release
+            with registry.use("ocr", "v2") as other:
+                assert other == "model:v2"
+    assert registry.loaded() == {"ocr": ["v2"]}
+
+    registry.load("ocr", "v3")
+    registry.load("ocr", "v4")
+    assert sorted(registry.loaded()["ocr"]) == ["v3", "v4"]
+    assert loads == ["v1", "v2", "v3", "v4"]
+
+
+def test_activate_swaps_and_drains_the_old_version(monkeypatch):
+    """New requests get the new version at once; the old one unloads after its last holder"""
+    loads = []
+    monkeypatch.setitem(model_registry._builders, "ocr", _fake_models(loads))
+    versions = ModelVersions({"ocr": "v1"}, drain_timeout_s=5)
+
+    async def scenario():
+        model_registry.load("ocr", "v1")
+        with versions.hold("ocr") as held:
+            record = await versions.activate("ocr", "v2")
+            with versions.hold("ocr") as fresh:
+                pass
+            await asyncio.sleep(0.05)
+            still_loaded = "v1" in model_registry.loaded()["ocr"]
+        await asyncio.gather(*versions._tasks)
+        return held, fresh, record, still_loaded
+
+    held, fresh, record, still_loaded = asyncio.run(scenario())
+
+    assert (held, fresh) == ("v1", "v2")
+    assert record["previous"] == "v1" and record["staged"]["main"]["version"] == "v2"
+    assert still_loaded
+    assert "v1" not in model_registry.loaded()["ocr"]
+    assert versions.status()["ocr"] == {"active": "v2", "draining": [], "in_flight": {}}
+    model_registry.unload("ocr", "v2")
+
+
+def test_batches_run_pinned_to_the_submitted_version(monkeypatch):
+    """Items of different versions are never batched together and run on their own model"""
+    monkeypatch.setitem(model_registry._builders, "ocr", _fake_models([]))
+
+    def fake_ocr(images):
+        with model_registry.use("ocr") as model:
+            return [(model, len(images))] * len(images)
+
+    monkeypatch.setattr(ai_models.ocr_batcher, "batch_fn", fake_ocr)
+
+    async def scenario():
+        submit = ai_models.ocr_batcher.submit
+        return await asyncio.gather(submit(1, "v1"), submit(2, "v2"), submit(3, "v1"))
+
+    assert asyncio.run(scenario()) == [("model:v1", 2), ("model:v2", 1), ("model:v1", 2)]
+    for version in ("v1", "v2"):
+        model_registry.unload("ocr", version)
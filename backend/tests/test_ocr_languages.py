@@ -0,0 +1,99 @@
+"""
+Tests for per-language OCR models: routing and the memory-budgeted pool
+"""
+import asyncio
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import ai_models
+from app.services.document_fields import extract_fields
+from app.services.model_registry import ModelRegistry, model_registry
+from app.services.ocr_languages import detect_language, version_language, with_language
+from app.services.preprocessing import PreparedImage
+from app.services.result_cache import result_cache
+
+
+def _td3(country):
+    return [
+        f"P<{country}ERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<"[:44],
+        f"L898902C36{country}7408122F1204159ZE184226B<<<<<10",
+    ]
+
+
+def test_language_is_detected_from_the_document():
+    """MRZ issuing state first, then header words; unsupported languages are ignored"""
+    russian = _td3("RUS")
+    assert detect_language(russian, extract_fields(russian)) == "ru"
+    header = ["REPUBLIQUE FRANCAISE", "CARTE NATIONALE D'IDENTITE", "NOM: MARTIN"]
+    assert detect_language(header, extract_fields(header)) == "fr"
+    assert detect_language(_td3("UTO"), extract_fields(_td3("UTO"))) is None
+    assert version_language("paddleocr-en-angle") == "en"
+    assert with_language("paddleocr-en-angle", "ru") == "paddleocr-ru-angle"
+
+
+def test_pool_evicts_idle_languages_under_the_memory_budget():
+    """Least recently used languages go first; pinned and hot ones stay"""
+    registry = ModelRegistry(max_versions=2, rss_budget_mb=1000, hot_versions=1)
+    registry.register("ocr", lambda version: version, lambda model: None, variant=version_language, pinned=lambda: ["en"])
+    # 100 MiB baseline plus 300 MiB per resident model.
+    registry.rss = lambda: 100.0 + 300 * sum(1 for entry in registry._models.values() if entry.model)
+
+    registry.load("ocr", "paddleocr-en-angle")
+    with registry.use("ocr", "paddleocr-fr-angle"):
+        pass
+    registry.load("ocr", "paddleocr-german-angle")
+    registry.load("ocr", "paddleocr-es-angle")
+
+    assert sorted(registry.loaded()["ocr"]) == ["paddleocr-en-angle", "paddleocr-es-angle", "paddleocr-fr-angle"]
+    assert registry.evictions == 1
+    assert registry.stats()["models"]["ocr:paddleocr-es-angle"]["rss_mb"] == 300.0
+
+
+def _read(monkeypatch, pages):
+    """OCR a blank capture where each language model 'reads' its own page."""
+
+    def fake_ocr(images):
+        with model_registry.use("ocr") as model:
+            lines, confidence = pages[version_language(model)]
+        return [[[[None, (text, confidence)] for text in lines]] for _ in images]
+
+    monkeypatch.setitem(model_registry._builders, "ocr", (lambda version: version, lambda model: None))
+    monkeypatch.setattr(ai_models.ocr_batcher, "batch_fn", fake_ocr)
+    monkeypatch.setattr(settings, "AI_QUALITY_GATE_ENABLED", False)
+    monkeypatch.setattr(settings, "AI_OCR_ROI_ENABLED", False)
+    result_cache.clear()
+    prepared = PreparedImage(np.zeros((64, 64, 3), np.uint8))
+    try:
+        return asyncio.run(ai_models._read_document(b"capture", None, prepared))
+    finally:
+        for version in model_registry.loaded().get("ocr", []):
+            model_registry.unload("ocr", version)
+
+
+def test_documents_are_routed_to_their_language_model(monkeypatch):
+    """A Russian passport is re-read by the Russian model; a French one with a valid MRZ is not"""
+    russian = _read(monkeypatch, {"en": (_td3("RUS"), 0.9), "ru": (["ПАСПОРТ", "ЭРИКССОН"] + _td3("RUS"), 0.95)})
+    assert (russian["ocr_language"], russian["model_version"]) == ("ru", "paddleocr-ru-angle")
+    assert "ПАСПОРТ" in russian["raw_text"] and russian["document_number"] == "L898902C3"
+
+    french = _read(monkeypatch, {"en": (_td3("FRA"), 0.9)})
+    assert (french["ocr_language"], french["model_version"]) == ("en", "paddleocr-en-angle")
+
+
+def test_latin_printed_and_no_better_rereads_keep_the_first_pass(monkeypatch):
+    """An Indian passport with a valid MRZ is not re-read in Hindi; a re-read that is no better is dropped"""
+    indian = _read(monkeypatch, {"en": (_td3("IND"), 0.9)})
+    assert indian["ocr_language"] == "en"
+
+    russian = _read(monkeypatch, {"en": (_td3("RUS"), 0.9), "ru": (_td3("RUS"), 0.8)})
+    assert russian["ocr_language"] == "en"
+
+
+def test_unreadable_pages_probe_the_pinned_languages(monkeypatch):
+    """With no language signal and a poor first read, the best pinned language wins"""
+    monkeypatch.setattr(settings, "AI_OCR_PINNED_LANGUAGES", "en,ar")
+    result = _read(monkeypatch, {"en": (["#$%"], 0.3), "ar": (["جواز سفر"] + _td3("UTO"), 0.9)})
+
+    assert result["ocr_language"] == "ar"
+    assert result["document_number"] == "L898902C3"
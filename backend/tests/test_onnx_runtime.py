@@ -0,0 +1,100 @@
+"""
+Tests for ONNX Runtime session sizing and precision selection
+"""
+import weakref
+
+from app.core.config import settings
+from app.services import onnx_runtime
+from app.services.model_registry import ModelRegistry
+
+
+def test_intra_op_threads_split_cores_across_workers(monkeypatch):
+    """Without an explicit count, cores are shared by every worker's sessions"""
+    monkeypatch.setattr(onnx_runtime.os, "cpu_count", lambda: 16)
+    monkeypatch.setattr(settings, "ONNX_INTRA_OP_THREADS", 0)
+    monkeypatch.setattr(settings, "AI_INFERENCE_WORKERS", 4)
+    monkeypatch.setattr(settings, "ONNX_SESSION_POOL_SIZE", 2)
+
+    assert onnx_runtime.intra_op_threads() == 2
+
+    monkeypatch.setattr(settings, "AI_INFERENCE_WORKERS", 32)
+    assert onnx_runtime.intra_op_threads() == 1
+
+    monkeypatch.setattr(settings, "ONNX_INTRA_OP_THREADS", 3)
+    assert onnx_runtime.intra_op_threads() == 3
+
+
+def test_inference_children_size_threads_from_their_pool(monkeypatch):
+    """A Celery inference child splits cores by the pool's concurrency without touching the settings"""
+    from app.services import ai_models
+    from app.workers import celery_app
+
+    monkeypatch.setattr(onnx_runtime.os, "cpu_count", lambda: 16)
+    monkeypatch.setattr(onnx_runtime, "_inference_processes", None)
+    monkeypatch.setattr(settings, "ONNX_INTRA_OP_THREADS", 0)
+    monkeypatch.setattr(settings, "ONNX_SESSION_POOL_SIZE", 1)
+    monkeypatch.setattr(settings, "AI_INFERENCE_WORKERS", 2)
+    monkeypatch.setattr(settings, "CELERY_WORKER_ROLE", "inference")
+    monkeypatch.setattr(celery_app.celery_app.conf, "worker_concurrency", 8)
+    monkeypatch.setattr(celery_app, "worker_report", {})
+    monkeypatch.setattr(ai_models, "preload_models", lambda models: {})
+
+    celery_app._init_worker_process()
+
+    assert onnx_runtime.intra_op_threads() == 2
+    assert settings.AI_INFERENCE_WORKERS == 2
+
+
+def test_int8_applies_only_to_listed_tasks(monkeypatch):
+    """INT8 mode quantizes the configured models and keeps the rest FP32"""
+    monkeypatch.setattr(settings, "ONNX_INT8_MODELS", "recognition")
+    monkeypatch.setattr(settings, "ONNX_PRECISION", "int8")
+
+    assert onnx_runtime.precision_for("recognition") == "int8"
+    assert onnx_runtime.precision_for("detection") == "fp32"
+
+    monkeypatch.setattr(settings, "ONNX_PRECISION", "fp32")
+    assert onnx_runtime.precision_for("recognition") == "fp32"
+
+
+def test_session_pools_are_kept_per_precision(monkeypatch):
+    """Asking for one model file at two precisions gives two pools, each at its own precision"""
+
+    class Pool:
+        def __init__(self, model_path, size=1, precision="fp32"):
+            self.model_path, self.precision = model_path, precision
+
+    monkeypatch.setattr(onnx_runtime, "SessionPool", Pool)
+    monkeypatch.setattr(onnx_runtime, "_pools", weakref.WeakValueDictionary())
+    monkeypatch.setattr(settings, "ONNX_INT8_MODELS", "recognition")
+    monkeypatch.setattr(settings, "ONNX_PRECISION", "int8")
+
+    int8 = onnx_runtime.get_session_pool("/models/w600k_r50.onnx", "recognition")
+    fp32 = onnx_runtime.get_session_pool("/models/w600k_r50.onnx", "detection")
+    assert (int8.precision, fp32.precision) == ("int8", "fp32")
+    assert onnx_runtime.get_session_pool("/models/w600k_r50.onnx", "recognition") is int8
+
+
+def test_unloading_a_model_frees_its_session_pools(monkeypatch):
+    """A hot swap or eviction takes the old model's sessions with it"""
+
+    class Pool:
+        def __init__(self, model_path, size=1, precision="fp32"):
+            self.model_path, self.precision = model_path, precision
+
+    class Model:
+        def __init__(self, version):
+            self.sessions = [onnx_runtime.get_session_pool(f"/models/{version}/{task}.onnx", task) for task in ("det", "rec")]
+            # As InsightFace's objects do.
+            self.itself = self
+
+    monkeypatch.setattr(onnx_runtime, "SessionPool", Pool)
+    monkeypatch.setattr(onnx_runtime, "_pools", weakref.WeakValueDictionary())
+    registry = ModelRegistry(max_versions=2)
+    registry.register("face", Model, lambda model: None)
+
+    registry.load("face", "v1")
+    registry.load("face", "v2")
+    assert len(onnx_runtime._pools) == 4
+    assert registry.unload("face", "v1")
+    assert sorted(path for path, _ in onnx_runtime._pools) == ["/models/v2/det.onnx", "/models/v2/rec.onnx"]
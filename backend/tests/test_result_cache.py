@@ -0,0 +1,90 @@
+"""
+Tests for the content-addressed AI result cache
+"""
+import asyncio
+
+import numpy as np
+
+from app.services.result_cache import ResultCache, _decode, _encode
+
+
+def test_key_depends_on_content_and_model_version():
+    """Same bytes and model version give the same key"""
+    a = ResultCache.key("face", "v1", b"selfie")
+    assert a == ResultCache.key("face", "v1", b"selfie")
+    assert a != ResultCache.key("face", "v2", b"selfie")
+    assert a != ResultCache.key("face", "v1", b"other")
+
+
+def test_lru_eviction_and_hit_counters():
+    """Least recently used entries are evicted past max_entries"""
+    cache = ResultCache(max_entries=2, max_bytes=1 << 20, ttl_seconds=60)
+
+    async def run():
+        await cache.set("a", {"v": 1})
+        await cache.set("b", {"v": 2})
+        await cache.get("a")
+        await cache.set("c", {"v": 3})
+        return await cache.get("a"), await cache.get("b")
+
+    a, b = asyncio.run(run())
+
+    assert a == {"v": 1}
+    assert b is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_expired_entries_miss():
+    """Entries past their TTL are not returned"""
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl_seconds=0)
+
+    async def run():
+        await cache.set("a", {"v": 1})
+        return await cache.get("a")
+
+    assert asyncio.run(run()) is None
+
+
+def test_byte_budget_is_enforced():
+    """Entries are evicted to stay within the memory budget"""
+    cache = ResultCache(max_entries=100, max_bytes=5000, ttl_seconds=60)
+    embedding = np.zeros(512, dtype=np.float32)
+
+    async def run():
+        for i in range(4):
+            await cache.set(str(i), {"embedding": embedding})
+
+    asyncio.run(run())
+
+    assert cache.stats()["bytes"] <= 5000
+    assert cache.stats()["entries"] == 2
+
+
+def test_ndarray_round_trip():
+    """Embeddings survive the Redis serialization format"""
+    value = {"embedding": np.arange(4, dtype=np.float32), "bbox": [1.0, 2.0]}
+    decoded = _decode(_encode(value))
+    assert decoded["bbox"] == [1.0, 2.0]
+    assert decoded["embedding"].dtype == np.float32
+    assert np.array_equal(decoded["embedding"], value["embedding"])
+
+
+def test_sub_second_ttl_still_reaches_redis():
+    """A TTL under a second is written in milliseconds rather than as an invalid zero-second expiry"""
+    writes = []
+
+    class Redis:
+        async def set(self, key, value, ex=None, px=None):
+            if ex is not None and ex <= 0 or px is not None and px <= 0:
+                raise ValueError("invalid expire time in 'set' command")
+            writes.append(px)
+
+    cache = ResultCache(max_entries=8, max_bytes=1 << 20, ttl_seconds=0.25, redis_url="redis://cache:6379/0")
+    cache._redis = Redis()
+    asyncio.run(cache.set("a", {"v": 1}))
+
+    assert writes == [250]
+    assert cache.stats()["redis_errors"] == 0
@@ -0,0 +1,111 @@
+"""
+Tests for vectorized batch risk scoring
+"""
+import asyncio
+import json
+import random
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.ai_models import RiskScoringService, score_risk_batch
+
+
+def test_batch_matches_single_row_scoring():
+    """Vectorized scores and levels equal the per-row service results"""
+    rng = random.Random(3)
+    fields = ["documentAuthenticity", "faceMatchScore", "gpsMatch", "phoneVerification"]
+    rows = [
+        {name: rng.choice([None, 0, rng.uniform(0, 100), str(rng.randint(0, 100)), True]) for name in fields}
+        for _ in range(500)
+    ]
+
+    batch = score_risk_batch(rows)
+    single = [asyncio.run(RiskScoringService.calculate_risk_score(row)) for row in rows]
+
+    assert [{"score": r["score"], "level": r["level"]} for r in batch] == single
+
+
+def test_bad_rows_are_reported_without_failing_the_batch():
+    """Unparseable values and non-object rows get per-row errors"""
+    results = score_risk_batch([{"id": "a", "gpsMatch": "n/a"}, [1, 2], {"id": "b", "gpsMatch": 100}])
+
+    assert results[0]["id"] == "a" and "error" in results[0]
+    assert "error" in results[1]
+    assert results[2] == {"id": "b", "score": 35, "level": "red"}
+
+
+def test_batch_endpoint_accepts_json_and_ndjson():
+    """Both body formats stream one NDJSON result per row, in order"""
+    client = TestClient(app)
+    rows = [{"id": str(i), "documentAuthenticity": 100, "faceMatchScore": 100, "gpsMatch": i} for i in range(10)]
+
+    as_json = client.post("/api/v1/ai/risk/batch", json=rows)
+    as_ndjson = client.post(
+        "/api/v1/ai/risk/batch",
+        content="\n".join(json.dumps(row) for row in rows) + "\nnot json\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert as_json.status_code == 200
+    assert as_json.headers["content-type"].startswith("application/x-ndjson")
+    json_results = [json.loads(line) for line in as_json.text.splitlines()]
+    ndjson_results = [json.loads(line) for line in as_ndjson.text.splitlines()]
+    assert [r["id"] for r in json_results] == [str(i) for i in range(10)]
+    assert ndjson_results[:10] == json_results
+    assert "error" in ndjson_results[10]
+
+
+def test_non_finite_features_are_row_errors():
+    """NaN and infinite values are reported per row instead of scoring as garbage integers"""
+    results = score_risk_batch(
+        [{"id": "nan", "gpsMatch": float("nan")}, {"id": "inf", "faceMatchScore": "-inf"}, {"id": "ok", "gpsMatch": 100}]
+    )
+
+    assert [r["id"] for r in results] == ["nan", "inf", "ok"]
+    assert "error" in results[0] and "error" in results[1]
+    assert results[2] == {"id": "ok", "score": 35, "level": "red"}
+
+
+def test_ndjson_results_stream_before_the_body_ends(monkeypatch):
+    """The first chunk of results is sent while the client is still uploading rows"""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "RISK_BATCH_CHUNK_ROWS", 2)
+    first_result = asyncio.Event()
+    sent = []
+    body = [
+        b'{"id": "1", "gpsMatch": 10}\n{"id": "2", "gpsMatch": 20}\n{"id": "3", "gpsMatch": 30}\n',
+        b'{"id": "4", "gpsMatch": 40}\n',
+    ]
+
+    async def receive():
+        if len(body) == 1:
+            # Hold the rest of the upload until results have gone out.
+            await asyncio.wait_for(first_result.wait(), 5)
+        return {"type": "http.request", "body": body.pop(0), "more_body": bool(body)}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            sent.append(message["body"])
+            first_result.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/v1/ai/risk/batch",
+        "raw_path": b"/api/v1/ai/risk/batch",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/x-ndjson")],
+        "server": ("test", 80),
+        "client": ("test", 1234),
+    }
+    asyncio.run(app(scope, receive, send))
+
+    lines = [json.loads(line) for chunk in sent for line in chunk.decode().splitlines()]
+    assert [line["id"] for line in lines] == ["1", "2", "3", "4"]
+    assert len(sent) >= 2
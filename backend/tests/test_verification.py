@@ -0,0 +1,57 @@
+"""
+Tests for the single-pass combined verification service
+"""
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from app.services import ai_models
+from app.services.result_cache import result_cache
+
+
+def _upload(name, color):
+    buf = io.BytesIO()
+    Image.new("RGB", (1200, 900), color).save(buf, format="JPEG")
+    buf.seek(0)
+    return UploadFile(file=buf, filename=name)
+
+
+def test_each_image_is_decoded_and_detected_once(monkeypatch):
+    """Selfie and document are decoded once and run through detection once"""
+    decoded, detected, cropped = [], [], []
+    prepare = ai_models.prepare_image
+
+    def counting_prepare(data, models):
+        decoded.append(tuple(models))
+        return prepare(data, models)
+
+    def fake_faces(images):
+        detected.extend(image.shape for image in images)
+        embedding = np.ones(4, dtype=np.float32) / 2
+        return [{"bbox": [10.0, 10.0, 110.0, 130.0], "det_score": 0.9, "embedding": embedding} for _ in images]
+
+    def fake_deepfake(crop):
+        cropped.append(crop.shape)
+        return {"is_deepfake": False, "confidence": 0.9}
+
+    result_cache.clear()
+    monkeypatch.setattr(ai_models, "prepare_image", counting_prepare)
+    monkeypatch.setattr(ai_models.face_batcher, "batch_fn", fake_faces)
+    monkeypatch.setattr(ai_models.DeepfakeDetectionService, "score_face", staticmethod(fake_deepfake))
+
+    result = asyncio.run(
+        ai_models.VerificationService.verify(
+            _upload("selfie.jpg", "gray"), document=_upload("document.jpg", "white"), signals={"gpsMatch": 90}
+        )
+    )
+
+    assert sorted(decoded) == [("face",), ("face", "deepfake")]
+    assert len(detected) == 2
+    assert cropped == [(154, 130, 3)]
+    assert result["face_match"] == {"match": True, "confidence": 1.0}
+    assert result["deepfake"]["confidence"] == 0.9
+    assert result["risk"]["score"] == 58
+    assert {"decode", "face", "deepfake", "risk", "total"} <= set(result["timings_ms"])
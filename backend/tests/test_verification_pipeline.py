@@ -0,0 +1,232 @@
+"""
+Tests for the Celery verification pipeline (run eagerly against SQLite)
+"""
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.models import Base, CustomerSubmission, KYCSession
+from app.services import verification_pipeline
+from app.services.artifacts import get_artifact_store
+from app.workers.celery_app import celery_app, start_verification_pipeline
+
+IMAGE = "data:image/jpeg;base64," + base64.b64encode(b"jpeg bytes").decode()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'kyc.db'}"
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    monkeypatch.setattr(settings, "ARTIFACT_STORE_PATH", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    engine = create_async_engine(url)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with sessions() as db:
+            db.add(
+                KYCSession(
+                    id="ses-1",
+                    organization_id="org-1",
+                    status="submitted",
+                    document={"type": "passport", "capturedImage": IMAGE},
+                    biometric={"selfieImage": IMAGE, "livenessDetected": True},
+                    gps={"isMatched": True, "matchConfidence": 90},
+                    phone_verification={"isVerified": True},
+                )
+            )
+            db.add(
+                CustomerSubmission(
+                    id="sub-1", organization_id="org-1", invitation_id="inv-1", kyc_session_id="ses-1", status="submitted"
+                )
+            )
+            await db.commit()
+
+    asyncio.run(setup())
+    yield sessions
+    asyncio.run(engine.dispose())
+
+
+def _fake_stages(monkeypatch, duplicates=()):
+    async def read_document(data, document_type):
+        return {"document_type": document_type, "full_name": "ANNA ERIKSSON", "raw_text": "..."}
+
+    async def check_forgery(data):
+        return {"checked": True, "score": 0.96, "is_forged": False}
+
+    async def find_duplicates(organization_id, selfie, subject_id=None, enroll=False):
+        return {"face_detected": True, "duplicates": list(duplicates), "enrolled": enroll}
+
+    async def match_images(selfie, document, reference_id=None, organization_id=""):
+        return {"match": True, "confidence": 0.92}
+
+    monkeypatch.setattr(verification_pipeline, "_read_document", read_document)
+    monkeypatch.setattr(verification_pipeline, "_check_document_forgery", check_forgery)
+    monkeypatch.setattr(verification_pipeline.FaceDeduplicationService, "find_duplicates", staticmethod(find_duplicates))
+    monkeypatch.setattr(verification_pipeline.FaceVerificationService, "match_images", staticmethod(match_images))
+
+
+async def _load(sessions):
+    async with sessions() as db:
+        return await db.get(CustomerSubmission, "sub-1"), await db.get(KYCSession, "ses-1")
+
+
+def test_chord_scores_the_submission_and_records_each_stage(database, monkeypatch):
+    """The stage group feeds the callback, which writes the score, level and assessment back"""
+    _fake_stages(monkeypatch)
+    start_verification_pipeline("sub-1")
+    submission, session = asyncio.run(_load(database))
+
+    # 15 + 0.25 * 96 + 0.25 * 92 + 0.2 * 90 + 0.15 * 100
+    assert (submission.risk_score, submission.risk_level) == (95, "green")
+    assert submission.status == "submitted"
+    assert submission.submission_metadata["face_match"]["match"] is True
+    assessment = session.risk_assessment
+    assert assessment["documentAuthenticity"] == 96.0 and assessment["flags"] == []
+    assert set(assessment["stages"]) == {"ocr", "face", "liveness"}
+    assert all(stage["status"] == "completed" and stage["latency_ms"] >= 0 for stage in assessment["stages"].values())
+
+
+def test_flags_and_failed_stages_send_the_submission_to_review(database, monkeypatch):
+    """A duplicate face and a crashed stage cap the level and mark the submission for review"""
+    _fake_stages(monkeypatch, duplicates=[{"subject_id": "sub-0", "similarity": 0.9}])
+
+    async def broken(data, document_type):
+        raise RuntimeError("ocr model unavailable")
+
+    monkeypatch.setattr(verification_pipeline, "_read_document", broken)
+    start_verification_pipeline("sub-1")
+    submission, session = asyncio.run(_load(database))
+
+    assessment = session.risk_assessment
+    assert set(assessment["flags"]) == {"duplicate_face", "ocr_failed"}
+    ocr = assessment["stages"]["ocr"]
+    assert (ocr["status"], ocr["error"]) == ("failed", "ocr model unavailable")
+    assert "documentAuthenticity" not in assessment
+    assert submission.status == "needs_review" and submission.risk_level == "amber"
+
+
+def test_stage_reports_queue_wait():
+    """Time between enqueueing and the stage starting is reported apart from its run time"""
+    report = asyncio.run(verification_pipeline.run_stage("face", None, time.time() - 2))
+    assert report["status"] == "skipped" and report["queue_ms"] >= 2000
+
+
+def test_stages_get_artifact_references_and_check_digests(tmp_path, monkeypatch):
+    """The manifest carries keys and digests only, and a replaced artifact fails its stage"""
+    monkeypatch.setattr(settings, "ARTIFACT_STORE_PATH", str(tmp_path))
+    _fake_stages(monkeypatch)
+    context = {
+        "submission_id": "sub-1",
+        "organization_id": "org-1",
+        "document": {"type": "passport", "capturedImage": IMAGE},
+        "biometric": {"selfieImage": IMAGE, "livenessDetected": True},
+    }
+    manifest = verification_pipeline.artifact_manifest(context)
+
+    assert set(manifest["artifacts"]) == {"document", "selfie"}
+    assert manifest["artifacts"]["document"] == manifest["artifacts"]["selfie"]
+    assert "jpeg bytes" not in json.dumps(manifest) and IMAGE.split(",")[1] not in json.dumps(manifest)
+    report = asyncio.run(verification_pipeline.run_stage("ocr", manifest, time.time()))
+    assert report["status"] == "completed" and report["result"]["document"]["document_type"] == "passport"
+
+    (tmp_path / manifest["artifacts"]["document"]["key"]).write_bytes(b"other bytes")
+    report = asyncio.run(verification_pipeline.run_stage("ocr", manifest, time.time()))
+    assert report["status"] == "failed" and "digest" in report["error"]
+    with pytest.raises(ValueError):
+        get_artifact_store().get({**manifest["artifacts"]["selfie"], "key": "../../etc/passwd"})
+
+
+def test_msgpack_zstd_compresses_only_large_bodies():
+    """Small bodies stay plain msgpack, large ones are zstd frames, both round-trip"""
+    from kombu.serialization import dumps, loads
+
+    small = [[{"submission_id": "sub-1", "artifacts": {}}, 1.5], {}, {}]
+    large = {"stages": [{"stage": "face", "duplicates": [{"subject_id": f"sub-{i % 7}", "similarity": 0.5} for i in range(200)]}]}
+    for body, header in ((small, b"\x00"), (large, b"\x01")):
+        content_type, encoding, data = dumps(body, serializer="msgpack-zstd")
+        assert data[:1] == header and loads(data, content_type, encoding) == body
+    assert len(dumps(large, serializer="msgpack-zstd")[2]) < len(json.dumps(large)) / 10
+
+
+def test_tasks_route_to_their_queue_with_priorities(monkeypatch):
+    """Pipeline, batch, notification and maintenance tasks each get a queue and a priority, served by role"""
+    from app.workers import celery_app as workers
+
+    def route(task):
+        return celery_app.amqp.router.route({}, task.name)["queue"].name
+
+    assert {route(task) for task in workers.STAGE_TASKS.values()} == {"inference"}
+    assert route(workers.calculate_risk_score_task) == "inference"
+    assert route(workers.calculate_risk_scores_task) == "batch"
+    assert route(workers.send_email_task) == "notifications"
+    assert route(workers.prune_artifacts_task) == "maintenance"
+    # The callback finishes a pipeline, so it runs before new stages start.
+    assert workers.calculate_risk_score_task.priority < workers.process_ocr_task.priority
+    assert workers.process_ocr_task.priority < workers.calculate_risk_scores_task.priority
+
+    monkeypatch.setattr(settings, "CELERY_WORKER_ROLE", "io")
+    assert workers.worker_pool()["queues"] == ("notifications", "maintenance")
+    assert workers.WORKER_POOLS["inference"]["worker_pool"] == "prefork"
+    assert set(workers.WORKER_POOLS[""]["queues"]) == set(workers.QUEUES)
+    monkeypatch.setattr(settings, "CELERY_WORKER_ROLE", "gpu")
+    with pytest.raises(ValueError):
+        workers.worker_pool()
+
+
+def test_queue_stats_report_depth_and_recent_latency(monkeypatch):
+    """Depth is read from the broker, wait and run percentiles from the recorded tasks"""
+    from app.workers import celery_app as workers
+    from app.workers.queue_stats import QueueLatency
+
+    monkeypatch.setattr(celery_app.conf, "broker_url", "memory://")
+    monkeypatch.setattr(workers, "queue_latency", QueueLatency(window=4))
+    for _ in range(3):
+        celery_app.send_task(workers.calculate_risk_scores_task.name, args=([],), ignore_result=True)
+    for wait_ms in (10, 20, 30, 40, 50):
+        workers.queue_latency.record("batch", wait_ms, 5.0)
+
+    stats = workers.queue_stats()
+    assert stats["batch"]["depth"] == 3 and stats["notifications"]["depth"] == 0
+    assert stats["batch"]["tasks"] == 4 and stats["batch"]["wait_ms"]["p50"] == 35.0
+    assert stats["batch"]["run_ms"]["max"] == 5.0 and stats["inference"]["wait_ms"] is None
+    with celery_app.connection_for_write() as conn:
+        conn.default_channel.queue_purge("batch")
+
+
+def test_stages_pin_the_model_versions_of_the_manifest(tmp_path, monkeypatch):
+    """A stage uses the versions active when the submission was enqueued, not the worker's defaults"""
+    from app.services.model_registry import model_versions
+
+    monkeypatch.setattr(settings, "ARTIFACT_STORE_PATH", str(tmp_path))
+    monkeypatch.setitem(model_versions.active, "face", "face-swapped")
+    context = {
+        "submission_id": "sub-1",
+        "organization_id": "org-1",
+        "document": {"type": "passport", "capturedImage": IMAGE},
+        "biometric": {"selfieImage": IMAGE, "livenessDetected": True},
+    }
+    manifest = verification_pipeline.artifact_manifest(context)
+    assert manifest["model_versions"]["face"] == "face-swapped"
+
+    # A worker still on its start-up default.
+    monkeypatch.setitem(model_versions.active, "face", "face-default")
+    seen = []
+
+    async def stage(manifest):
+        with model_versions.hold("face") as version:
+            seen.append(version)
+        return {}
+
+    monkeypatch.setitem(verification_pipeline.STAGE_FUNCTIONS, "face", stage)
+    asyncio.run(verification_pipeline.run_stage("face", manifest, time.time()))
+    with model_versions.hold("face") as version:
+        seen.append(version)
+    assert seen == ["face-swapped", "face-default"]
@@ -4,6 +4,7 @@ import { Routes, Route, Navigate } from 'react-router-dom'
 import { useAuthStore } from '../store/authStore'
 import { useKYCStore } from '../store/kycStore'
 import { invitationService } from '../services/invitations'
+import { setInvitationCode } from '../services/api'
 import type { KYCInvitation } from '../types'
 import { LoadingSpinner, ProgressBar } from '../components'
 import { Lock } from 'lucide-react'
@@ -64,6 +65,11 @@ const CustomerKYCProcess: React.FC = () => {
     loadInvitation()
   }, [invitationCode])
 
+  useEffect(() => {
+    setInvitationCode(invitationCode ?? null)
+    return () => setInvitationCode(null)
+  }, [invitationCode])
+
   if (loading) return <LoadingSpinner />
 
   if (error || !invitation) {
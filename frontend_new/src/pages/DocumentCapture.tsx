@@ -4,6 +4,7 @@ import { useKYCStore } from '../store/kycStore'
 import { Card, Alert } from '../components'
 import { useI18n } from '../services/i18n'
 import { voiceService, languageToVoiceCode, voicePrompts } from '../services/voice'
+import { documentService, ImageQuality } from '../services/api'
 import { Camera, RotateCw } from 'lucide-react'
 
 const DocumentCapture: React.FC = () => {
@@ -16,6 +17,7 @@ const DocumentCapture: React.FC = () => {
   const [preview, setPreview] = useState<string>('')
   const [hint, setHint] = useState('Position document in frame')
   const [blurDetected, setBlurDetected] = useState(false)
+  const [quality, setQuality] = useState<ImageQuality | null>(null)
   const [loading, setLoading] = useState(false)
 
   useEffect(() => {
@@ -38,7 +40,7 @@ const DocumentCapture: React.FC = () => {
     }
   }, [captured])
 
-  const handleCapture = () => {
+  const handleCapture = async () => {
     if (videoRef.current && canvasRef.current) {
       const ctx = canvasRef.current.getContext('2d')
       if (ctx) {
@@ -47,6 +49,14 @@ const DocumentCapture: React.FC = () => {
         setPreview(imageData)
         setCaptured(true)
         setHint('Image captured')
+        try {
+          // Quick server-side check, so a bad photo is retaken before OCR runs
+          const result = await documentService.checkQuality(imageData)
+          setQuality(result)
+          setBlurDetected(result.reasons.some((reason) => reason.code === 'blurry'))
+        } catch {
+          setQuality(null)
+        }
       }
     }
   }
@@ -72,6 +82,8 @@ const DocumentCapture: React.FC = () => {
   const handleRetake = () => {
     setCaptured(false)
     setPreview('')
+    setQuality(null)
+    setBlurDetected(false)
     setHint('Position document in frame')
   }
 
@@ -86,6 +98,18 @@ const DocumentCapture: React.FC = () => {
         <Alert type="warning" title={t('capture.blurry')} message={t('capture.blurry.desc')} />
       )}
 
+      {quality && quality.reasons.some((reason) => reason.code !== 'blurry') && (
+        <Alert
+          type={quality.passed ? 'info' : 'warning'}
+          title={t('capture.quality')}
+          message={quality.reasons
+            .filter((reason) => reason.code !== 'blurry')
+            // Server text only for codes this build has no translation for
+            .map((reason) => t(`capture.reason.${reason.code}`, reason.message))
+            .join(' ')}
+        />
+      )}
+
       <Card>
         <div style={{ position: 'relative', backgroundColor: 'var(--bg)', borderRadius: 'var(--radius-md)', overflow: 'hidden' }}>
           {!captured ? (
@@ -146,7 +170,7 @@ const DocumentCapture: React.FC = () => {
               <RotateCw size={20} style={{ marginRight: '0.5rem' }} />
               {t('common.retake')}
             </button>
-            <button onClick={handleConfirm} className="btn btn-primary" style={{ flex: 1 }} disabled={loading}>
+            <button onClick={handleConfirm} className="btn btn-primary" style={{ flex: 1 }} disabled={loading || (quality !== null && !quality.passed)}>
               {loading ? 'Processing...' : t('document.confirm')}
             </button>
           </div>
@@ -13,6 +13,18 @@ function dataUrlToFile(dataUrl: string, filename: string): File {
   return new File([u8arr], filename, { type: mime })
 }
 
+// The customer flow's invitation code. AI requests carry it so the server
+// queues them under the inviting organization rather than a shared bucket.
+let invitationCode: string | null = null
+
+export function setInvitationCode(code: string | null) {
+  invitationCode = code
+}
+
+function aiHeaders(): Record<string, string> {
+  return invitationCode ? { 'X-Invitation-Code': invitationCode } : {}
+}
+
 // Mock delay helper
 const delay = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
 
@@ -95,12 +107,17 @@ export const phoneService = {
   },
 }
 
+export interface ImageQuality {
+  passed: boolean
+  reasons: { code: string; severity: 'reject' | 'warn'; message: string }[]
+}
+
 // Document Processing Service
 export const documentService = {
   async processOCR(imageData: string): Promise<OCRExtraction> {
     const form = new FormData()
     form.append('file', dataUrlToFile(imageData, 'document.jpg'))
-    const res = await fetch(`${API_BASE}/api/v1/ai/ocr`, { method: 'POST', body: form })
+    const res = await fetch(`${API_BASE}/api/v1/ai/ocr`, { method: 'POST', headers: aiHeaders(), body: form })
     if (!res.ok) throw new Error(await res.text())
     const data = await res.json()
     const nameParts = (data.full_name || '').split(' ')
@@ -122,6 +139,14 @@ export const documentService = {
     }
   },
 
+  async checkQuality(imageData: string): Promise<ImageQuality> {
+    const form = new FormData()
+    form.append('file', dataUrlToFile(imageData, 'document.jpg'))
+    const res = await fetch(`${API_BASE}/api/v1/ai/quality`, { method: 'POST', headers: aiHeaders(), body: form })
+    if (!res.ok) throw new Error(await res.text())
+    return res.json()
+  },
+
   async validateDocumentAuthenticity(imageData: string, ocrData: OCRExtraction): Promise<number> {
     await delay(1500)
     // Mock authenticity score (0-100)
@@ -135,7 +160,7 @@ export const biometricService = {
     const form = new FormData()
     form.append('selfie', dataUrlToFile(selfieImage, 'selfie.jpg'))
     form.append('document_face', dataUrlToFile(documentImage, 'document.jpg'))
-    const res = await fetch(`${API_BASE}/api/v1/ai/face/verify`, { method: 'POST', body: form })
+    const res = await fetch(`${API_BASE}/api/v1/ai/face/verify`, { method: 'POST', headers: aiHeaders(), body: form })
     if (!res.ok) throw new Error(await res.text())
     const data = await res.json()
     return Math.round((data.confidence || 0) * 100)
@@ -149,7 +174,7 @@ export const biometricService = {
   }> {
     const form = new FormData()
     form.append('video', dataUrlToFile(videoData, 'liveness.jpg'))
-    const res = await fetch(`${API_BASE}/api/v1/ai/liveness`, { method: 'POST', body: form })
+    const res = await fetch(`${API_BASE}/api/v1/ai/liveness`, { method: 'POST', headers: aiHeaders(), body: form })
     if (!res.ok) throw new Error(await res.text())
     const data = await res.json()
     return {
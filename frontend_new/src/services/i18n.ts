@@ -67,6 +67,12 @@ const translations: Record<string, Record<string, string>> = {
     'document.availableIn': 'Available in',
     'capture.blurry': 'Blurry Image',
     'capture.blurry.desc': 'Image appears blurry. Please try again with better lighting.',
+    'capture.quality': 'Please retake the photo',
+    'capture.reason.too_dark': 'The photo is too dark. Move somewhere brighter.',
+    'capture.reason.overexposed': 'The photo is overexposed. Avoid pointing the camera at a light.',
+    'capture.reason.glare': 'Glare is covering part of the document. Tilt it away from the light.',
+    'capture.reason.document_too_small': 'The document is too far away. Move closer so it fills the frame.',
+    'capture.reason.document_cropped': 'Part of the document may be cut off. Keep all four edges in the frame.',
     'liveness.check.liveness': 'Liveness Detected',
     'liveness.check.liveness.desc': 'Real person verified with active liveness detection',
     'liveness.check.pulse': 'Pulse Detection',
@@ -167,6 +173,12 @@ const translations: Record<string, Record<string, string>> = {
     'document.availableIn': 'Disponible en',
     'capture.blurry': 'Imagen borrosa',
     'capture.blurry.desc': 'La imagen parece borrosa. Inténtelo de nuevo con mejor iluminación.',
+    'capture.quality': 'Vuelva a tomar la foto',
+    'capture.reason.too_dark': 'La foto está demasiado oscura. Busque un lugar con más luz.',
+    'capture.reason.overexposed': 'La foto está sobreexpuesta. Evite apuntar la cámara hacia una luz.',
+    'capture.reason.glare': 'Un reflejo cubre parte del documento. Inclínelo para alejarlo de la luz.',
+    'capture.reason.document_too_small': 'El documento está demasiado lejos. Acérquese para que llene el encuadre.',
+    'capture.reason.document_cropped': 'Puede que parte del documento quede cortada. Mantenga los cuatro bordes en el encuadre.',
     'liveness.check.liveness': 'Vivacidad detectada',
     'liveness.check.liveness.desc': 'Persona real verificada con detección activa de vivacidad',
     'liveness.check.pulse': 'Detección de pulso',
@@ -267,6 +279,12 @@ const translations: Record<string, Record<string, string>> = {
     'document.availableIn': 'Disponible dans',
     'capture.blurry': 'Image floue',
     'capture.blurry.desc': "L'image semble floue. Veuillez réessayer avec un meilleur éclairage.",
+    'capture.quality': 'Veuillez reprendre la photo',
+    'capture.reason.too_dark': 'La photo est trop sombre. Placez-vous dans un endroit plus lumineux.',
+    'capture.reason.overexposed': "La photo est surexposée. Évitez de pointer l'appareil vers une lumière.",
+    'capture.reason.glare': "Un reflet couvre une partie du document. Inclinez-le pour l'éloigner de la lumière.",
+    'capture.reason.document_too_small': "Le document est trop loin. Rapprochez-vous pour qu'il remplisse le cadre.",
+    'capture.reason.document_cropped': 'Une partie du document est peut-être coupée. Gardez les quatre bords dans le cadre.',
     'liveness.check.liveness': 'Vivacité détectée',
     'liveness.check.liveness.desc': 'Personne réelle vérifiée avec détection active de vivacité',
     'liveness.check.pulse': 'Détection du pouls',
@@ -367,6 +385,12 @@ const translations: Record<string, Record<string, string>> = {
     'document.availableIn': 'उपलब्ध',
     'capture.blurry': 'धुंधली छवि',
     'capture.blurry.desc': 'छवि धुंधली प्रतीत होती है। कृपया बेहतर रोशनी के साथ फिर से प्रयास करें।',
+    'capture.quality': 'कृपया फोटो फिर से लें',
+    'capture.reason.too_dark': 'फोटो बहुत अंधेरी है। किसी रोशनी वाली जगह पर जाएं।',
+    'capture.reason.overexposed': 'फोटो में बहुत ज़्यादा रोशनी है। कैमरे को रोशनी की ओर न रखें।',
+    'capture.reason.glare': 'चमक दस्तावेज़ के एक हिस्से को ढक रही है। इसे रोशनी से दूर झुकाएं।',
+    'capture.reason.document_too_small': 'दस्तावेज़ बहुत दूर है। पास आएं ताकि यह फ्रेम भर दे।',
+    'capture.reason.document_cropped': 'दस्तावेज़ का कुछ हिस्सा कट सकता है। चारों किनारे फ्रेम में रखें।',
     'liveness.check.liveness': 'लाइवनेस का पता चला',
     'liveness.check.liveness.desc': 'सक्रिय लाइवनेस डिटेक्शन के साथ वास्तविक व्यक्ति सत्यापित',
     'liveness.check.pulse': 'पल्स डिटेक्शन',
@@ -405,6 +429,7 @@ const translations: Record<string, Record<string, string>> = {
 
 export function useI18n() {
   const { language } = useKYCStore()
-  const t = (key: string) => translations[language]?.[key] || translations['en'][key] || key
+  const t = (key: string, fallback?: string) =>
+    translations[language]?.[key] || translations['en'][key] || fallback || key
   return { t, lang: language }
 }
\ No newline at end of file